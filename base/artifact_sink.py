@@ -0,0 +1,107 @@
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+from base.base_cfg import BaseCfg
+
+logger = BaseCfg.getLogger(__name__)
+
+
+class ArtifactSink:
+    """Collects the metrics and debug artifacts of a run in memory,
+    and writes them once at the end of the run with flush().
+
+    Records are appended in the process that makes them. Parallel workers
+    shall return their new records to the parent, which extends its sink.
+
+    Parameters
+    ==========
+    path: str
+        the file to flush the records to, .jsonl or .parquet.
+        Artifacts are written next to it as <path stem>.<name>.parquet
+    enabled: bool
+        a disabled sink drops everything. Disabled by default for production.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        enabled: bool = False,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.records = []
+        self.artifacts = {}
+
+    def record(self, kind: str, **fields) -> None:
+        """Append one metrics record, e.g. accuracy or cross validation."""
+        if not self.enabled:
+            return
+        self.records.append(
+            {'kind': kind, 'ts': datetime.now().isoformat(), **fields})
+
+    def extend(self, records: list[dict]) -> None:
+        """Append records collected by another process."""
+        if self.enabled and records:
+            self.records.extend(records)
+
+    def artifact(self, name: str, df: pd.DataFrame) -> None:
+        """Keep a copy of the latest dataframe of name."""
+        if not self.enabled:
+            return
+        self.artifacts[name] = df.copy()
+
+    def flush(self) -> None:
+        """Write the records and artifacts, then clear them.
+        Nothing is written when nothing was collected since the last flush.
+        """
+        if not self.enabled or self.path is None:
+            return
+        if not self.records and not self.artifacts:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if self.path.endswith('.parquet'):
+            pd.DataFrame.from_records(self.records).to_parquet(
+                self.path, index=False)
+        else:
+            with open(self.path, 'a') as f:
+                for record in self.records:
+                    f.write(json.dumps(record, default=_json_default) + '\n')
+        stem = os.path.splitext(self.path)[0]
+        for name, df in self.artifacts.items():
+            try:
+                df.to_parquet(f'{stem}.{name}.parquet')
+            except (ValueError, TypeError, ImportError) as e:
+                logger.warning(
+                    f'Can not write artifact {name} as parquet: {e}. Write csv instead.')
+                df.to_csv(f'{stem}.{name}.csv')
+        logger.info(
+            f'Flushed {len(self.records)} records and {len(self.artifacts)} artifacts to {self.path}')
+        self.records = []
+        self.artifacts = {}
+
+
+def _json_default(value):
+    # numpy scalars
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+_artifactSink = ArtifactSink()
+
+
+def getArtifactSink() -> ArtifactSink:
+    """Get the process-wide sink. Disabled unless set by setArtifactSink."""
+    return _artifactSink
+
+
+def setArtifactSink(sink: ArtifactSink) -> ArtifactSink:
+    """Set the process-wide sink, returns the previous one."""
+    global _artifactSink
+    previous = _artifactSink
+    _artifactSink = sink
+    return previous
@@ -0,0 +1,42 @@
+"""Benchmark roundArray against the scalar getRoundFunction used before.
+
+    python bench_round_result.py [rows]
+
+Prints the timings and the number of mismatched values for each case.
+"""
+import sys
+import time
+
+import numpy as np
+
+from base.util import getRoundFunction
+from estimator.rmbase_estimate_manager import roundArray
+
+CASES = [
+    # roundBy, lower, upper
+    (1, 0, 1000000000),
+    (1000, 50000, 5000000),
+    (100, 500, 10000),
+    (0.5, 0, 10),
+]
+
+
+def bench(rows: int):
+    rng = np.random.default_rng(0)
+    for roundBy, lower, upper in CASES:
+        values = rng.uniform(lower - (upper - lower) * 0.1, upper * 1.1, rows)
+        fnRound = getRoundFunction(roundBy, min=lower, max=upper)
+        start = time.perf_counter()
+        expected = np.vectorize(fnRound)(values)
+        scalarTime = time.perf_counter() - start
+        start = time.perf_counter()
+        result = roundArray(values, roundBy, lower=lower, upper=upper)
+        vectorTime = time.perf_counter() - start
+        mismatched = int(np.sum(~np.isclose(result, expected)))
+        print(f'roundBy={roundBy} [{lower},{upper}] rows={rows}: '
+              f'scalar {scalarTime:.3f}s vectorized {vectorTime:.4f}s '
+              f'x{scalarTime / vectorTime:.0f} mismatched {mismatched}')
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -1,31 +1,71 @@
 
 
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+import json
 from math import isnan
 import time
+import weakref
+from base.artifact_sink import getArtifactSink
 from base.base_cfg import BaseCfg
 from numpy import NaN
 from data.estimate_scale import EstimateScale
 from base.mongo import MongoDB
 from base.util import debug, get_utc_datetime_from_str, getUniqueLabels, isNanOrNone, print_dateframe
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
+from pymongo import UpdateOne
 from transformer.preprocessor import Preprocessor
-from typing import Union
+from typing import Callable, Union
 import os
 from base.const import CITY_COUNT_THRESHOLD
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # query cache is disabled without pyarrow
+    pa = None
+    pq = None
 
 logger = BaseCfg.getLogger(__name__)
 
 PROV_CITY_TO_AREA = {}
 PROV_CITY_TO_AREA_COUNT = {}
 PROV_CITY_TO_AREA_DF = None
+PROV_CITY_TO_AREA_LOOKUP = None
 PROV_CITY_TO_AREA_FILE = 'data/prov_city_to_area.csv'
-gEmptyAreaCount = 0
+# full (prov, city, area) tally of each query, the state for incremental map updates
+PROV_CITY_AREA_COUNT_FILE = 'data/prov_city_area_count.csv'
+# the (prov, city, area) each _id is counted in, to recount the modified rows
+PROV_CITY_AREA_IDS_FILE = 'data/prov_city_area_ids.csv'
+PROV_CITY_AREA_KEYS = ['prov', 'city', 'area']
+# modification time of a property, the cutoff of the incremental map updates
+MODIFIED_COLUMN = '_mt'
+QUERY_CACHE_DIR = 'data/query_cache'
+# UpdateOne operations in one bulk write, when enabled by update_records(batch_size=...)
+UPDATE_BATCH_SIZE = 5000
+# ids in one prediction query, a query has a limit of 16MB
+PREDICT_CHUNK_SIZE = 500000
+# ids in one range of a parallel read
+READ_BATCH_SIZE = 100000
+# memory of the get_df rows cached by DataSource
+SCALE_CACHE_BYTES = 2 * 2**30
+# fields always read by a planned col_list:
+# the index levels, and the fields the row filters of Preprocessor depend on
+PLAN_BASE_COLUMNS = [
+    '_id', 'onD', 'saletp', 'ptype', 'ptype2',
+    'prov', 'area', 'city', 'lat', 'lng',
+    'lp', 'lpr', 'sp', 'lst', MODIFIED_COLUMN,
+]
 
 
 def readProvCityToArea():
     """Read province-city to area mapping from csv file"""
-    global PROV_CITY_TO_AREA, PROV_CITY_TO_AREA_COUNT
+    global PROV_CITY_TO_AREA, PROV_CITY_TO_AREA_COUNT, PROV_CITY_TO_AREA_LOOKUP
     # check file exists
     if not (os.path.exists(PROV_CITY_TO_AREA_FILE) and os.path.isfile(PROV_CITY_TO_AREA_FILE)):
         return
@@ -33,6 +73,7 @@ def readProvCityToArea():
     for index, row in df.iterrows():
         PROV_CITY_TO_AREA[(row['prov'], row['city'])] = row['area']
         PROV_CITY_TO_AREA_COUNT[(row['prov'], row['city'])] = row['count']
+    PROV_CITY_TO_AREA_LOOKUP = None
 
 
 readProvCityToArea()
@@ -61,14 +102,405 @@ def calcProvCityToAreaDF(write_to_file: bool = False):
     return PROV_CITY_TO_AREA_DF
 
 
-def fill_row_area(row):
-    """Fill area from PROV_CITY_TO_AREA dict"""
-    global PROV_CITY_TO_AREA, gEmptyAreaCount
-    if isNanOrNone(row['area']) and row['city'] != '':
-        gEmptyAreaCount += 1
-        return PROV_CITY_TO_AREA.get((row['prov'], row['city']), '')
+def querySignature(query: dict) -> str:
+    """Normalized hash of a mongodb query, the key of its area tally"""
+    normalized = json.dumps(query, sort_keys=True, default=str)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:20]
+
+
+def _readProvCityAreaCountFile() -> pd.DataFrame:
+    if not (os.path.exists(PROV_CITY_AREA_COUNT_FILE) and os.path.isfile(PROV_CITY_AREA_COUNT_FILE)):
+        return None
+    df = pd.read_csv(PROV_CITY_AREA_COUNT_FILE)
+    if 'query' not in df.columns or 'maxModified' not in df.columns:
+        # a tally of an older format, rebuilt by a full count
+        return None
+    df['maxModified'] = pd.to_datetime(df['maxModified'])
+    return df
+
+
+def readProvCityAreaCount(signature: str) -> pd.DataFrame:
+    """Read the (prov, city, area) tally of the query signature from csv file. None if not exists"""
+    df = _readProvCityAreaCountFile()
+    if df is None:
+        return None
+    df = df.loc[df['query'] == signature].drop(columns=['query'])
+    return df.reset_index(drop=True) if df.shape[0] > 0 else None
+
+
+def writeProvCityAreaCount(counts: pd.DataFrame, signature: str) -> None:
+    """Replace the (prov, city, area) tally of the query signature in csv file"""
+    df = _readProvCityAreaCountFile()
+    counts = counts.assign(query=signature)
+    if df is not None:
+        counts = pd.concat([df.loc[df['query'] != signature], counts], ignore_index=True)
+    counts.to_csv(PROV_CITY_AREA_COUNT_FILE, index=False)
+
+
+def readProvCityAreaIds(signature: str) -> pd.DataFrame:
+    """Read the counted _id, prov, city, area rows of the query signature from csv file. None if not exists"""
+    if not (os.path.exists(PROV_CITY_AREA_IDS_FILE) and os.path.isfile(PROV_CITY_AREA_IDS_FILE)):
+        return None
+    df = pd.read_csv(PROV_CITY_AREA_IDS_FILE, dtype=str)
+    df = df.loc[df['query'] == signature].drop(columns=['query'])
+    return df.reset_index(drop=True)
+
+
+def writeProvCityAreaIds(ids: pd.DataFrame, signature: str) -> None:
+    """Replace the counted _id rows of the query signature in csv file"""
+    ids = ids.assign(query=signature)
+    if os.path.isfile(PROV_CITY_AREA_IDS_FILE):
+        df = pd.read_csv(PROV_CITY_AREA_IDS_FILE, dtype=str)
+        ids = pd.concat([df.loc[df['query'] != signature], ids], ignore_index=True)
+    ids.to_csv(PROV_CITY_AREA_IDS_FILE, index=False)
+
+
+def validAreaKeys(df: pd.DataFrame) -> np.ndarray:
+    """Mask of the rows with non-empty prov, city and area, of any dtype, e.g. category or string"""
+    valid = np.ones(len(df.index), dtype=bool)
+    for col in PROV_CITY_AREA_KEYS:
+        values = df[col]
+        valid &= values.notna().to_numpy() & \
+            values.astype(str).str.len().gt(0).to_numpy()
+    return valid
+
+
+def areaKeysById(df: pd.DataFrame) -> pd.DataFrame:
+    """The _id, prov, city, area of the rows counted by countProvCityArea"""
+    valid = validAreaKeys(df)
+    return df.loc[valid, ['_id'] + PROV_CITY_AREA_KEYS].astype(str).reset_index(drop=True)
+
+
+def countProvCityArea(df: pd.DataFrame) -> pd.DataFrame:
+    """Count rows for each (prov, city, area) in one groupby pass.
+    Rows with empty prov, city or area are ignored.
+    Returns columns: prov, city, area, count, maxModified
+    """
+    valid = validAreaKeys(df)
+    validDf = df.loc[valid, PROV_CITY_AREA_KEYS].astype(str)
+    if MODIFIED_COLUMN in df.columns:
+        validDf['modified'] = pd.to_datetime(df.loc[valid, MODIFIED_COLUMN])
+        grouped = validDf.groupby(PROV_CITY_AREA_KEYS, sort=False)['modified']
+        counts = grouped.agg(['size', 'max'])
     else:
-        return row['area']
+        counts = validDf.groupby(PROV_CITY_AREA_KEYS, sort=False).size(
+        ).to_frame('size')
+        counts['max'] = pd.NaT
+    counts.columns = ['count', 'maxModified']
+    return counts.reset_index()
+
+
+def mergeProvCityAreaCount(
+    previous: pd.DataFrame,
+    delta: pd.DataFrame,
+    removed: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """Add the delta tally to the previous tally.
+    removed: the prov, city, area rows counted in previous before they were
+    modified and counted again in delta, subtracted from previous.
+    """
+    if removed is not None and removed.shape[0] > 0 and previous is not None:
+        removedCounts = removed.groupby(PROV_CITY_AREA_KEYS, sort=False).size(
+        ).to_frame('count').reset_index()
+        removedCounts['count'] = -removedCounts['count']
+        removedCounts['maxModified'] = pd.NaT
+        previous = pd.concat([previous, removedCounts], ignore_index=True)
+    elif previous is None or previous.shape[0] == 0:
+        return delta
+    if delta is not None and delta.shape[0] > 0:
+        previous = pd.concat([previous, delta], ignore_index=True)
+    merged = previous.groupby(PROV_CITY_AREA_KEYS, as_index=False, sort=False).agg(
+        count=('count', 'sum'), maxModified=('maxModified', 'max'))
+    return merged.loc[merged['count'] > 0].reset_index(drop=True)
+
+
+def selectDominantArea(
+    counts: pd.DataFrame,
+    incumbent: dict = None,
+) -> pd.DataFrame:
+    """Select the area for each (prov, city) with a majority policy:
+    the area with most rows wins; on a tie the incumbent area is kept,
+    then the alphabetically first area wins.
+    Returns columns: prov, city, area, count
+    """
+    df = counts[PROV_CITY_AREA_KEYS + ['count']].copy()
+    if incumbent:
+        incumbentDf = pd.DataFrame(
+            [(k[0], k[1], v) for k, v in incumbent.items()],
+            columns=PROV_CITY_AREA_KEYS)
+        incumbentDf['incumbent'] = True
+        df = df.merge(incumbentDf, on=PROV_CITY_AREA_KEYS, how='left')
+        df['incumbent'] = df['incumbent'].fillna(False).astype(bool)
+    else:
+        df['incumbent'] = False
+    df.sort_values(
+        by=['prov', 'city', 'count', 'incumbent', 'area'],
+        ascending=[True, True, False, False, True],
+        inplace=True,
+        kind='mergesort',
+    )
+    areaCount = df.groupby(['prov', 'city'], sort=False)['area'].transform('size')
+    dominant = df.drop_duplicates(subset=['prov', 'city'], keep='first')
+    # log conflicts, only when the dominant count is small
+    conflicts = df.loc[(areaCount > 1).to_numpy()]
+    if conflicts.shape[0] > 0:
+        logger.info(
+            f'PROV_CITY_TO_AREA conflicts: {conflicts[["prov", "city"]].drop_duplicates().shape[0]}')
+        for (prov, city), group in conflicts.groupby(['prov', 'city'], sort=False):
+            if group['count'].iloc[0] < 100:
+                others = ', '.join(
+                    f'{a}:{c}' for a, c in group[['area', 'count']].iloc[1:].values)
+                logger.warning(
+                    f'PROV_CITY_TO_AREA conflict: {(prov, city)}: {group["area"].iloc[0]} {group["count"].iloc[0]} vs {others}')
+    return dominant[PROV_CITY_AREA_KEYS + ['count']].reset_index(drop=True)
+
+
+def buildProvCityToArea(
+    df: pd.DataFrame,
+    previous_counts: pd.DataFrame = None,
+    recounted: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """Build PROV_CITY_TO_AREA dict from df.
+    When previous_counts is provided, df is only the newly loaded delta
+    and its tally is added to previous_counts.
+    recounted: the prov, city, area of the delta rows already in previous_counts,
+    which are replaced by their new values. See areaKeysById.
+    Returns the merged (prov, city, area) tally.
+    """
+    global PROV_CITY_TO_AREA, PROV_CITY_TO_AREA_COUNT, PROV_CITY_TO_AREA_LOOKUP
+    counts = mergeProvCityAreaCount(
+        previous_counts, countProvCityArea(df), removed=recounted)
+    dominant = selectDominantArea(counts, incumbent=PROV_CITY_TO_AREA)
+    # reset global dict count to empty
+    setCounterToZero()
+    keys = list(zip(dominant['prov'], dominant['city']))
+    PROV_CITY_TO_AREA.update(zip(keys, dominant['area']))
+    PROV_CITY_TO_AREA_COUNT.update(zip(keys, dominant['count'].tolist()))
+    PROV_CITY_TO_AREA_LOOKUP = None
+    return counts
+
+
+def getProvCityToAreaLookup() -> pd.Series:
+    """Get the (prov, city) -> area lookup Series built from PROV_CITY_TO_AREA.
+    The Series is built once and reused until the dict is rebuilt.
+    """
+    global PROV_CITY_TO_AREA, PROV_CITY_TO_AREA_LOOKUP
+    if PROV_CITY_TO_AREA_LOOKUP is None:
+        if len(PROV_CITY_TO_AREA) == 0:
+            index = pd.MultiIndex.from_tuples([], names=['prov', 'city'])
+        else:
+            index = pd.MultiIndex.from_tuples(
+                list(PROV_CITY_TO_AREA.keys()), names=['prov', 'city'])
+        PROV_CITY_TO_AREA_LOOKUP = pd.Series(
+            list(PROV_CITY_TO_AREA.values()), index=index, dtype=object)
+    return PROV_CITY_TO_AREA_LOOKUP
+
+
+def lookupArea(df: pd.DataFrame, default: str = '') -> np.ndarray:
+    """Look up area for every row of df by (prov, city), default when not found"""
+    lookup = getProvCityToAreaLookup()
+    keys = pd.MultiIndex.from_arrays(
+        [df['prov'], df['city']], names=['prov', 'city'])
+    positions = lookup.index.get_indexer(keys)
+    found = positions >= 0
+    areas = np.full(len(df.index), default, dtype=object)
+    areas[found] = lookup.to_numpy()[positions[found]]
+    return areas
+
+
+def fillArea(df: pd.DataFrame) -> tuple[pd.Series, int]:
+    """Fill empty area from PROV_CITY_TO_AREA dict.
+    Returns the filled area column and the number of empty area rows.
+    """
+    emptyMask = df['area'].isna().to_numpy() & (df['city'] != '').to_numpy()
+    emptyCount = int(emptyMask.sum())
+    area = df['area'].copy()
+    if emptyCount > 0:
+        area[emptyMask] = lookupArea(df.loc[emptyMask], default='')
+    return area, emptyCount
+
+
+FILTER_OPERATORS = {
+    'between': lambda v, low, high: (v >= low) & (v <= high),
+    '>': lambda v, x: v > x,
+    '>=': lambda v, x: v >= x,
+    '<': lambda v, x: v < x,
+    '<=': lambda v, x: v <= x,
+    '==': lambda v, x: v == x,
+    '!=': lambda v, x: v != x,
+    'in': lambda v, values: np.isin(v, list(values)),
+    'notin': lambda v, values: ~np.isin(v, list(values)),
+    'notna': lambda v: ~pd.isna(v),
+    'isna': lambda v: pd.isna(v),
+}
+# filter_func => 'frame' or 'row', decided on first use, dropped with the filter_func.
+# Bound methods are keyed on their function, a new bound method is made on each attribute access.
+_FILTER_KINDS = weakref.WeakKeyDictionary()
+
+
+def _filterKey(filter_func: Callable) -> Callable:
+    return getattr(filter_func, '__func__', filter_func)
+
+
+def _filterKind(filter_func: Callable) -> str:
+    try:
+        return _FILTER_KINDS.get(_filterKey(filter_func))
+    except TypeError:
+        # no weak reference to it, e.g. a builtin
+        return None
+
+
+def _setFilterKind(filter_func: Callable, kind: str) -> None:
+    try:
+        _FILTER_KINDS[_filterKey(filter_func)] = kind
+    except TypeError:
+        pass
+
+
+def filterMask(
+    df: pd.DataFrame,
+    filter_func: Union[Callable, dict],
+) -> np.ndarray:
+    """Get the boolean row mask of df by filter_func.
+
+    filter_func can be:
+        dict: {col: (op, *args)} compiled to numpy masks and combined by and.
+            e.g. {'sqft-n': ('between', 500, 5000), 'lp-n': ('>', 0)}
+            ops: between(inclusive), >, >=, <, <=, ==, !=, in, notin, notna, isna
+        callable taking the dataframe, returning a boolean mask.
+        callable taking a row, returning a bool. This is a slow fallback.
+    """
+    if isinstance(filter_func, dict):
+        mask = np.ones(len(df.index), dtype=bool)
+        for col, condition in filter_func.items():
+            op, *args = condition
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f'Unknown filter operator {op} for {col}')
+            mask &= np.asarray(FILTER_OPERATORS[op](
+                df[col].to_numpy(), *args), dtype=bool)
+        return mask
+    kind = _filterKind(filter_func)
+    if kind is None:
+        kind = 'row'
+        if getattr(filter_func, 'vectorized', True):
+            # try the whole frame first
+            try:
+                mask = filter_func(df)
+                if isinstance(mask, (pd.Series, np.ndarray)) and \
+                        mask.dtype == bool and mask.shape == (len(df.index),) and \
+                        (not isinstance(mask, pd.Series) or mask.index.equals(df.index)):
+                    _setFilterKind(filter_func, 'frame')
+                    return np.asarray(mask)
+            except (TypeError, ValueError, KeyError):
+                # a row filter, e.g. the truth value of a Series is ambiguous
+                pass
+        logger.warning(
+            f'filter_func {getattr(filter_func, "__qualname__", filter_func)} is applied row by row, use a vectorized filter instead.')
+        _setFilterKind(filter_func, kind)
+    if kind == 'frame':
+        return np.asarray(filter_func(df), dtype=bool)
+    return applyRowFilter(df, filter_func)
+
+
+def applyRowFilter(df: pd.DataFrame, filter_func: Callable) -> np.ndarray:
+    """Apply a row filter_func to every row"""
+    return df.apply(filter_func, axis=1, result_type='reduce').to_numpy(dtype=bool)
+
+
+@lru_cache(maxsize=64)
+def _sortedColumns(existing_cols: tuple) -> tuple[list[str], list[int]]:
+    """Columns sorted for prefix search, and their positions in existing_cols"""
+    positions = sorted(range(len(existing_cols)),
+                       key=existing_cols.__getitem__)
+    return [existing_cols[i] for i in positions], positions
+
+
+def _columnsWithPrefix(existing_cols: tuple, prefix: str) -> list[int]:
+    """Positions of the columns starting with prefix, in existing_cols order"""
+    names, positions = _sortedColumns(existing_cols)
+    found = []
+    for k in range(bisect_left(names, prefix), len(names)):
+        if not names[k].startswith(prefix):
+            break
+        found.append(positions[k])
+    found.sort()
+    return found
+
+
+@lru_cache(maxsize=4096)
+def resolveColumns(
+    existing_cols: tuple,
+    cols: tuple,
+    suffix_list: tuple,
+    need_raw: bool,
+    ad_cols: bool,
+) -> tuple:
+    """Resolve the requested cols to existing columns.
+    A col matches existing columns starting with col and ending with a suffix,
+    e.g. {zip} => {zip-n}, and itself when need_raw or no suffixed match.
+    When ad_cols, all the other existing columns are appended.
+    Memoized on the column set and the request signature.
+    """
+    if cols is None:
+        return existing_cols
+    existingSet = set(existing_cols)
+    columns = []
+    for col in cols:
+        found = False
+        # ['-b', '-n', '-c', '-l', ]:  '-l' is only in 'ptype2-l'
+        candidates = _columnsWithPrefix(existing_cols, col)
+        for suffix in suffix_list:
+            for i in candidates:
+                if existing_cols[i].endswith(suffix):
+                    columns.append(existing_cols[i])
+                    found = True
+        if (col in existingSet) and (need_raw or not found):
+            columns.append(col)
+            found = True
+        if not found:
+            logger.debug(f'column[{col}] not found')
+    columns = list(dict.fromkeys(columns))  # remove duplicates
+    if ad_cols:
+        selected = set(columns).union(cols)
+        columns = columns + [c for c in existing_cols if c not in selected]
+    return tuple(columns)
+
+
+def sourceFields(
+    columns: list[str],
+    source_cols: list[str],
+    cols_special: dict = None,
+) -> list[str]:
+    """Get the source fields the transformed columns are made from, in source_cols order.
+    A column comes from the longest source field it equals, or starts with followed by '-' or '_',
+    e.g. bdrms-n, onD-month-n, feat-...-b, pstyl_Detached.
+    It also comes from all the fields transformed 'to' the same column in cols_special,
+    e.g. sqft-n from sqft and rmSqft.
+    """
+    if cols_special is None:
+        cols_special = Preprocessor.cols_special
+    groups = {}
+    for field, spec in cols_special.items():
+        if 'to' in spec:
+            groups.setdefault(spec['to'], []).append(field)
+    fieldGroup = {f: fields for fields in groups.values() for f in fields}
+    needed = set()
+    for col in columns:
+        needed.update(groups.get(col, []))
+        matched = [f for f in source_cols if col == f or
+                   col.startswith(f + '-') or col.startswith(f + '_')]
+        if matched:
+            field = max(matched, key=len)
+            needed.add(field)
+            needed.update(fieldGroup.get(field, []))
+        elif col not in groups:
+            logger.debug(f'column[{col}] has no source field')
+    return [f for f in source_cols if f in needed]
+
+
+def _managerName(manager) -> str:
+    """Name of an estimate manager or of its class"""
+    return manager.__name__ if isinstance(manager, type) else manager.__class__.__name__
 
 
 def dateToInt(date):
@@ -102,12 +534,51 @@ def read_data(
 def read_data_by_query(
     query: dict,
     col_list: list[str],
-    mongodb: MongoDB = None
+    mongodb: MongoDB = None,
+    cache_dir: str = None,
+    workers: int = 1,
+    batch_size: int = READ_BATCH_SIZE,
 ):
     """ use mongo connection to read data from mongodb
+
+    Parameters
+    ==========
+    cache_dir: str, optional
+        when set, the result is cached as Parquet files in this directory,
+        and only the months after the cached ones are read from mongodb.
+    workers: int
+        number of threads to read the ranges of splitQuery in parallel,
+        sharing the mongodb connection pool. 1 to read the query at once.
+    batch_size: int
+        number of _id in one range, see splitQuery.
     """
+    if cache_dir is not None:
+        if pa is not None:
+            return QueryCache(cache_dir).read(
+                query, col_list, mongodb, workers=workers, batch_size=batch_size)
+        logger.warning('pyarrow is not installed, query cache is disabled')
     if mongodb is None:
         mongodb = MongoDB()
+    queries = splitQuery(query, batch_size) if workers > 1 else [query]
+    if len(queries) == 1:
+        return _read_range(mongodb, query, col_list)
+    logger.info(
+        f'Mongo Query in {len(queries)} ranges with {workers} workers: {str(query)[0:160]}')
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda q: _read_range(mongodb, q, col_list), queries))
+    results = [r for r in results if r is not None and r.shape[0] > 0]
+    # no rows in any range: an empty frame of col_list, without another query
+    result = pd.concat(results, ignore_index=True) if results \
+        else pd.DataFrame(columns=col_list)
+    logger.info(
+        f'Result data shape:{result.shape}; used: {time.time() - start_time}s')
+    return result
+
+
+def _read_range(mongodb: MongoDB, query: dict, col_list: list[str]) -> pd.DataFrame:
+    """Read one query from mongodb, logging its timing"""
     logger.info(f'Mongo Query: {str(query)[0:160]}')
     start_time = time.time()
     result = mongodb.load_data('properties', col_list, query)
@@ -120,13 +591,250 @@ def read_data_by_query(
     return result
 
 
+def _nextMonth(month: int) -> int:
+    """yyyymm of the month after yyyymm"""
+    year, m = divmod(month, 100)
+    return year * 100 + m + 1 if m < 12 else (year + 1) * 100 + 1
+
+
+def splitQuery(
+    query: dict,
+    batch_size: int = READ_BATCH_SIZE,
+    date_col: str = 'onD',
+) -> list[dict]:
+    """Split query into disjoint queries, in order, which return the same rows together.
+    An _id $in list is split into chunks of batch_size.
+    Otherwise a date_col range with a lower bound is split by month, up to its upper bound or today.
+    Any other query is not split.
+    """
+    idCond = query.get('_id')
+    if isinstance(idCond, dict) and isinstance(idCond.get('$in'), list):
+        ids = idCond['$in']
+        if len(ids) <= batch_size:
+            return [query]
+        return [{**query, '_id': {**idCond, '$in': ids[start:start + batch_size]}}
+                for start in range(0, len(ids), batch_size)]
+    dateCond = query.get(date_col)
+    if not isinstance(dateCond, dict):
+        return [query]
+    lowerOps = [op for op in ['$gte', '$gt'] if op in dateCond]
+    upperOps = [op for op in ['$lte', '$lt'] if op in dateCond]
+    if len(lowerOps) != 1 or len(upperOps) > 1:
+        return [query]
+    lower = dateCond[lowerOps[0]]
+    upper = dateCond[upperOps[0]] if upperOps else dateToInt(datetime.now())
+    months = [lower // 100]
+    while months[-1] < upper // 100:
+        months.append(_nextMonth(months[-1]))
+    if len(months) == 1:
+        return [query]
+    other = {op: v for op, v in dateCond.items()
+             if op not in ['$gte', '$gt', '$lte', '$lt']}
+    queries = []
+    for i, month in enumerate(months):
+        cond = dict(other)
+        if i == 0:
+            cond[lowerOps[0]] = lower
+        else:
+            cond['$gte'] = month * 100 + 1
+        if i < len(months) - 1:
+            cond['$lt'] = _nextMonth(month) * 100 + 1
+        elif upperOps:
+            cond[upperOps[0]] = dateCond[upperOps[0]]
+        queries.append({**query, date_col: cond})
+    return queries
+
+
+class QueryCache:
+    """Local Parquet cache of read_data_by_query results.
+    Each (query, col_list) has its own directory named by a normalized hash,
+    with one Parquet file per onD month. Months before the cache's
+    high-water month never change and are read from disk memory-mapped;
+    the high-water month and newer ones are read from mongodb again.
+
+    Parameters
+    ==========
+    cache_dir: str
+        the root directory of the cache
+    date_col: str
+        the yyyymmdd int column to partition by
+    """
+
+    META_FILE = '_meta.json'
+
+    def __init__(
+        self,
+        cache_dir: str = QUERY_CACHE_DIR,
+        date_col: str = 'onD',
+    ):
+        self.cache_dir = cache_dir
+        self.date_col = date_col
+
+    def key(self, query: dict, col_list: list[str]) -> str:
+        """Normalized hash of query and col_list"""
+        normalized = json.dumps(
+            {'query': query, 'col_list': sorted(col_list)},
+            sort_keys=True, default=str)
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:20]
+
+    def read(
+        self,
+        query: dict,
+        col_list: list[str],
+        mongodb: MongoDB = None,
+        **read_args,
+    ) -> pd.DataFrame:
+        """Read query result from cache and mongodb.
+        read_args are passed to read_data_by_query, e.g. workers.
+        """
+        dateCond = query.get(self.date_col, {})
+        if (self.date_col not in col_list) or not isinstance(dateCond, dict):
+            return read_data_by_query(query, col_list, mongodb, **read_args)
+        key_dir = os.path.join(self.cache_dir, self.key(query, col_list))
+        meta = self._read_meta(key_dir)
+        highWaterMonth = meta.get('highWaterMonth') if meta else None
+        if highWaterMonth is None:
+            cached = None
+            fetch_query = query
+        else:
+            start_time = time.time()
+            cached = self._read_months(
+                key_dir, highWaterMonth, meta.get('jsonCols', []))
+            logger.info(
+                f'Cache {key_dir}: {cached.shape} before {highWaterMonth}; used: {time.time() - start_time}s')
+            fromDate = highWaterMonth * 100 + 1
+            fetch_query = {**query, self.date_col: {
+                **dateCond, '$gte': max(dateCond.get('$gte', fromDate), fromDate)}}
+        fresh = read_data_by_query(fetch_query, col_list, mongodb, **read_args)
+        meta = self._write_months(key_dir, fresh, highWaterMonth, meta)
+        self._write_meta(key_dir, {
+            **meta,
+            'query': json.dumps(query, sort_keys=True, default=str),
+            'col_list': col_list,
+            'ts': datetime.now().isoformat(),
+        })
+        if cached is None or cached.shape[0] == 0:
+            return fresh
+        return pd.concat([cached, fresh], ignore_index=True)
+
+    def _month_file(self, key_dir: str, month: int) -> str:
+        return os.path.join(key_dir, f'{self.date_col}_month={month}.parquet')
+
+    def _months_on_disk(self, key_dir: str) -> dict:
+        """month -> file path of cached partitions"""
+        months = {}
+        if not os.path.isdir(key_dir):
+            return months
+        prefix = f'{self.date_col}_month='
+        for name in os.listdir(key_dir):
+            if name.startswith(prefix) and name.endswith('.parquet'):
+                month = int(name[len(prefix):-len('.parquet')])
+                months[month] = os.path.join(key_dir, name)
+        return months
+
+    def _read_months(
+        self,
+        key_dir: str,
+        beforeMonth: int,
+        jsonCols: list[str],
+    ) -> pd.DataFrame:
+        """Read all the cached months before beforeMonth"""
+        dfs = []
+        for month, path in sorted(self._months_on_disk(key_dir).items()):
+            if month < beforeMonth:
+                dfs.append(pq.read_table(path, memory_map=True).to_pandas())
+        if len(dfs) == 0:
+            return None
+        df = pd.concat(dfs, ignore_index=True)
+        for col in jsonCols:
+            if col in df.columns:
+                df[col] = df[col].map(_json_loads)
+        return df
+
+    def _write_months(
+        self,
+        key_dir: str,
+        df: pd.DataFrame,
+        fromMonth: int,
+        meta: dict,
+    ) -> dict:
+        """Write df partitioned by month, replacing months >= fromMonth"""
+        os.makedirs(key_dir, exist_ok=True)
+        if fromMonth is not None:
+            for month, path in self._months_on_disk(key_dir).items():
+                if month >= fromMonth:
+                    os.remove(path)
+        jsonCols = set(meta.get('jsonCols', [])) if meta else set()
+        df = df.loc[df[self.date_col].notna()]
+        if df.shape[0] == 0:
+            return {'highWaterMonth': fromMonth, 'jsonCols': sorted(jsonCols)}
+        # columns arrow can not convert, e.g. mixed types, are stored as json
+        toJson = []
+        for col in df.columns[df.dtypes == object]:
+            if col in jsonCols:
+                toJson.append(col)
+                continue
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                toJson.append(col)
+        if len(toJson) > 0:
+            df = df.copy()
+            for col in toJson:
+                df[col] = df[col].map(_json_dumps)
+            jsonCols.update(toJson)
+        months = (df[self.date_col] // 100).astype('int64')
+        for month, group in df.groupby(months.to_numpy(), sort=True):
+            pq.write_table(
+                pa.Table.from_pandas(group, preserve_index=False),
+                self._month_file(key_dir, int(month)))
+        return {
+            'highWaterMonth': int(months.max()),
+            'jsonCols': sorted(jsonCols),
+        }
+
+    def _read_meta(self, key_dir: str) -> dict:
+        path = os.path.join(key_dir, self.META_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, key_dir: str, meta: dict):
+        with open(os.path.join(key_dir, self.META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+
+def _json_dumps(value):
+    return None if value is None else json.dumps(value, default=str)
+
+
+def _json_loads(value):
+    return None if value is None else json.loads(value)
+
+
 def update_records(
     df: pd.DataFrame,
     col_list: list[str],
     db_col_list: list[str],
     id_index: int = 5,
     mongodb: MongoDB = None,
+    batch_size: int = 0,
+    workers: int = 1,
 ):
+    """Write the numeric columns of df back to mongodb properties.
+    Only non-zero numeric values are saved, and rows with less than 2 of
+    them are skipped.
+
+    Parameters
+    ==========
+    batch_size: int
+        number of UpdateOne operations in one unordered bulk write, e.g. UPDATE_BATCH_SIZE,
+        sent by the pymongo collection, see propertiesCollection.
+        0 or None (default) to update one row at a time.
+    workers: int
+        number of threads to send the bulk writes.
+    """
     if mongodb is None:
         mongodb = MongoDB()
     start_time = time.time()
@@ -141,32 +849,288 @@ def update_records(
         return
     df = df[to_save_col_list].copy()
     df.columns = not_none_db_col_list
-    data_to_save = df.to_dict(orient='index')
-    savedCount = 0
-    lastToSet = {}
-    lastId = ''
-    for key, value in data_to_save.items():
-        id = key[id_index]
-        # logger.debug(f'Updating key: {key} , id: {id}')
-        # only update the columns that are numeric
-        toSet = {}
-        for k, v in value.items():
-            if isinstance(v, (int, float)) and not isnan(v) and v != 0:
-                toSet[k] = v
-        if len(toSet) < 2:
-            # for value and accuracy, we need to update at least 2 columns
-            continue
-        mongodb.updateOne(
-            'properties',
-            {'_id': id},
-            {'$set': toSet}
-        )
-        lastId = id
-        lastToSet = toSet
-        savedCount += 1
+    # only update the columns that are numeric, not nan and not 0
+    valid = np.zeros(df.shape, dtype=bool)
+    for j, col in enumerate(not_none_db_col_list):
+        values = df.iloc[:, j]
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            valid[:, j] = (values.notna() & (values != 0)).to_numpy()
+        else:
+            valid[:, j] = values.map(
+                lambda v: isinstance(v, (int, float)) and not isnan(v) and v != 0).to_numpy()
+    # for value and accuracy, we need to update at least 2 columns
+    rowValid = valid.sum(axis=1) >= 2
+    skippedCount = int((~rowValid).sum())
+    rows = np.flatnonzero(rowValid)
+    ids = df.index.get_level_values(id_index)[rows].tolist()
+    columnValues = [df.iloc[rows, j].tolist()
+                    for j in range(len(not_none_db_col_list))]
+    valid = valid[rows]
+    toSetList = []
+    for i in range(len(rows)):
+        toSetList.append({not_none_db_col_list[j]: columnValues[j][i]
+                          for j in np.flatnonzero(valid[i])})
+    if batch_size:
+        matchedCount, modifiedCount = _bulk_update_records(
+            mongodb, ids, toSetList, batch_size, workers)
+    else:
+        matchedCount, modifiedCount = None, None
+        for id, toSet in zip(ids, toSetList):
+            mongodb.updateOne(
+                'properties',
+                {'_id': id},
+                {'$set': toSet}
+            )
     end_time = time.time()
+    lastId = ids[-1] if len(ids) > 0 else ''
+    lastToSet = toSetList[-1] if len(toSetList) > 0 else {}
     logger.info(
-        f'Saved {savedCount}/{df.shape[0]} rows, used: {end_time - start_time}s lastToSet({lastId}):{lastToSet}')
+        f'Saved {len(ids)}/{df.shape[0]} rows, matched: {matchedCount} modified: {modifiedCount} skipped: {skippedCount}, used: {end_time - start_time}s lastToSet({lastId}):{lastToSet}')
+
+
+def propertiesCollection(mongodb: MongoDB):
+    """The pymongo collection of properties, from the database of the MongoDB wrapper,
+    for the bulk writes it does not wrap.
+    """
+    return mongodb.db['properties']
+
+
+def _bulk_update_records(
+    mongodb: MongoDB,
+    ids: list,
+    toSetList: list[dict],
+    batch_size: int,
+    workers: int = 1,
+) -> tuple[int, int]:
+    """Send $set updates by unordered bulk_write in chunks of batch_size.
+    Returns the matched and modified counts.
+    """
+    collection = propertiesCollection(mongodb)
+
+    def write_chunk(chunkIndex: int, start: int):
+        chunk_start_time = time.time()
+        operations = [
+            UpdateOne({'_id': id}, {'$set': toSet})
+            for id, toSet in zip(ids[start:start + batch_size],
+                                 toSetList[start:start + batch_size])
+        ]
+        result = collection.bulk_write(operations, ordered=False)
+        logger.info(
+            f'bulk_write chunk {chunkIndex}: {len(operations)} ops, matched: {result.matched_count} modified: {result.modified_count}, used: {time.time() - chunk_start_time}s')
+        return result.matched_count, result.modified_count
+
+    starts = list(range(0, len(ids), batch_size))
+    if workers > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                write_chunk, range(len(starts)), starts))
+    else:
+        results = [write_chunk(i, start) for i, start in enumerate(starts)]
+    matchedCount = sum(r[0] for r in results)
+    modifiedCount = sum(r[1] for r in results)
+    return matchedCount, modifiedCount
+
+
+class ScaleIndex:
+    """Positional index of a grouped dataframe for slicing by scale.
+    One pass over the first 5 index levels (saletp-b, ptype2-l, prov, area, city)
+    records the contiguous row range of every level prefix.
+    When the rows of each leaf are sorted by date_col, a date window
+    is resolved by binary search in each leaf.
+    The dataframe must be sorted by the first 5 index levels.
+
+    Parameters
+    ==========
+    df: pd.DataFrame
+        the grouped dataframe
+    date_col: str
+        the yyyymmdd int column to filter date windows
+    """
+
+    LEVELS = 5
+
+    def __init__(self, df: pd.DataFrame, date_col: str = 'onD'):
+        self.df = df
+        self.date_col = date_col
+        self.ranges = {(): (0, len(df.index))}
+        # prefix => child prefixes in row order
+        self.children = {}
+        self.valid = True
+        self.date_sorted = False
+        index = df.index
+        n = len(index)
+        allLevelValues = [index.get_level_values(level)
+                          for level in range(self.LEVELS)]
+        changed = np.zeros(max(n - 1, 0), dtype=bool)
+        for level in range(self.LEVELS):
+            codes = np.asarray(index.codes[level])
+            changed |= codes[1:] != codes[:-1]
+            starts = np.concatenate([[0], np.flatnonzero(changed) + 1]) \
+                if n > 0 else np.array([], dtype=int)
+            stops = np.append(starts[1:], n)
+            levelValues = [allLevelValues[l].take(starts).tolist()
+                           for l in range(level + 1)]
+            for k in range(len(starts)):
+                prefix = tuple(v[k] for v in levelValues)
+                if prefix in self.ranges:
+                    # not contiguous, the index is not sorted
+                    self.valid = False
+                    return
+                self.ranges[prefix] = (int(starts[k]), int(stops[k]))
+                self.children.setdefault(prefix[:-1], []).append(prefix)
+        if date_col in df.columns:
+            self.dates = df[date_col].to_numpy()
+            # sorted within each leaf: no decrease except at leaf boundaries
+            increasing = self.dates[1:] >= self.dates[:-1]
+            self.date_sorted = bool(np.all(increasing | changed))
+
+    def ranges_of(self, keys: list, leaves: bool = False) -> list[tuple[int, int]]:
+        """Row ranges of the level keys, None for any value of a level.
+        Returns one range per leaf when leaves is True.
+        """
+        lastLevel = max((i for i, k in enumerate(keys) if k is not None),
+                        default=-1)
+        depth = self.LEVELS if leaves else lastLevel + 1
+        prefixes = [()]
+        for level in range(depth):
+            key = keys[level]
+            nextPrefixes = []
+            for prefix in prefixes:
+                if key is None:
+                    nextPrefixes.extend(self.children.get(prefix, []))
+                elif (prefix + (key,)) in self.ranges:
+                    nextPrefixes.append(prefix + (key,))
+            prefixes = nextPrefixes
+        return [self.ranges[p] for p in prefixes]
+
+    def narrow_dates(
+        self,
+        leafRanges: list[tuple[int, int]],
+        dateFrom: int,
+        dateTo: int,
+    ) -> list[tuple[int, int]]:
+        """Narrow leaf ranges to dateFrom <= date <= dateTo by binary search"""
+        narrowed = []
+        for start, stop in leafRanges:
+            dates = self.dates[start:stop]
+            narrowed.append((
+                start + int(np.searchsorted(dates, dateFrom, side='left')),
+                start + int(np.searchsorted(dates, dateTo, side='right')),
+            ))
+        return narrowed
+
+    def take(self, ranges: list[tuple[int, int]]) -> pd.DataFrame:
+        """Rows of the ranges. A single range is a positional slice."""
+        ranges = [(start, stop) for start, stop in ranges if stop > start]
+        if len(ranges) == 0:
+            return self.df.iloc[0:0]
+        if len(ranges) == 1:
+            return self.df.iloc[ranges[0][0]:ranges[0][1]]
+        return self.df.iloc[np.concatenate(
+            [np.arange(start, stop) for start, stop in ranges])]
+
+
+def sortByScaleAndDate(df: pd.DataFrame, date_col: str = 'onD') -> pd.DataFrame:
+    """Sort the rows of each (saletp-b, ptype2-l, prov, area, city) leaf
+    by date_col, keeping the leaves in order. df must be sorted by the leaves.
+    """
+    if date_col not in df.columns or len(df.index) == 0:
+        return df
+    changed = np.zeros(len(df.index) - 1, dtype=bool)
+    for level in range(ScaleIndex.LEVELS):
+        codes = np.asarray(df.index.codes[level])
+        changed |= codes[1:] != codes[:-1]
+    leafId = np.concatenate([[0], np.cumsum(changed)])
+    order = np.lexsort((df[date_col].to_numpy(), leafId))
+    return df.iloc[order]
+
+
+def filterSignature(filter_func: Union[Callable, dict]):
+    """Hashable signature of a get_df filter_func, for the scale cache.
+    A dict is compared by value, a callable by itself.
+    Returns None for an unhashable callable, which can not be cached.
+    """
+    if filter_func is None:
+        return ()
+    if isinstance(filter_func, dict):
+        return json.dumps(filter_func, sort_keys=True, default=str)
+    try:
+        hash(filter_func)
+    except TypeError:
+        return None
+    return filter_func
+
+
+def readOnlyFrame(df: pd.DataFrame) -> pd.DataFrame:
+    """Mark the arrays of the blocks of df read-only, in place, so a write into
+    the shared rows of the scale cache raises instead of changing them.
+    df must not hold the arrays of df_grouped itself, e.g. a slice or a take of it.
+    """
+    for block in df._mgr.blocks:
+        values = block.values
+        # numpy blocks, and the codes of a Categorical
+        for array in (values, getattr(values, '_ndarray', None)):
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+    return df
+
+
+class ScaleDataCache:
+    """LRU cache of the get_df rows of the scales, evicted by bytes.
+    Each entry holds the rows and the frame of each column request,
+    so the estimate managers of the same scale share one slice without copies.
+    The cached frames are read-only, see readOnlyFrame.
+
+    Parameters
+    ==========
+    max_bytes: int
+        the memory of the cached rows. 0 to disable the cache.
+    """
+
+    def __init__(self, max_bytes: int = SCALE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key => (entry, bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        found = self.entries.get(key)
+        if found is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return found[0]
+
+    def put(self, key, entry, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (entry, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all the entries, e.g. when df_grouped changed. The stats are kept."""
+        if len(self.entries) > 0:
+            logger.debug(f'Clear scale cache: {self.stats()}')
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+        }
 
 
 class DataSource:
@@ -184,6 +1148,14 @@ class DataSource:
         the extra query combined to the scale to read data from mongodb
     col_list: list[str]
         the columns to read from mongodb
+    cache_dir: str, optional
+        the directory to cache raw data as Parquet files. No cache if None.
+    read_workers: int
+        number of threads to read mongodb, see read_data_by_query
+    read_batch_size: int
+        number of _id in one parallel read range
+    scale_cache_bytes: int
+        memory of the get_df rows cached by scale, see ScaleDataCache. 0 to disable.
     """
 
     all_data_query = {
@@ -217,23 +1189,34 @@ class DataSource:
         'insur_bldg', 'tv',
         'pets', 'laundry', 'laundry_lev',
         'daddr', 'commuId', 'park_fac',
-        'comm', 'rltr', 'la', 'la2',
+        'comm', 'rltr', 'la', 'la2', MODIFIED_COLUMN,
     ]
 
     def __init__(
         self,
         scale: Union[EstimateScale, list[EstimateScale]],
         query: dict = None,
-        col_list: list[str] = None
+        col_list: list[str] = None,
+        cache_dir: str = None,
+        read_workers: int = 1,
+        read_batch_size: int = READ_BATCH_SIZE,
+        scale_cache_bytes: int = SCALE_CACHE_BYTES,
     ):
         """Initialize DataSource object.
         """
         self.scale = scale
         self.query = query
         self.col_list = col_list if col_list else DataSource.all_data_col_list
+        self.cache_dir = cache_dir
+        self.read_workers = read_workers
+        self.read_batch_size = read_batch_size
         self.df_raw = None
         self.df_transformed = None
         self.df_grouped = None
+        self._scale_row_counts = None
+        self._scale_index = None
+        self._other_scale_index = None
+        self.scale_cache = ScaleDataCache(scale_cache_bytes)
         if isinstance(scale, list):
             # or condition for scale tuple
             or_query = []
@@ -246,52 +1229,126 @@ class DataSource:
     def __str__(self):
         return f'DataSource: {self._query}'
 
+    @staticmethod
+    def plan_col_list(
+        managers: list,
+        from_models: bool = False,
+        col_list: list[str] = None,
+        base_cols: list[str] = PLAN_BASE_COLUMNS,
+    ) -> list[str]:
+        """Plan the minimal col_list to read from mongodb for the estimate managers.
+        The columns the managers use are mapped back to the source fields by sourceFields.
+
+        Parameters
+        ==========
+        managers: list
+            the estimate managers to read the data for, or their classes
+            before the managers are built, see load_raw_data
+        from_models: bool
+            use the x_cols of the trained or loaded models, for prediction.
+            Otherwise use x_columns, y_column and the dict filter_func of the managers.
+        col_list: list[str]
+            the fields to choose from, all_data_col_list by default.
+            It is returned as is when a manager may use any column:
+            no x_columns, uses_additional_x_cols (the RmBaseEstimateManager default),
+            additional_x_cols, or a callable filter_func.
+        base_cols: list[str]
+            the fields always read
+        """
+        col_list = col_list or DataSource.all_data_col_list
+        columns = []
+        for manager in managers:
+            if from_models:
+                scales = getattr(manager, 'scales', None)
+                scales = scales.values() if scales is not None else \
+                    [s for s in [getattr(manager, 'scale', None)] if s is not None]
+                if len(scales) == 0:
+                    logger.info(
+                        f'{_managerName(manager)} has no scale, read all columns')
+                    return list(col_list)
+                key = manager.__model_key__()
+                for scale in scales:
+                    if key in scale.meta:
+                        columns.extend(scale.meta[key]['x_cols'])
+                continue
+            filter_func = getattr(manager, 'filter_func', None)
+            if not getattr(manager, 'x_columns', None) or \
+                    getattr(manager, 'uses_additional_x_cols', False) or \
+                    getattr(manager, 'additional_x_cols', None) or callable(filter_func):
+                logger.info(
+                    f'{_managerName(manager)} may use any column, read all of them')
+                return list(col_list)
+            columns.extend(manager.x_columns)
+            if getattr(manager, 'y_column', None):
+                columns.append(manager.y_column)
+            if isinstance(filter_func, dict):
+                columns.extend(filter_func.keys())
+        planned = sourceFields(list(base_cols) + columns, col_list)
+        logger.info(
+            f'Planned {len(planned)} of {len(col_list)} columns: {planned}')
+        return planned
+
     def get_query(self):
         return self._query
 
-    def load_raw_data(self):
-        """Load raw data from mongodb"""
-        self.df_raw = read_data_by_query(
-            self._query, self.col_list)
-        self._build_prov_city_to_area()
+    def load_raw_data(self, incremental_area_map: bool = True, managers: list = None):
+        """Load raw data from mongodb
+
+        Parameters
+        ==========
+        incremental_area_map: bool
+            if True, only rows newer than the saved area tally are counted
+            to update the prov/city to area map.
+        managers: list
+            the estimate manager classes (or managers) to train.
+            If set, self.col_list is narrowed to their columns by plan_col_list.
+        """
+        if managers:
+            self.col_list = self.plan_col_list(managers, col_list=self.col_list)
+        self.df_raw = self._read(self._query, cache_dir=self.cache_dir)
+        # build map and write to file
+        self._build_prov_city_to_area(
+            write_to_file=True, incremental=incremental_area_map)
+        # only the area map uses the modification time, it is not a feature
+        self.df_raw.drop(columns=[MODIFIED_COLUMN], inplace=True, errors='ignore')
         self._fill_df_raw_area()
-        self._build_prov_city_to_area(True)  # rebuild map and write to file
         self._build_scale_tree()
 
     def _fill_df_raw_area(self):
         """Fill area column in df_raw"""
-        global PROV_CITY_TO_AREA, gEmptyAreaCount
-        self.df_raw['area'] = self.df_raw.apply(fill_row_area, axis=1)
-        logger.info(f'Empty area rows: {gEmptyAreaCount}')
-
-    def _build_prov_city_to_area(self, write_to_file=False):
-        """Build PROV_CITY_TO_AREA dict from df_raw"""
-        global PROV_CITY_TO_AREA, PROV_CITY_TO_AREA_COUNT
-        # reset global dict count to empty
-        setCounterToZero()
-        for prov, area, city in self.df_raw[['prov', 'area', 'city']].values:
-            if isinstance(area, str) and area != '' and isinstance(city, str) and city != '' and isinstance(prov, str) and prov != '':
-                if PROV_CITY_TO_AREA_COUNT.get((prov, city), 0) == 0:
-                    PROV_CITY_TO_AREA[(prov, city)] = area
-                    PROV_CITY_TO_AREA_COUNT[(prov, city)] = 1
-                else:  # not exist
-                    if PROV_CITY_TO_AREA[(prov, city)] == area:
-                        PROV_CITY_TO_AREA_COUNT[(prov, city)] += 1
-                        continue
-                    # conflict
-                    change = False
-                    areaBeforeChange = PROV_CITY_TO_AREA[(prov, city)]
-                    if PROV_CITY_TO_AREA_COUNT[(prov, city)] < 20:
-                        # change to new area if count < 10
-                        PROV_CITY_TO_AREA[(prov, city)] = area
-                        # reset count to 1
-                        PROV_CITY_TO_AREA_COUNT[(prov, city)] = 1
-                        change = True
-                    if PROV_CITY_TO_AREA_COUNT[(prov, city)] < 100:
-                        # only log conflict if conflict count < 100
-                        logger.warning(
-                            f'PROV_CITY_TO_AREA conflict: {(prov, city)}: {areaBeforeChange} {PROV_CITY_TO_AREA_COUNT[(prov, city)]} vs New:{area}. {"Change to New" if change else "Keep old value"}')
+        self.df_raw['area'], emptyAreaCount = fillArea(self.df_raw)
+        logger.info(f'Empty area rows: {emptyAreaCount}')
 
+    def _build_prov_city_to_area(self, write_to_file=False, incremental=False):
+        """Build PROV_CITY_TO_AREA dict from df_raw.
+        The tally is kept by query, and an incremental update counts the rows
+        modified after the last tally of the same query. The rows counted before
+        are replaced by their new prov, city, area, from the _id rows kept with the tally.
+        """
+        signature = querySignature(self._query)
+        previous_counts = readProvCityAreaCount(signature) if incremental else None
+        previous_ids = readProvCityAreaIds(signature) if previous_counts is not None else None
+        recounted = None
+        df = self.df_raw
+        if previous_counts is not None:
+            cutoff = previous_counts['maxModified'].max()
+            if previous_ids is not None and (MODIFIED_COLUMN in df.columns) and not pd.isna(cutoff):
+                df = df.loc[(pd.to_datetime(df[MODIFIED_COLUMN]) > cutoff).to_numpy()]
+                modifiedIds = previous_ids['_id'].isin(df['_id'].astype(str)).to_numpy()
+                recounted = previous_ids.loc[modifiedIds]
+                previous_ids = previous_ids.loc[~modifiedIds]
+                logger.info(
+                    f'Update PROV_CITY_TO_AREA with {df.shape[0]} rows modified after {cutoff}, {recounted.shape[0]} counted before')
+            else:
+                previous_counts = previous_ids = None
+        counts = buildProvCityToArea(
+            df, previous_counts=previous_counts, recounted=recounted)
+        if write_to_file:
+            writeProvCityAreaCount(counts, signature)
+            ids = areaKeysById(df)
+            if previous_ids is not None:
+                ids = pd.concat([previous_ids, ids], ignore_index=True)
+            writeProvCityAreaIds(ids, signature)
         calcProvCityToAreaDF(write_to_file=write_to_file)
         return PROV_CITY_TO_AREA
 
@@ -299,28 +1356,50 @@ class DataSource:
         self,
         id_list: list[str] = None,
         preprocessor: Preprocessor = None,
+        chunk_size: int = PREDICT_CHUNK_SIZE,
+        managers: list = None,
     ) -> pd.DataFrame:
         """Load new data from mongodb.
         This function is used to load new data from mongodb for prediction.
+        All the data is in memory at once, use iter_df_grouped to stream it.
+        When the trained or loaded managers are given, only the fields of their models are read,
+        see plan_col_list.
         """
-        global PROV_CITY_TO_AREA
+        col_list = self.plan_col_list(managers, from_models=True, col_list=self.col_list) \
+            if managers else None
         query = {'_id': {'$in': id_list}}
         idCount = len(id_list)
         logger.info(f'query ids: {idCount}')
-        if idCount > 500000:  # 500K, query has a limit of 16MB
+        if idCount > chunk_size:  # query has a limit of 16MB
             # split query
             df_raws = []
-            while idCount > 0:
-                query['_id']['$in'] = id_list[:500000]
-                df_raws.append(read_data_by_query(query, self.col_list))
-                id_list = id_list[500000:]
-                idCount = len(id_list)
+            for ids in self._id_chunks(id_list, chunk_size):
+                df_raws.append(self._read({'_id': {'$in': ids}}, col_list=col_list))
             df_raw_to_predict = pd.concat(df_raws)
         else:
-            df_raw_to_predict = read_data_by_query(query, self.col_list)
+            df_raw_to_predict = self._read(query, col_list=col_list)
+        return self._group_to_predict(df_raw_to_predict, preprocessor)
+
+    def _read(self, query: dict, cache_dir: str = None, col_list: list[str] = None) -> pd.DataFrame:
+        return read_data_by_query(
+            query, col_list or self.col_list, cache_dir=cache_dir,
+            workers=self.read_workers, batch_size=self.read_batch_size)
+
+    @staticmethod
+    def _id_chunks(id_list: list[str], chunk_size: int):
+        for start in range(0, len(id_list), chunk_size):
+            yield id_list[start:start + chunk_size]
+
+    def _group_to_predict(
+        self,
+        df_raw_to_predict: pd.DataFrame,
+        preprocessor: Preprocessor,
+    ) -> pd.DataFrame:
+        """Fill area, transform and group the raw data to predict."""
+        df_raw_to_predict = df_raw_to_predict.drop(columns=[MODIFIED_COLUMN], errors='ignore')
         # fill missing area
-        df_raw_to_predict['area'] = df_raw_to_predict.apply(
-            lambda row: PROV_CITY_TO_AREA.get((row['prov'], row['city']), 'Other'), axis=1)
+        df_raw_to_predict['area'] = lookupArea(
+            df_raw_to_predict, default='Other')
         logger.debug(PROV_CITY_TO_AREA)
         logger.debug(df_raw_to_predict[['prov', 'area', 'city']])
         df_transformed_to_predict = preprocessor.transform(df_raw_to_predict)
@@ -336,11 +1415,96 @@ class DataSource:
         )
         return df_grouped_to_predict
 
+    def iter_df_grouped(
+        self,
+        id_list: list[str],
+        preprocessor: Preprocessor,
+        chunk_size: int = PREDICT_CHUNK_SIZE,
+        prefetch: bool = True,
+        col_list: list[str] = None,
+    ):
+        """Yield the grouped data to predict, one chunk of ids at a time.
+        Only one chunk is processed at a time, so the memory does not grow with id_list:
+        the scale index of a chunk is dropped when the next one is read.
+
+        Parameters
+        ==========
+        chunk_size: int
+            number of ids in one chunk
+        prefetch: bool
+            read the next chunk from mongodb in a background thread
+            while the current one is transformed and used.
+        col_list: list[str]
+            the fields to read, self.col_list by default
+        """
+        chunks = list(self._id_chunks(id_list, chunk_size))
+        logger.info(f'query ids: {len(id_list)} in {len(chunks)} chunks')
+
+        def read(ids):
+            return self._read({'_id': {'$in': ids}}, col_list=col_list)
+        if not prefetch:
+            for ids in chunks:
+                yield self._group_to_predict(read(ids), preprocessor)
+                self._other_scale_index = None
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(read, chunks[0]) if chunks else None
+            for i in range(len(chunks)):
+                df_raw = future.result()
+                future = executor.submit(read, chunks[i + 1]) \
+                    if i + 1 < len(chunks) else None
+                yield self._group_to_predict(df_raw, preprocessor)
+                del df_raw
+                # the index holds the estimated chunk
+                self._other_scale_index = None
+
+    def predict_stream(
+        self,
+        id_list: list[str],
+        preprocessor: Preprocessor,
+        managers: list,
+        chunk_size: int = PREDICT_CHUNK_SIZE,
+        writeback: bool = True,
+    ) -> int:
+        """Estimate and write back id_list chunk by chunk, see iter_df_grouped.
+
+        Parameters
+        ==========
+        managers: list
+            trained or loaded estimate managers, in order. Each one provides
+            estimate(df_grouped) -> (df_y, y_cols, y_db_cols), and its estimates
+            are written to the chunk before the next manager runs.
+        writeback: bool
+            also save the estimates to mongodb
+
+        Only the fields of the managers' models are read, see plan_col_list.
+        Returns the number of rows estimated.
+        """
+        col_list = self.plan_col_list(
+            managers, from_models=True, col_list=self.col_list)
+        rowCount = 0
+        for i, df_grouped in enumerate(self.iter_df_grouped(
+                id_list, preprocessor, chunk_size=chunk_size, col_list=col_list)):
+            start_time = time.time()
+            for manager in managers:
+                df_y, y_cols, y_db_cols = manager.estimate(df_grouped)
+                if df_y is None:
+                    continue
+                self.writeback(y_cols, df_y, df_grouped=df_grouped,
+                               db_col=y_db_cols if writeback else None)
+            rowCount += df_grouped.shape[0]
+            logger.info(
+                f'Estimated chunk {i}: {df_grouped.shape[0]} rows; used: {time.time() - start_time}s')
+        return rowCount
+
     def concat_df_grouped(self, df_grouped: pd.DataFrame):
         """Concat grouped data with new data.
         """
         self.df_grouped = pd.concat(
             [self.df_grouped, df_grouped], axis=0)
+        self._scale_row_counts = None
+        self._scale_index = None
+        self.scale_cache.clear()
 
     def getLeafScales(
         self,
@@ -366,18 +1530,20 @@ class DataSource:
         else:
             self.scale.buildAllSubScales(PROV_CITY_TO_AREA_DF)
 
-    def transform_data(self, preprocessor: Preprocessor = None, clear_data: bool = True):
+    def transform_data(self, preprocessor: Preprocessor = None, clear_data: bool = True, managers: list = None):
         """ Transform data with preprocessor then group them.
         If raw data is not loaded, load it first.
         Args:
             preprocessor (Preprocessor, optional): Defaults to None.
                 provide fit_transform method to transform df_raw to df_transformed.
+            managers (list, optional): the estimate manager classes to train,
+                to read only their columns, see load_raw_data.
 
         Returns:
             DataFrame: transformed DataFrame.
         """
         if self.df_raw is None:
-            self.load_raw_data()
+            self.load_raw_data(managers=managers)
         self.df_transformed = preprocessor.fit_transform(self.df_raw)
         self.encoded_hot = preprocessor.encoded_hot
         # groupby and reindex by EstimateScale
@@ -390,35 +1556,19 @@ class DataSource:
             ascending=[True, True, True, True, True],
             inplace=False,
         )
+        # date windows of a leaf are then resolved by binary search
+        self.df_grouped = sortByScaleAndDate(self.df_grouped)
+        self._scale_row_counts = None
+        self._scale_index = None
+        self.scale_cache.clear()
         if clear_data:
             self.df_raw = None
             self.df_transformed = None
         return self.df_grouped
 
-    # @debug
-    def get_df(
-        self,
-        scale: EstimateScale,
-        cols: list[str] = None,
-        date_span: int = 180,
-        need_raw: bool = False,
-        suffix_list: list[str] = None,
-        copy: bool = False,
-        sample_size: int = None,
-        filter_func: (pd.Series) = None,
-        numeric_columns_only: bool = False,
-        prefer_estimated: bool = False,
-        df_grouped: pd.DataFrame = None,
-        ad_cols: list[str] = None
-    ):
-        """Get dataframe from stored data.
-        """
-        if date_span is None:
-            date_span = 180
-        if suffix_list is None:
-            suffix_list = ['-b', '-n', '-c']
+    def _scale_slices(self, scale: EstimateScale) -> list[slice]:
+        """Get the df_grouped index slices of scale."""
         slices = []
-        # filter data by scale and date_span
         # saletp_b
         if scale.sale is True:
             slices.append(slice(0, 0))
@@ -445,26 +1595,164 @@ class DataSource:
         else:
             slices.append(slice(None))
         slices.append(slice(None))
+        return slices
+
+    def _scale_keys(self, scale: EstimateScale) -> list:
+        """Get the first 5 df_grouped index level values of scale, None for any."""
+        if scale.sale is True:
+            sale = 0
+        elif scale.sale is False:
+            sale = 1
+        else:
+            sale = None
+        return [sale, scale.propType, scale.prov, scale.area, scale.city]
+
+    def get_scale_index(self, df_grouped: pd.DataFrame = None) -> ScaleIndex:
+        """Get the ScaleIndex of df_grouped, built on first use.
+        Returns None when df_grouped can not be indexed.
+        """
+        if df_grouped is None:
+            df_grouped = self.df_grouped
+        if not isinstance(df_grouped.index, pd.MultiIndex) or \
+                df_grouped.index.nlevels < ScaleIndex.LEVELS:
+            return None
+        if df_grouped is self.df_grouped:
+            if self._scale_index is None or self._scale_index.df is not df_grouped:
+                self._scale_index = ScaleIndex(df_grouped)
+            scaleIndex = self._scale_index
+        else:
+            # e.g. the data to predict
+            if self._other_scale_index is None or self._other_scale_index.df is not df_grouped:
+                self._other_scale_index = ScaleIndex(df_grouped)
+            scaleIndex = self._other_scale_index
+        return scaleIndex if scaleIndex.valid else None
+
+    def scale_positions(self, scale: EstimateScale, df_grouped: pd.DataFrame = None) -> np.ndarray:
+        """Row positions of scale in df_grouped, without date filter.
+        Returns None when df_grouped can not be indexed.
+        """
+        scaleIndex = self.get_scale_index(df_grouped)
+        if scaleIndex is None:
+            return None
+        ranges = scaleIndex.ranges_of(self._scale_keys(scale))
+        if len(ranges) == 0:
+            return np.array([], dtype=np.intp)
+        return np.concatenate([np.arange(start, stop) for start, stop in ranges])
+
+    def count_scale_rows(self, scale: EstimateScale) -> int:
+        """Count the rows of scale in df_grouped without slicing the data."""
+        if self._scale_row_counts is None:
+            self._scale_row_counts = self.df_grouped.groupby(
+                level=[0, 1, 2, 3, 4], sort=True).size()
+        counts = self._scale_row_counts.loc[tuple(
+            self._scale_slices(scale)[:5])]
+        return int(counts.sum())
+
+    # @debug
+    def get_df(
+        self,
+        scale: EstimateScale,
+        cols: list[str] = None,
+        date_span: int = 180,
+        need_raw: bool = False,
+        suffix_list: list[str] = None,
+        copy: bool = False,
+        sample_size: int = None,
+        filter_func: Union[Callable, dict] = None,
+        numeric_columns_only: bool = False,
+        prefer_estimated: bool = False,
+        df_grouped: pd.DataFrame = None,
+        ad_cols: list[str] = None
+    ):
+        """Get dataframe from stored data.
+        The rows of self.df_grouped are cached in scale_cache by
+        (scale, date_span, filter_func, sample_size), with the frame of each column request.
+        Without copy, the returned frame is a shallow copy of the cached one: columns can be
+        added or replaced, but its arrays are shared and read-only, so writing into them
+        (e.g. df.loc[...] = ...) raises ValueError. Use copy=True for a private, writable copy.
+        """
+        if date_span is None:
+            date_span = 180
+        if suffix_list is None:
+            suffix_list = ['-b', '-n', '-c']
         if df_grouped is None: # yes, its None and we use df.grouped (final data frame)
             df_grouped = self.df_grouped
-            
-        rd = df_grouped.loc[tuple(slices), :]
-                
-        logger.debug(f'{slices} {len(df_grouped.index)}=>{len(rd.index)}')
-        
-        if len(rd.index) == 0:
+        signature = filterSignature(filter_func)
+        cache = self.scale_cache if (df_grouped is self.df_grouped and signature is not None
+                                     and self.scale_cache.max_bytes > 0) else None
+        # the fields of scale that select the rows, not its repr
+        rowKey = tuple(self._scale_keys(scale)) + (scale.datePoint, date_span, signature, sample_size)
+        entry = cache.get(rowKey) if cache is not None else None
+        if entry is None:
+            rd = self._scale_rows(
+                scale, date_span, filter_func, sample_size, df_grouped)
+            if rd is not None:
+                readOnlyFrame(rd)
+            entry = {'rows': rd, 'frames': {},
+                     'bytes': 0 if rd is None else int(rd.memory_usage(index=True).sum())}
+            if cache is not None:
+                cache.put(rowKey, entry, entry['bytes'])
+        rd = entry['rows']
+        if rd is None:
             return None
+        columnKey = (tuple(cols) if cols is not None else None, tuple(suffix_list),
+                     need_raw, bool(ad_cols), numeric_columns_only, prefer_estimated)
+        frame = entry['frames'].get(columnKey)
+        if frame is None:
+            columns = self._select_columns(
+                rd, cols, suffix_list, need_raw, ad_cols,
+                numeric_columns_only, prefer_estimated)
+            if columns == list(rd.columns):
+                frame = entry['frames'][columnKey] = rd
+            else:
+                frame = readOnlyFrame(rd.loc[:, columns])
+                # the column frame is cached with its rows, when it fits
+                size = entry['bytes'] + int(frame.memory_usage(index=False).sum())
+                if cache is not None and size <= cache.max_bytes:
+                    entry['frames'][columnKey] = frame
+                    entry['bytes'] = size
+                    cache.put(rowKey, entry, size)
+        return frame.copy(deep=copy)
+
+    def _scale_rows(
+        self,
+        scale: EstimateScale,
+        date_span: int,
+        filter_func: Union[Callable, dict],
+        sample_size: int,
+        df_grouped: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """The rows of get_df: scale, date_span, filter_func and sample_size applied."""
+        dateFrom = dateToInt(scale.datePoint - timedelta(days=date_span))
+        dateTo = dateToInt(scale.datePoint)
+        dateFiltered = False
+        scaleIndex = self.get_scale_index(df_grouped)
+        if scaleIndex is not None:
+            # positional slices from the precomputed scale index
+            useIndexDates = (date_span > 0) and scaleIndex.date_sorted
+            ranges = scaleIndex.ranges_of(
+                self._scale_keys(scale), leaves=useIndexDates)
+            if sum(stop - start for start, stop in ranges) == 0:
+                return None
+            if useIndexDates:
+                ranges = scaleIndex.narrow_dates(ranges, dateFrom, dateTo)
+                dateFiltered = True
+            rd = scaleIndex.take(ranges)
+            logger.debug(f'{scale} {len(df_grouped.index)}=>{len(rd.index)}')
+        else:
+            slices = self._scale_slices(scale)
+            rd = df_grouped.loc[tuple(slices), :]
+            logger.debug(f'{slices} {len(df_grouped.index)}=>{len(rd.index)}')
+            if len(rd.index) == 0:
+                return None
         
         # onD:
             
         #rd.to_excel("what's_popin00.xlsx")
         
         
-        if date_span > 0: # problem is here
-            rd = rd.loc[rd.onD.between(
-                dateToInt(scale.datePoint - timedelta(days=date_span)),
-                dateToInt(scale.datePoint)
-            )]
+        if date_span > 0 and not dateFiltered: # problem is here
+            rd = rd.loc[rd.onD.between(dateFrom, dateTo)]
         
         logger.debug(
             f'{scale.datePoint-timedelta(days=date_span)}-{scale.datePoint} {len(rd.index)}')
@@ -478,8 +1766,7 @@ class DataSource:
         
         # filter data by filter_func
         if filter_func is not None:
-            bol = rd.apply(filter_func, axis=1, result_type='reduce')
-            rd = rd.loc[bol]
+            rd = rd.loc[filterMask(rd, filter_func)]
         
         logger.debug(f'after filter_func {len(rd.index)}')
   
@@ -490,55 +1777,37 @@ class DataSource:
         if sample_size is not None and sample_size < rd.shape[0]:
             rd = rd.sample(n=sample_size, random_state=1)
             
-        rd.to_excel("what's_popin1.xlsx")
-        
+        getArtifactSink().artifact('get_df', rd)
+        return rd
+
+    def _select_columns(
+        self,
+        rd: pd.DataFrame,
+        cols: list[str],
+        suffix_list: list[str],
+        need_raw: bool,
+        ad_cols: list[str],
+        numeric_columns_only: bool,
+        prefer_estimated: bool,
+    ) -> list[str]:
+        """The columns of get_df."""
         # select columns from cols
-        existing_cols = rd.columns.tolist()
-        
-        if cols is not None:
-            columns = []
-            for col in cols:
-                found = False
-                # {zip}, {zip-n} {zip,zip-n}
-                # ['-b', '-n', '-c', '-l', ]:  '-l' is only in 'ptype2-l'
-                for suffix in suffix_list:
-                    for c in existing_cols:
-                        if c.startswith(col) and c.endswith(suffix):
-                            columns.append(c)
-                            # logger.debug(f'column[{col}] found as [{c}]')
-                            found = True
-                if (col in existing_cols) and (need_raw or not found):
-                    columns.append(col)
-                    # logger.debug(f'column[{col}] found as [{c}] (raw)')
-                    found = True
-                if not found:
-                    logger.debug(f'column[{col}] not found')
-            columns = list(dict.fromkeys(columns))  # remove duplicates
-        else:
-            columns = existing_cols
-            
-        # ad_cols is refering to the self.encoded_hot in preposcesor.py 
-        
-        if ad_cols: # should boolean value
-            one = set(columns) # derived fearue from default
-            two = set(cols) # the default features
-            three = set(existing_cols)
-            u = one.union(two)
-            dif = list(three.difference(u))
-            
-            columns = columns + dif # subject to change!
+        columns = list(resolveColumns(
+            tuple(rd.columns),
+            tuple(cols) if cols is not None else None,
+            tuple(suffix_list),
+            need_raw,
+            bool(ad_cols),  # ad_cols is refering to the self.encoded_hot in preposcesor.py
+        ))
         
-        rd = rd.loc[:, columns]
         #rd.to_excel("what's_popin333.xlsx")
         
         # if numeric_columns_only is True, only keep numeric columns
         if numeric_columns_only:
-            numeric_columns = self.get_numeric_columns(
-                df=rd, prefer_estimated=prefer_estimated)
-            rd = rd.loc[:, numeric_columns]
-        # return dataframe or copy
+            columns = self.get_numeric_columns(
+                df=rd.loc[:, columns], prefer_estimated=prefer_estimated)
         #rd.to_excel("what's_popin2.xlsx")
-        return rd.copy() if copy else rd
+        return columns
 
     def get_numeric_columns(
         self,
@@ -563,9 +1832,9 @@ class DataSource:
         for col in df.columns:
             print(col, df[col].dtype)
             try:
+                # any numeric dtype, including the sparse one-hot columns
                 if (col not in exclude_columns) and \
-                    (df[col].dtype == 'float64' or
-                     df[col].dtype == 'int64'):
+                        is_numeric_dtype(df[col].dtype):
                     numeric_columns.append(col)
             except Exception as e:
                 self.logger.error(
@@ -589,11 +1858,17 @@ class DataSource:
         y: Union[pd.Series, pd.DataFrame],
         df_grouped: pd.DataFrame = None,
         db_col: Union[str, list[str]] = None,
+        batch_size: int = UPDATE_BATCH_SIZE,
+        workers: int = 1,
     ) -> None:
-        """write y to df_grouped
+        """write y to df_grouped, and to the db_col fields of mongodb properties when db_col is set.
+        batch_size and workers are passed to update_records: 0 to update one row at a time.
         """
         if df_grouped is None:
             df_grouped = self.df_grouped
+        if df_grouped is self.df_grouped:
+            # the cached rows may be copies without the new values
+            self.scale_cache.clear()
         yIsSeries = False
         if isinstance(y, pd.Series):
             yIsSeries = True
@@ -624,7 +1899,8 @@ class DataSource:
                 raise Exception(
                     f'db_col must be str or list[str], but got {type(db_col)}')
             update_records(df_grouped, col_list=col,
-                           db_col_list=db_col, id_index=5)
+                           db_col_list=db_col, id_index=5,
+                           batch_size=batch_size, workers=workers)
         return df_grouped
 
 
@@ -1,15 +1,53 @@
+from base.artifact_sink import getArtifactSink
 from base.const import MODEL_TYPE_REGRESSION, TRAINING_MIN_ROWS
 from base.timer import Timer
 from base.util import logDataframeChange
 from data.estimate_scale import EstimateScale
 from estimator.rmbase_estimate_manager import RmBaseEstimateManager
+from transformer.preprocessor import FLOAT32_MAX_INT
 import lightgbm as lgb
+import numpy as np
 import pandas as pd
+import scipy.sparse
 from math import isnan
 from sklearn.model_selection import train_test_split, RepeatedKFold, cross_val_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 
+# the LightGBM aliases of the number of threads
+LGBM_THREAD_PARAMS = ('n_jobs', 'num_threads', 'num_thread', 'nthread', 'nthreads')
+
+
+def isSparseColumn(df: pd.DataFrame, col: str) -> bool:
+    return isinstance(df[col].dtype, pd.SparseDtype)
+
+
+def toModelInput(df: pd.DataFrame, x_cols: list[str]):
+    """df[x_cols] as LightGBM input.
+    When some columns are pandas sparse (one-hot), return a CSR matrix in x_cols order,
+    without densifying them. Otherwise return the dataframe.
+    The matrix is float32, or float64 when a dense value is too large for float32, e.g. onD,
+    like FeatureLayout.
+    """
+    sparse_cols = [col for col in x_cols if isSparseColumn(df, col)]
+    if not sparse_cols:
+        return df[x_cols]
+    dense_cols = [col for col in x_cols if col not in set(sparse_cols)]
+    blocks = []
+    dtype = np.float32
+    if dense_cols:
+        dense = df[dense_cols].to_numpy(dtype=np.float64)
+        if np.all(np.abs(dense[np.isfinite(dense)]) < FLOAT32_MAX_INT):
+            dense = dense.astype(np.float32)
+        dtype = dense.dtype
+        blocks.append(scipy.sparse.csr_matrix(dense))
+    blocks.append(df[sparse_cols].sparse.to_coo().astype(dtype))
+    X = scipy.sparse.hstack(blocks, format='csc')
+    # back to the x_cols order, the model features are positional
+    positions = {col: i for i, col in enumerate(dense_cols + sparse_cols)}
+    return X[:, [positions[col] for col in x_cols]].tocsr()
+
+
 class LgbmEstimateManager(RmBaseEstimateManager):
     """LightGBM manager."""
 
@@ -31,6 +69,7 @@ class LgbmEstimateManager(RmBaseEstimateManager):
         estimate_both: bool = None,
         min_output_value: float = None,
         max_output_value: float = None,
+        artifact_sink=None,
     ):
         super().__init__(
             data_source,
@@ -39,16 +78,24 @@ class LgbmEstimateManager(RmBaseEstimateManager):
             estimate_both=estimate_both,
             min_output_value=min_output_value,
             max_output_value=max_output_value,
+            artifact_sink=artifact_sink,
         )
         self.model_params = model_params
 
     def prepare_model(self):
         """Prepare model."""
         model_params = self.model_params or self.default_model_params
+        if getattr(self, 'model_n_jobs', None):
+            # set by train_parallel, it replaces the threads of model_params in the forked workers
+            model_params = {k: v for k, v in model_params.items() if k not in LGBM_THREAD_PARAMS}
+            model_params['n_jobs'] = self.model_n_jobs
         self.model = lgb.LGBMRegressor(**model_params)
-        self.logger.info('model_params: {model_params}')
+        self.logger.info(f'model_params: {model_params}')
         return self.model
 
+    def model_input(self, df: pd.DataFrame, x_cols: list[str]):
+        return toModelInput(df, x_cols)
+
     def filter_data(
         self,
         X,
@@ -86,16 +133,21 @@ class LgbmEstimateManager(RmBaseEstimateManager):
         
         y = StandardScaler()
         
-        spare = pd.DataFrame(y.fit_transform(df[x_cols]), columns = x_cols)
+        # sparse one-hot columns are not scaled, that would densify them
+        dense_cols = [col for col in x_cols if not isSparseColumn(df, col)]
+        spare = pd.DataFrame(y.fit_transform(df[dense_cols]), columns = dense_cols)
+        sparse_cols = [col for col in x_cols if col not in set(dense_cols)]
+        if sparse_cols:
+            spare = pd.concat([spare, df[sparse_cols].reset_index(drop=True)], axis = 1)[x_cols]
         df = pd.concat([spare, pd.Series(df[y_col].tolist())], axis = 1)
         df = df.rename(columns={0: y_col})
         
         
+        sink = getArtifactSink()
         if y_col == "sp-n":
-            col_names = pd.DataFrame(df.columns)
-            col_names.to_excel("names.xlsx")
+            sink.artifact('names', pd.DataFrame(df.columns))
             
-        df.to_excel("final_data3.xlsx")
+        sink.artifact('final_data', df)
         
         
         if df.shape[0] < TRAINING_MIN_ROWS:
@@ -131,31 +183,23 @@ class LgbmEstimateManager(RmBaseEstimateManager):
         df_train, df_test = train_test_split(
             df, test_size=0.15, random_state=10)
         
-        # cross
-        if y_col == "sp-n":
-            scores = cross_val_score(model, df_train[x_cols], df_train[y_col], cv=10).mean()
-            score_data = pd.DataFrame({f'Mean Validation Accuracy for {y_col}': [scores]})
-            table = pd.read_excel('Cross_Val_Eval_1.xlsx') 
-            table = pd.concat([table,score_data], axis = 0)
-            with pd.ExcelWriter('Cross_Val_Eval_1.xlsx') as writer:
-                table.to_excel(writer, index=False)
+        # cross validation only when the metrics are recorded
+        if y_col == "sp-n" and sink.enabled:
+            scores = cross_val_score(model, self.model_input(df_train, x_cols), df_train[y_col], cv=10).mean()
+            sink.record('cross_validation', estimator=self.name, scale=str(scale),
+                        y_col=y_col, mean_validation_accuracy=scores)
 
             
         
-        model.fit(df_train[x_cols], df_train[y_col])
+        model.fit(self.model_input(df_train, x_cols), df_train[y_col], feature_name=x_cols)
         self.fit_output_min_max(df[y_col])
         accuracy = self.test_accuracy(
-            model, df_test[x_cols], df_test[y_col])
-        
+            model, self.model_input(df_test, x_cols), df_test[y_col])
         
-
-        accuracy_table = pd.read_excel('accuracy_no_changes.xlsx') #accuracy_no_changes #accuracy_with_changes
-        new_data = pd.DataFrame({f'Accuracy for {y_col}:': [accuracy/100]})
         
-        accuracy_table = pd.concat([accuracy_table,new_data], axis = 0)
 
-        with pd.ExcelWriter('accuracy_no_changes.xlsx') as writer:
-            accuracy_table.to_excel(writer, index=False)
+        sink.record('accuracy', estimator=self.name, scale=str(scale),
+                    y_col=y_col, accuracy=accuracy/100)
 
         timer.stop(df_train.shape[0]) #timer.stop(df_train.shape[0])
         
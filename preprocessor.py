@@ -1,13 +1,18 @@
 
 import datetime
 from gc import garbage
+import hashlib
+import json
 from itertools import chain
 import numpy as np
 import pandas as pd
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from math import isnan
 from pyrsistent import v
 
+from base.artifact_sink import getArtifactSink
 from base.util import allTypeToFloat, allTypeToInt, flattenList, stringToInt
 
 from sklearn.pipeline import Pipeline
@@ -15,7 +20,8 @@ from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import FunctionTransformer
 from base.base_cfg import BaseCfg
-from base.const import NONE, RENT_PRICE_UPPER_LIMIT, SALE_PRICE_LOWER_LIMIT, UNKNOWN, DROP, MEAN, Mode
+from base.model_store import ModelStore
+from base.const import NONE, RENT_PRICE_UPPER_LIMIT, SALE_PRICE_LOWER_LIMIT, TRAINING_MIN_ROWS, UNKNOWN, DROP, MEAN, Mode
 from sklearn.utils.validation import check_X_y, check_array, check_is_fitted
 
 from data.estimate_scale import PropertyType, PropertyTypeRegexp
@@ -48,12 +54,18 @@ import seaborn as sns
 from fitter import Fitter, get_common_distributions, get_distributions
 from scipy.stats import gamma,lognorm,beta,expon,norm,iqr, scoreatpercentile
 from scipy.optimize import minimize_scalar
+import scipy.stats
+from pandas.api.types import infer_dtype, is_float_dtype, is_integer_dtype
+from joblib import Parallel, delayed
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.svm import OneClassSVM
 import random
 
 logger = BaseCfg.getLogger(__name__)
 
+# bump when the fitted Preprocessor state changes, saved ones must be retrained
+PREPROCESSOR_VERSION = 7
+
 
 def yearOfDateNumber(dateNumber, deltaDays=0):
     date = datetime.datetime.strptime(str(dateNumber), '%Y%m%d')
@@ -320,73 +332,233 @@ class OutlierRemover_distrs(BaseEstimator,TransformerMixin): # does not work for
         return X
     
 
+FITTED_DISTRIBUTIONS = ['gamma', # gamma
+                        'lognorm', # lognormal
+                        "beta", # beta
+                        "expon", # exp
+                        "norm"] # gauss
+
+
+def fitBestDistribution(values):
+    """Fit FITTED_DISTRIBUTIONS to values.
+    Returns the best distribution name by sum square error and its scipy params,
+    (None, None) if none of them were fitted.
+    """
+    if len(values) == 0:
+        return None, None
+    f = Fitter(values, distributions=FITTED_DISTRIBUTIONS)
+    f.fit()
+    try:
+        d = f.get_best(method = 'sumsquare_error') # get the best one
+    except KeyError:
+        return None, None
+    name = list(d.keys())[0]
+    params = d[name]
+    if not isinstance(params, dict):
+        # older fitter returns the scipy tuple: shapes..., loc, scale
+        dist = getattr(scipy.stats, name)
+        names = (dist.shapes.split(', ') if dist.shapes else []) + ['loc', 'scale']
+        params = dict(zip(names, params))
+    return name, dict(params)
+
+
+def sampleDistribution(rng, name, params, size, low=None, high=None):
+    """Draw size values in one call from a scipy parameterized distribution.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+    name : str
+        one of FITTED_DISTRIBUTIONS
+    params : dict
+        scipy params, e.g. {'a': 2.0, 'loc': 0.0, 'scale': 1.0}
+    low, high : float
+        when both set, draw from the distribution truncated to [low, high]
+        by inverse transform sampling
+    """
+    loc, scale = params.get('loc', 0.0), params.get('scale', 1.0)
+    if low is not None and high is not None:
+        dist = getattr(scipy.stats, name)(**params)
+        cdfLow, cdfHigh = dist.cdf(low), dist.cdf(high)
+        if not cdfHigh > cdfLow:  # no mass in the range
+            return np.full(size, min(max(dist.median(), low), high))
+        return np.clip(dist.ppf(rng.uniform(cdfLow, cdfHigh, size)), low, high)
+    if name == 'gamma':
+        return loc + rng.gamma(params['a'], scale, size)
+    elif name == 'lognorm':
+        return loc + scale * rng.lognormal(0.0, params['s'], size)
+    elif name == 'beta':
+        return loc + scale * rng.beta(params['a'], params['b'], size)
+    elif name == 'expon':
+        return loc + rng.exponential(scale, size)
+    return rng.normal(loc, scale, size)  # norm
+
+
 class Outliers_removal_ml(BaseEstimator,TransformerMixin): # working class
-    def __init__(self):
-        self.data = {}
-    
+    """Replace the outliers of each numeric column with values drawn from
+    the column's best fitted distribution.
+
+    Parameters
+    ----------
+    detector : str
+        'iqr': outside [q1 - factor * iqr, q3 + factor * iqr], as OutlierRemover
+        'mad': farther than factor * 1.4826 * MAD from the median
+        'quantile': outside the quantiles, read from a histogram sketch of the column
+        'svm': RBF OneClassSVM trained on at most svm_max_samples rows (slow)
+    factor : float
+        defaults to 1.5 for 'iqr' and 3.5 for 'mad'
+    quantiles : tuple
+        the (low, high) inlier quantiles for 'quantile'
+    bins : int
+        histogram bins for 'quantile'
+    svm_max_samples : int
+        the subsample size to train the 'svm' detector
+    fit_sample_size : int
+        the subsample size to select the distribution of each column
+    n_jobs : int
+        the number of parallel jobs to fit the distributions
+    truncate : bool
+        draw the replacements only within the fitted inlier range
+    random_state : int
+        seed of the subsamples and the replacement draws
+    """
+    DEFAULT_FACTORS = {'iqr': 1.5, 'mad': 3.5}
+
+    def __init__(
+        self,
+        detector='iqr',
+        factor=None,
+        quantiles=(0.005, 0.995),
+        bins=1024,
+        svm_max_samples=10000,
+        fit_sample_size=10000,
+        n_jobs=None,
+        truncate=False,
+        random_state=None,
+    ):
+        self.detector = detector
+        self.factor = factor
+        self.quantiles = quantiles
+        self.bins = bins
+        self.svm_max_samples = svm_max_samples
+        self.fit_sample_size = fit_sample_size
+        self.n_jobs = n_jobs
+        self.truncate = truncate
+        self.random_state = random_state
+
     def fit(self,X,y=None):
-        print("!")
-        
+        """Fit the detector of each column, and keep the outlier masks of X."""
+        if self.detector not in ('iqr', 'mad', 'quantile', 'svm'):
+            raise ValueError(f'Unknown outlier detector: {self.detector}')
+        self.bounds_ = {}  # col => (lower, upper) inlier bounds
+        self.svm_models_ = {}
+        self.masks_ = {}  # col => bool outlier mask of the fitted X
         for col in X.columns:  # for each col
-            print(col)
-            print()
-            d = X[[col]]
-            model = OneClassSVM(kernel='rbf', gamma='auto') # train binary SVM 
-            model.fit(d)
-            outliers = model.predict(d) == -1 # the outliers will be -1 else 1, so bool vector True is outlier else False
-            self.data[col] = outliers
-        print("!!")
+            values = X[col].to_numpy(dtype=float)
+            if self.detector == 'svm':
+                model = self._fit_svm(values)
+                self.svm_models_[col] = model
+                # the outliers will be -1 else 1, so bool vector True is outlier else False
+                self.masks_[col] = model.predict(values.reshape(-1, 1)) == -1
+            else:
+                lower, upper = self._bounds(values)
+                self.bounds_[col] = (lower, upper)
+                self.masks_[col] = (values < lower) | (values > upper)
+            logger.debug(
+                f'{self.detector} outliers {col}: {int(self.masks_[col].sum())}/{len(values)}')
+        self._fit_distributions(X)
         return self
-    
-    @staticmethod
-    def neg_log_likelihood(lam, data): # max likelyhood method
-        n = len(data)
-        log_likelihood = n * np.log(lam) - lam * np.sum(data)
-        return -log_likelihood
-    
-    
-    
+
+    def _fit_distributions(self, X):
+        """Select the best distribution of each column on a bounded subsample,
+        in parallel across columns. transform only draws from them.
+        """
+        rng = np.random.default_rng(self.random_state)
+        samples = []
+        self.medians_ = {}
+        self.inlier_range_ = {}
+        for col in X.columns:
+            values = X[col].to_numpy(dtype=float)
+            inliers = values[~self.masks_[col] & np.isfinite(values)]
+            self.inlier_range_[col] = (inliers.min(), inliers.max()) \
+                if inliers.shape[0] > 0 else (None, None)
+            values = values[np.isfinite(values)]
+            self.medians_[col] = np.median(values) if values.shape[0] > 0 else np.nan
+            if values.shape[0] > self.fit_sample_size:
+                values = rng.choice(values, size=self.fit_sample_size, replace=False)
+            samples.append(values)
+        results = Parallel(n_jobs=self.n_jobs)(
+            delayed(fitBestDistribution)(values) for values in samples)
+        self.distributions_ = dict(zip(X.columns, results))
+
+    def _bounds(self, values):
+        """The inlier bounds of a column by the iqr/mad/quantile detector"""
+        factor = self.factor if self.factor is not None else self.DEFAULT_FACTORS.get(self.detector)
+        if self.detector == 'iqr':
+            q1, q3 = np.nanquantile(values, [0.25, 0.75])
+            return q1 - factor * (q3 - q1), q3 + factor * (q3 - q1)
+        if self.detector == 'mad':
+            median = np.nanmedian(values)
+            mad = 1.4826 * np.nanmedian(np.abs(values - median))
+            return median - factor * mad, median + factor * mad
+        # quantile sketch: one histogram pass, interpolate inside the bin
+        finite = values[np.isfinite(values)]
+        if finite.shape[0] == 0:
+            return np.nan, np.nan
+        counts, edges = np.histogram(finite, bins=self.bins)
+        cdf = np.concatenate([[0], np.cumsum(counts)]) / finite.shape[0]
+        lower, upper = np.interp(self.quantiles, cdf, edges)
+        return lower, upper
+
+    def _fit_svm(self, values):
+        """Train OneClassSVM on a bounded subsample, it is O(n^2) or worse"""
+        sample = values
+        if values.shape[0] > self.svm_max_samples:
+            rng = np.random.default_rng(self.random_state)
+            sample = rng.choice(values, size=self.svm_max_samples, replace=False)
+        model = OneClassSVM(kernel='rbf', gamma='auto') # train binary SVM
+        model.fit(sample.reshape(-1, 1))
+        return model
+
+    def detect(self, X):
+        """Get the outlier masks of X by the fitted detectors."""
+        masks = {}
+        for col in X.columns:
+            values = X[col].to_numpy(dtype=float)
+            if self.detector == 'svm':
+                masks[col] = self.svm_models_[col].predict(values.reshape(-1, 1)) == -1
+            else:
+                lower, upper = self.bounds_[col]
+                masks[col] = (values < lower) | (values > upper)
+        return masks
+
+    def fit_transform(self, X, y=None):
+        # the masks of the fitted X are already known
+        self.fit(X)
+        return self._replace_outliers(X, self.masks_)
+
     def transform(self,X,y=None):
-        print("!!!")
+        return self._replace_outliers(X, self.detect(X))
+
+    def _replace_outliers(self, X, masks):
+        """Replace the outliers with values drawn from the fitted distributions"""
         X = pd.DataFrame(X).copy()
+        # same seed on every call, so the replacements are reproducible
+        rng = np.random.default_rng(self.random_state)
         for col in X.columns:
-            print(col)
-            outlier_inds = self.data[col]           
+            outlier_inds = masks[col]
+            l = int(outlier_inds.sum())  # whole num of outliers
+            if l == 0:
+                continue
             x = X[col].copy()
-            h = X[col].tolist() # data for column
-            f = Fitter(h, # try these 5 distrs
-           distributions=['gamma', # gamma
-                          'lognorm', # lognormal
-                          "beta", # beta
-                          "expon", # exp
-                          "norm"]) # gauss
-            f.fit()
-            #f.summary() see the graph and results
-            try:
-                d = f.get_best(method = 'sumsquare_error') # get the best one
-                best_distr = list(d.keys())[0] # get its params
-                params = d[best_distr] 
-                l = sum(outlier_inds)       # whole num of outliers   
-                if best_distr == "gamma": # for differetn distrs
-                    alpha, beta = params["shape"],params["scale"] # get neccassary params
-                    x[outlier_inds] =  list(random.gammavariate(alpha, beta) for i in range(l)) # generate nums (note that they are in the form generators and then we convrete them to list - saves a bit more time)
-                elif best_distr == "lognorm":
-                    mu, sigma = params["loc"],params["scale"]
-                    x[outlier_inds] = list(random.lognormvariate(mu, sigma) for i in range(l))        
-                elif best_distr == "beta":
-                    alpha, beta = params["shape"],params["scale"]
-                    x[outlier_inds] = list(random.betavariate(alpha, beta) for i in range(l))      
-                elif best_distr == "expon": # here sit is a bit different since lambda can be 1/0 since mean could be 0 and lambda = 1/mean
-                    res = minimize_scalar(self.neg_log_likelihood, args=(h,)) #OutlierRemover_distrs (use max likeluhhod method to estimate the lambda since mean could be 0 and lambda = 1/mean)
-                    lambda_exp = res.x
-                    x[outlier_inds] = list(random.expovariate(lambda_exp) for i in range(l))    
-                elif best_distr == "norm": 
-                    mu, sigma = params["loc"],params["scale"]
-                    x[outlier_inds] = list(random.gauss(mu, sigma) for i in range(l)) 
-            except KeyError: # in case non of the distr were fitted for some reason
-                x[outlier_inds]= x.median() # just use the median
+            name, params = self.distributions_.get(col, (None, None))
+            if name is None: # in case non of the distr were fitted for some reason
+                x[outlier_inds] = self.medians_[col] # just use the median
+            else:
+                low, high = self.inlier_range_[col] if self.truncate else (None, None)
+                x[outlier_inds] = sampleDistribution(
+                    rng, name, params, l, low=low, high=high)
             X[col] = x
-        print("!!!!")
         return X.reset_index(drop=True)
             
              
@@ -404,13 +576,24 @@ class Custom_Cat_Imputer(BaseEstimator, TransformerMixin):
 # Ontario, ... 3,4,5
 
 class OneHotEncoderWithNames(BaseEstimator, TransformerMixin):
-    def __init__(self):
+    """One-hot encode the text features, keeping the encoded column names.
+    The vocabulary and the replacement modes are learned in fit, so the same
+    columns are produced for any frame transformed later.
+    Categories unseen in fit are encoded as all zeros.
+
+    Parameters
+    ----------
+    sparse : bool
+        return the encoded columns as pandas sparse uint8 columns instead of dense floats.
+    """
+    def __init__(self, sparse=False):
+        self.sparse = sparse
         self.imputer = Custom_Cat_Imputer() # 
-        self.one_hot_encoder = OneHotEncoder()
+        self.one_hot_encoder = OneHotEncoder(handle_unknown='ignore')
         self.column_names = None
         
     def get_rep_value(self, X): # deal with wrongly placed numeric objects in the object feature
-        mode = X.mode().tolist()[0]        
+        mode = self.modes_.get(X.name) if hasattr(self, 'modes_') else X.mode().tolist()[0]
         X = X.apply(lambda x : mode if OneHotEncoderWithNames.to_n(x) == "!" else x) # ! if it was numeric
         return X
         
@@ -421,17 +604,28 @@ class OneHotEncoderWithNames(BaseEstimator, TransformerMixin):
             return "!" # if we can concert to int
         except ValueError: # if no
             return x
+
+    def _impute(self, X):
+        X_imputed = pd.DataFrame(self.imputer.fit_transform(X),columns = X.columns) # impute nulls
+        return X_imputed.apply(self.get_rep_value) # get rid of the "numeric" objects in feature
     
     def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        X_imputed = pd.DataFrame(self.imputer.fit_transform(X),columns = X.columns)
+        self.modes_ = {col: X_imputed[col].mode().tolist()[0] for col in X_imputed.columns}
+        self.one_hot_encoder.fit(X_imputed.apply(self.get_rep_value)) # learn the vocabulary
+        self.column_names = self.one_hot_encoder.get_feature_names(X.columns) # the encoded names
         return self
     
     def transform(self, X, y=None):
         global one_hot_names # write the names of the encoded features
-        X_imputed = pd.DataFrame(self.imputer.fit_transform(X),columns = X.columns) # impute nulls
-        X_imputed = X_imputed.apply(self.get_rep_value) # get rid of the "numeric" objects in feature
-        X_one_hot_encoded = self.one_hot_encoder.fit_transform(X_imputed) # encode
-        self.column_names = self.one_hot_encoder.get_feature_names(X_imputed.columns) # the encoded names
-        X_df = pd.DataFrame(X_one_hot_encoded.toarray(), columns=self.column_names)
+        X = pd.DataFrame(X)
+        X_one_hot_encoded = self.one_hot_encoder.transform(self._impute(X)) # encode
+        if self.sparse:
+            X_df = pd.DataFrame.sparse.from_spmatrix(
+                X_one_hot_encoded.astype(np.uint8), columns=self.column_names)
+        else:
+            X_df = pd.DataFrame(X_one_hot_encoded.toarray(), columns=self.column_names)
         one_hot_names = self.column_names
         return X_df
 
@@ -459,65 +653,85 @@ class custom_imputer(BaseEstimator, TransformerMixin): # based on the linear cor
         return X     
         
 class custom_numeric_imputer(BaseEstimator, TransformerMixin): # ml approach
-    def __init__(self,dec = False):
-        self.models = [] 
-        self.tests = {}
+    """Impute the null values of numeric columns with regression models.
+    The features are the columns without nulls in the fitted data.
+    The null masks are computed at transform time, so the fitted models
+    can be reused for new data. The nulls without a model, e.g. of a column
+    without nulls in the fitted data, are filled with the fitted column means.
+
+    Parameters
+    ----------
+    dec : bool
+        use RandomForestRegressor instead of LinearRegression
+    multi_output : bool
+        fit one multi-output model for all the null columns, on the rows
+        where all of them are known. Falls back to one model per column
+        when there are less than min_rows such rows.
+    n_jobs : int
+        n_jobs of RandomForestRegressor
+    min_rows : int
+        the minimum training rows of a model
+    """
+    def __init__(self, dec=False, multi_output=False, n_jobs=-1, min_rows=TRAINING_MIN_ROWS):
         self.dec = dec
-        
+        self.multi_output = multi_output
+        self.n_jobs = n_jobs
+        self.min_rows = min_rows
+
+    def _new_model(self):
+        # regression or dec tree
+        return LinearRegression() if not self.dec else RandomForestRegressor(n_jobs=self.n_jobs)
+
     def fit(self,X,y=None):
-        print("?")
-        features = set(X.columns.tolist()) 
-        m = X.isna()
-        select = []
-        for col in list(features): # select only the cols with no nulls!
-            if sum(m[col]) == 0:
-                select.append(col)
-                
-        features = set(select) # these are our features 
-        to_change = list(set(X.columns.tolist()).difference(features)) # columnns that do have at least one null
-        
+        X = pd.DataFrame(X)
+        nulls = X.isna()
+        nullCounts = nulls.sum()
+        self.features = [col for col in X.columns if nullCounts[col] == 0] # these are our features
+        to_change = [col for col in X.columns if nullCounts[col] > 0] # columnns that do have at least one null
+        # for prediction rows whose features are null, and the nulls without a model
+        self.column_means_ = X.astype(float).mean()
+        self.feature_means_ = self.column_means_[self.features]
+        self.models_ = {}  # tuple of target columns => model
+        X_features = X[self.features].to_numpy(dtype=float)
+        if len(self.features) == 0:
+            logger.warning('No complete columns to impute from')
+            return self
+        if self.multi_output and len(to_change) > 1:
+            known = ~nulls[to_change].any(axis=1).to_numpy()
+            if known.sum() >= self.min_rows:
+                model = self._new_model()
+                model.fit(X_features[known], X.loc[known, to_change].to_numpy(dtype=float))
+                self.models_[tuple(to_change)] = model
+                return self
         for col in to_change: # for each null column
-            ser = X[col]
-            ser = ser.reset_index(drop=True) # we have to reset index...
-            test = list(ser[ser.isnull()].index) # seperate nulls in our target
-            train = list(ser[ser.notnull()].index) # seperate not nulls in our target
-            """
-            for our features get the non null target rows
-            """
-            X_train = X[list(features)].iloc[train, :] 
-            y_train = X[[col]].iloc[train, :]
-            model = LinearRegression() if not self.dec else RandomForestRegressor() #LinearRegression() # regression or dec tree
-            model.fit(X_train,y_train) # train
-            self.tests[col] = [model,test] # model, and test indicies
-        else:
-            self.features = list(features) # remembrt the list of features
-        print("??")
+            known = ~nulls[col].to_numpy()
+            if known.sum() < self.min_rows:
+                logger.warning(f'Not enough rows to impute {col}: {known.sum()}')
+                continue
+            model = self._new_model()
+            model.fit(X_features[known], X.loc[known, col].to_numpy(dtype=float)) # train
+            self.models_[(col,)] = model
         return self
             
     def transform(self,X,y=None):
-        print("???")
         X = pd.DataFrame(X).copy().reset_index(drop=True)
-        for col in X.columns: # for each column
-            data = self.tests.get(col,False)
-            if not data: # if False - continue
+        if len(self.models_) == 0:
+            return X.fillna(self.column_means_)
+        X_features = X[self.features].fillna(self.feature_means_).to_numpy(dtype=float)
+        for targets, model in self.models_.items():
+            targets = list(targets)
+            nulls = X[targets].isna().to_numpy()
+            rows = np.flatnonzero(nulls.any(axis=1))
+            if rows.shape[0] == 0:
                 continue
-            model,test_inds = data # unpack the model and the null indicies
-            no_nulls = []
-            """
-            Select the null rows in the target to predict
-            """
-            preds = model.predict(X[self.features].iloc[test_inds, :])
-            if not self.dec:
-                for cube in preds: # convert the result to one dim array
-                    no_nulls.append(cube[0])
-            else:
-                no_nulls = preds
-                
-            x = X.loc[:, col].copy()  # get the copy
-            x[test_inds] = no_nulls # replace the null indicies with the predicted not nulls
-            X.loc[:, col] = x # make the change
-        print("????")
-        return X    
+            # predict only the rows with nulls, in one batch
+            preds = np.asarray(model.predict(X_features[rows])).reshape(rows.shape[0], len(targets))
+            for j, col in enumerate(targets):
+                colNulls = nulls[rows, j]
+                x = X[col].to_numpy(dtype=float, copy=True)
+                x[rows[colNulls]] = preds[colNulls, j]
+                X[col] = x
+        return X.fillna(self.column_means_)
     
 
 # the dates in the proper dates format (not numeric)
@@ -546,12 +760,333 @@ class Dates_numeric_Pipeline(BaseEstimator,TransformerMixin):
 ####################################################    
     
 
+# (column name, dtype, source) => True if its values are dicts or lists, kept until clearNestedColumnVerdicts
+NESTED_COLUMN_VERDICTS: dict = {}
+NESTED_SAMPLE_SIZE = 100
+
+
+def clearNestedColumnVerdicts():
+    """Probe the columns of nestedColumns again, e.g. for a new fit."""
+    NESTED_COLUMN_VERDICTS.clear()
+
+
+def _hasNestedValues(values: pd.Series) -> bool:
+    """True when a non-null value of values is a dict or a list.
+    A column of one scalar kind is told by infer_dtype without a Python loop over the values.
+    """
+    if not infer_dtype(values, skipna=True).startswith('mixed'):
+        return False
+    return bool(values.map(type).isin([dict, list]).any())
+
+
+def nestedColumns(
+    df: pd.DataFrame,
+    declared: list[str] = None,
+    sample_size: int = NESTED_SAMPLE_SIZE,
+    source: str = None,
+) -> list[str]:
+    """Get the columns of df holding dicts or lists.
+    Declared columns are nested without looking at them. Only object columns
+    are probed, first on up to sample_size non-null values spread over the column,
+    then on the whole column before it is told not nested.
+    The verdict is cached by (column name, dtype, source) in NESTED_COLUMN_VERDICTS.
+
+    Parameters
+    ----------
+    source : str
+        where df comes from, e.g. the collection prefix, so other data gets its own verdicts
+    """
+    declared = set(declared or [])
+    nested = []
+    for col in df.columns:
+        if col in declared:
+            nested.append(col)
+            continue
+        if df[col].dtype != object:
+            continue
+        key = (col, str(df[col].dtype), source)
+        if key not in NESTED_COLUMN_VERDICTS:
+            values = df[col]
+            values = values[values.notna()]
+            if len(values) == 0:
+                continue  # no verdict yet
+            sample = values
+            if len(values) > sample_size:
+                sample = values.iloc[np.linspace(0, len(values) - 1, sample_size).astype(int)]
+            NESTED_COLUMN_VERDICTS[key] = any(isinstance(v, (dict, list)) for v in sample) \
+                or _hasNestedValues(values)
+        if NESTED_COLUMN_VERDICTS[key]:
+            nested.append(col)
+    return nested
+
+
+# coordinates need more precision than float32
+FLOAT64_COLUMNS = ['lat', 'lng', 'lat-n', 'lng-n']
+# label columns kept as pandas category
+CATEGORY_COLUMNS = ['prov', 'area', 'city', 'ptype2-l']
+# float32 holds integers exactly up to 2**24, e.g. not yyyymmdd dates
+FLOAT32_MAX_INT = 2 ** 24
+
+
+def dtypePlan(df: pd.DataFrame, float64_cols: list[str] = None, category_cols: list[str] = None) -> dict:
+    """The smallest dtype holding the values of each column of df, see applyDtypePlan.
+    -. uint8 for 0/1 columns without nulls: binaries and one-hots
+    -. int16/int32 for other integral columns without nulls: codes, date parts and dates
+    -. float32 for the other floats, except float64_cols and values too large for float32
+    -. category for category_cols, with the categories of df
+    Sparse columns and columns kept as they are have no plan.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        the fitting data, e.g. the first transformed data
+    """
+    float64_cols = set(FLOAT64_COLUMNS if float64_cols is None else float64_cols)
+    category_cols = set(CATEGORY_COLUMNS if category_cols is None else category_cols)
+    plan = {}
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+        if isinstance(dtype, pd.SparseDtype) or col in float64_cols:
+            continue
+        if col in category_cols:
+            if dtype != object:
+                continue
+            plan[col] = pd.CategoricalDtype(sorted(series.dropna().astype(str).unique()))
+        elif is_integer_dtype(dtype) or is_float_dtype(dtype):
+            values = series.to_numpy()
+            if values.size == 0:
+                continue
+            finite = np.isfinite(values) if is_float_dtype(dtype) else None
+            hasNull = finite is not None and not finite.all()
+            if hasNull:
+                values = values[finite]
+            lo, hi = (values.min(), values.max()) if values.size else (0, 0)
+            if not hasNull and np.array_equal(values, np.round(values)):
+                if lo >= 0 and hi <= 1:
+                    target = np.uint8
+                elif np.iinfo(np.int16).min <= lo and hi <= np.iinfo(np.int16).max:
+                    target = np.int16
+                elif np.iinfo(np.int32).min <= lo and hi <= np.iinfo(np.int32).max:
+                    target = np.int32
+                else:
+                    continue
+            elif max(abs(lo), abs(hi)) < FLOAT32_MAX_INT:
+                target = np.float32
+            else:
+                continue
+            plan[col] = np.dtype(target)
+    return plan
+
+
+def _fitsFloat32(series: pd.Series) -> bool:
+    """True when the finite values of series are below FLOAT32_MAX_INT, so float32 holds their integer part exactly."""
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return bool(np.all(np.abs(values[np.isfinite(values)]) < FLOAT32_MAX_INT))
+
+
+def _planFits(series: pd.Series, target: np.dtype) -> bool:
+    """True when the values of series convert to the integer or float32 dtype target without loss."""
+    values = series.to_numpy()
+    if values.size == 0:
+        return True
+    if target.kind == 'f':
+        return _fitsFloat32(series)
+    if is_float_dtype(values.dtype):
+        if not np.isfinite(values).all() or not np.array_equal(values, np.round(values)):
+            return False
+    elif not is_integer_dtype(values.dtype):
+        return False
+    info = np.iinfo(target)
+    return info.min <= values.min() and values.max() <= info.max
+
+
+def applyDtypePlan(df: pd.DataFrame, plan: dict) -> pd.DataFrame:
+    """Convert the columns of df to the dtypes of plan, and log the memory saved.
+    Every batch gets the same dtypes. A value out of an integer dtype, e.g. a null,
+    converts its column to float32 instead, or keeps its dtype when a value is too large
+    for float32, and a new label of a category column is appended to its categories,
+    with a warning.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        modified in place and returned
+    plan : dict
+        column => dtype, from dtypePlan
+    """
+    before = after = 0
+    converted = 0
+    for col, target in plan.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if series.dtype == target:
+            continue
+        if isinstance(target, pd.CategoricalDtype):
+            labels = series.where(series.isna(), series.astype(str))
+            extra = sorted(set(labels.dropna().unique()) - set(target.categories))
+            if extra:
+                logger.warning(f'New labels of {col} not in the dtype plan: {extra[:10]}')
+                target = pd.CategoricalDtype(list(target.categories) + extra)
+            new = labels.astype(target)
+        elif target.kind in 'iuf' and not _planFits(series, target):
+            if not _fitsFloat32(series):
+                logger.warning(f'{col} does not fit {target}, kept as {series.dtype}')
+                continue
+            logger.warning(f'{col} does not fit {target}, converted to float32')
+            new = series.astype(np.float32)
+        else:
+            new = series.astype(target)
+        deep = isinstance(target, pd.CategoricalDtype)
+        before += series.memory_usage(index=False, deep=deep)
+        after += new.memory_usage(index=False, deep=deep)
+        df[col] = new
+        converted += 1
+    logger.info(
+        f'Compacted {converted} columns: {before / 2**20:.1f}MB -> {after / 2**20:.1f}MB, saved {(before - after) / 2**20:.1f}MB')
+    return df
+
+
+def compactDtypes(df: pd.DataFrame, float64_cols: list[str] = None, category_cols: list[str] = None) -> pd.DataFrame:
+    """Downcast the columns of df to the smallest dtype holding their values, see dtypePlan.
+    The dtypes depend on the values of df; Preprocessor fits the plan once and applies it to every batch.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        modified in place and returned
+    """
+    return applyDtypePlan(df, dtypePlan(df, float64_cols, category_cols))
+
+
+# fitted Db* transformers shared in the process: key => (fit time, version, transformer, fitted state)
+DB_TRANSFORMER_CACHE: dict = {}
+DB_TRANSFORMER_CACHE_TTL = 3600  # seconds, the default Preprocessor(db_cache_ttl=...)
+DB_TRANSFORMER_CACHE_VERSION = 0
+# threads fitting the Db* transformers missing in the cache, see Preprocessor.prefetch_db_transformers
+DB_TRANSFORMER_FIT_WORKERS = 8
+
+
+def invalidateDbTransformerCache():
+    """Refit the shared Db* transformers on their next fit, e.g. after the label collections changed."""
+    global DB_TRANSFORMER_CACHE_VERSION
+    DB_TRANSFORMER_CACHE_VERSION += 1
+    DB_TRANSFORMER_CACHE.clear()
+
+
+class CachedDbTransformer(BaseEstimator, TransformerMixin):
+    """Share a fitted Db* label transformer (label and one-hot array collections) in the process.
+    A fit reuses the transformer fitted by an earlier fit of the same key, without reading mongodb again,
+    only when all the labels of col were already fitted, within ttl seconds and before
+    invalidateDbTransformerCache. Otherwise the transformer is fitted, which registers
+    and writes back the new labels, and replaces the shared one.
+    Other attributes are delegated to the transformer.
+    """
+
+    def __init__(self, transformer, key: tuple, col: str, ttl: int = DB_TRANSFORMER_CACHE_TTL):
+        self.transformer = transformer
+        self.key = key
+        self.col = col
+        self.ttl = ttl
+
+    def _column(self, X) -> pd.Series:
+        """col of X, None if X has no col."""
+        if isinstance(X, pd.DataFrame):
+            if self.col not in X.columns:
+                return None
+            X = X[self.col]
+        return X if isinstance(X, pd.Series) else None
+
+    def _state(self, X) -> frozenset:
+        """Distinct values of col in X as strings, None if X has no col."""
+        column = self._column(X)
+        if column is None:
+            return None
+        return frozenset(column.dropna().astype(str).unique())
+
+    def _covers(self, cachedState: frozenset, state: frozenset) -> bool:
+        return state <= cachedState
+
+    def _merge(self, cachedState: frozenset, state: frozenset) -> frozenset:
+        # the transformer loaded the labels of the earlier fits from the collection
+        return cachedState | state
+
+    def _cached(self):
+        """The shared entry of key, None when expired or invalidated."""
+        cached = DB_TRANSFORMER_CACHE.get(self.key)
+        if cached is None or cached[1] != DB_TRANSFORMER_CACHE_VERSION \
+                or time.time() - cached[0] >= self.ttl:
+            return None
+        return cached
+
+    def needs_fit(self, X) -> bool:
+        """True when fit(X) would fit the transformer, not reuse the shared one."""
+        state = self._state(X)
+        cached = self._cached()
+        return state is None or cached is None or not self._covers(cached[3], state)
+
+    def fit(self, *args, **kwargs):
+        state = self._state(args[0]) if args else None
+        cached = self._cached()
+        if cached is not None and state is not None and self._covers(cached[3], state):
+            self.transformer = cached[2]
+            return self
+        self.transformer.fit(*args, **kwargs)
+        if state is not None:
+            known = self._merge(cached[3], state) if cached is not None else state
+            DB_TRANSFORMER_CACHE[self.key] = (
+                time.time(), DB_TRANSFORMER_CACHE_VERSION, self.transformer, known)
+        return self
+
+    def transform(self, *args, **kwargs):
+        return self.transformer.transform(*args, **kwargs)
+
+    def get_feature_names_out(self, *args, **kwargs):
+        return self.transformer.get_feature_names_out(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name == 'transformer' or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.transformer, name)
+
+
+class CachedDbNumericTransformer(CachedDbTransformer):
+    """Share a fitted DbNumericTransformer (number collection) in the process.
+    Its fit depends on all the values of col, not only on the labels, so it is reused
+    only for a col with the same values, by their hash.
+    """
+
+    def _state(self, X) -> tuple:
+        """(rows, hash) of the values of col in X, None if X has no col."""
+        column = self._column(X)
+        if column is None:
+            return None
+        return len(column), int(pd.util.hash_pandas_object(column, index=False).sum())
+
+    def _covers(self, cachedState: tuple, state: tuple) -> bool:
+        return state == cachedState
+
+    def _merge(self, cachedState: tuple, state: tuple) -> tuple:
+        return state
+
+
 class Preprocessor(TransformerMixin, BaseEstimator):
     """ Transforms raw training and prediction data
     To build root transformer, use TRAIN mode and fit with full dataset(columns and rows). 
     To transform predict data, use PREDICT mode and fit with training/predict data.
     If columns changed, use PREDICT mode and fit with training data. It can transform both training and predict data.
     Different column sets need different preprocessors.
+    The fitted cleaning pipeline can be saved with save() and restored with Preprocessor.load(),
+    which transforms prediction data without refitting and with the training column layout.
+    With sparse_one_hot, the one-hot columns stay pandas sparse columns through df_grouped.
+    With compact_dtypes, the output columns are downcast by the dtype plan fitted with the cleaning pipeline,
+    see dtypePlan, so all the transformed batches have the same dtypes.
+    The Db* transformers are shared in the process for db_cache_ttl seconds, the label ones while no new label
+    is seen and the numeric ones for the same values, see CachedDbTransformer. db_cache_ttl=0 to not share them.
+    fit fits the ones not shared yet in parallel threads, see prefetch_db_transformers.
+    n_jobs is the number of parallel jobs fitting the outlier distributions of the columns, see Outliers_removal_ml.
+    random_state seeds its subsamples and replacement draws, for reproducible runs.
 
     Transforming steps:
     -. drop na columns if in training mode, return error if in prediction mode.
@@ -681,14 +1216,33 @@ class Preprocessor(TransformerMixin, BaseEstimator):
     cols_condo: list[str] = [
         'unt'  # unit storey, total storey, percentage of total storey
     ]
+    # array or object fields from mongo, dropped before cleaning when not transformed
+    cols_nested: list[str] = [
+        'rms',
+        'bths',
+        'schools',
+        'feat',
+        'la',
+        'la2',
+    ]
 
     def __init__(
         self,
         collection_prefix: str = 'ml_',
         use_baseline: bool = True,
+        sparse_one_hot: bool = False,
+        compact_dtypes: bool = True,
+        db_cache_ttl: int = DB_TRANSFORMER_CACHE_TTL,
+        n_jobs: int = None,
+        random_state: int = None,
     ):
         self.collection_prefix = collection_prefix
         self.use_baseline = use_baseline
+        self.sparse_one_hot = sparse_one_hot
+        self.compact_dtypes = compact_dtypes
+        self.db_cache_ttl = db_cache_ttl
+        self.n_jobs = n_jobs
+        self.random_state = random_state
 
     def get_feature_columns(
         self,
@@ -712,6 +1266,31 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         # return flatten(cols)
         return flattenList(cols)
 
+    def _shared(self, transformer, col, *key, wrapper=CachedDbTransformer):
+        """Wrap a Db* transformer of col to share it in the process, when db_cache_ttl is set."""
+        if not self.db_cache_ttl:
+            return transformer
+        shared = wrapper(
+            transformer, (transformer.__class__.__name__, col, *key), col, ttl=self.db_cache_ttl)
+        self.shared_transformers_.append(shared)
+        return shared
+
+    def prefetch_db_transformers(self, Xdf: pd.DataFrame) -> int:
+        """Fit the shared Db* transformers of the columns of Xdf that are not in the cache,
+        in DB_TRANSFORMER_FIT_WORKERS threads, so their collection reads and writes overlap.
+        The fit of the column transformer then reuses them. Returns the number fitted.
+        """
+        pending = [shared for shared in self.shared_transformers_
+                   if shared.col in Xdf.columns and shared.needs_fit(Xdf)]
+        if len(pending) == 0:
+            return 0
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=DB_TRANSFORMER_FIT_WORKERS) as executor:
+            list(executor.map(lambda shared: shared.fit(Xdf), pending))
+        logger.info(
+            f'Fitted {len(pending)}/{len(self.shared_transformers_)} Db transformers, used: {time.time() - start_time}s')
+        return len(pending)
+
     def build_transformers(self, all_cols): # data cleansing part
         """Build the transformers.
            The transformers need to work with less columns when the predictions has less data.
@@ -724,6 +1303,7 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         """
         logger.info('Building transformers')
         all_cols = [*all_cols]
+        self.shared_transformers_ = []
 
         colTransformerParams = [
             ('saletp-b', binarySaletpByRow, 'saletp', 'saletp-b'),
@@ -784,7 +1364,8 @@ class Preprocessor(TransformerMixin, BaseEstimator):
                         # na_value=None,
                         # collection=self.label_collection,
                     )
-                colTransformerParams.append((f'{k}_x', transformer))
+                colTransformerParams.append((f'{k}_x', self._shared(
+                    transformer, k, self.label_collection if v['strType'] else None)))
                 all_cols.extend(transformer.get_feature_names_out())
         # binary columns
         for k, v in self.cols_binary.items():
@@ -796,20 +1377,21 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         for k, v in self.cols_label.items():
             if k in all_cols:
                 colTransformerParams.append(
-                    (f'{k}-c', DbLabelTransformer(
+                    (f'{k}-c', self._shared(DbLabelTransformer(
                         col=k,
                         na_value=v['na'],
                         collection=self.label_collection,
-                    ), k, f'{k}-c'))
+                    ), k, self.label_collection, repr(v['na'])), k, f'{k}-c'))
                 all_cols.append(f'{k}-c')
         # numerical columns
         for k, v in self.cols_numeric.items():
             if k in all_cols:
                 colTransformerParams.append(
-                    (f'{k}-n', DbNumericTransformer(
+                    (f'{k}-n', self._shared(DbNumericTransformer(
                         self.number_collection,
                         col=k,
-                        na_value=v['na'],), k, f'{k}-n'))
+                        na_value=v['na'],), k, self.number_collection, repr(v['na']),
+                        wrapper=CachedDbNumericTransformer), k, f'{k}-n'))
                 all_cols.append(f'{k}-n')
         if 'st_num' in all_cols:
             stNumStTransformer = StNumStTransformer()
@@ -869,6 +1451,7 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         self.baseline_collection = self.collection_prefix + 'baseline'
 
         self.build_transformers(Xdf.columns)
+        self.prefetch_db_transformers(Xdf)
         # fit the first transformer only
         self.customTransformers[0].fit(Xdf, y)
         self.n_features_ = Xdf.shape[1]
@@ -876,10 +1459,15 @@ class Preprocessor(TransformerMixin, BaseEstimator):
             self.fited_all_ = True
         else:
             self.fited_all_ = False
+        # the cleaning pipeline is fitted by the next transform
+        self.cleaning_fitted_ = False
+        self.dtype_plan_ = None
         return self
 
     def transform(self, Xdf: pd.DataFrame):
         """Transform the dataframe to the baseline format.
+        The first transform after fit fits the cleaning pipeline as well,
+        the following ones (and a loaded preprocessor) only transform.
 
             Parameters
             ----------
@@ -912,6 +1500,35 @@ class Preprocessor(TransformerMixin, BaseEstimator):
             self.fited_all_ = True
         ###### Prepocessing part (some of it)
         print("Started")
+        if getattr(self, 'cleaning_fitted_', False):
+            Xdf = self._align_input(Xdf)
+            g = self.cleaning_pipeline_.transform(Xdf)
+        else:
+            g = self._fit_cleaning(Xdf)
+        one_hot = None
+        if self.one_hot_encoder_ is not None: # sparse one-hot, encoded outside of the dense pipeline
+            one_hot = self.one_hot_encoder_.transform(Xdf[self.encoders_])
+        Xdf = self._cleaning_output(g, one_hot)
+        if self.compact_dtypes:
+            if getattr(self, 'dtype_plan_', None) is None:
+                self.dtype_plan_ = dtypePlan(Xdf)
+            Xdf = applyDtypePlan(Xdf, self.dtype_plan_)
+        getArtifactSink().artifact('preprocessed_data', Xdf.head(n=30))
+        self.flag_to_include_else = False #num_cols+list(one_hot_names) # add the rest of the cols
+        self.Xdf = Xdf
+        return Xdf
+
+    def _outliers_removal(self) -> Outliers_removal_ml:
+        """The outlier step of the numeric cleaning pipeline, with the parallel jobs and seed of the preprocessor."""
+        return Outliers_removal_ml(n_jobs=self.n_jobs, random_state=self.random_state)
+
+    def _fit_cleaning(self, Xdf: pd.DataFrame):
+        """Choose the column partitions and fit the cleaning pipeline.
+
+            Returns
+            -------
+            the transformed training data
+        """
         threshold = 0.6
         
         na_percentages = Xdf.isna().sum() / Xdf.shape[0]
@@ -928,8 +1545,7 @@ class Preprocessor(TransformerMixin, BaseEstimator):
             cols_to_drop.remove("sp-n")
         Xdf = Xdf.drop(cols_to_drop, axis=1)
         
-        nested_cols = Xdf.applymap(type).isin([dict, list]).any() # dropping the nested things
-        Xdf = Xdf.loc[:, ~nested_cols]
+        Xdf = Xdf.drop(nestedColumns(Xdf, self.cols_nested, source=self.collection_prefix), axis=1) # dropping the nested things
         
         existing = list(Xdf.columns)
         
@@ -964,7 +1580,7 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         
         numeric = Pipeline([ 
         ('imputer', custom_numeric_imputer()), # regression class
-        ("outliers_removal", Outliers_removal_ml())])  # outliers and no scaling here _distrs
+        ("outliers_removal", self._outliers_removal())])  # outliers and no scaling here _distrs
         
         dates_pipe_spec = Pipeline([('numeric_dates', Dates_numeric_Pipeline())]) # interpolate na
         dates_pipe_common = Pipeline([('rest_dates', Dates_common_Pipeline())]) # bfil and ffil for na
@@ -972,11 +1588,53 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         str_pipe_encoders = Pipeline([("one_hot_imputer", OneHotEncoderWithNames())]) # encoders
         str_pipe_others = Pipeline([('imputer', SimpleImputer(strategy="most_frequent"))]) # with the mode
         
-        full_pipeline = ColumnTransformer([("num", numeric, num_cols), ("numeric_dates",dates_pipe_spec,dates_special),("common_dates",dates_pipe_common,common_dates) ,("str_encode",str_pipe_encoders,encoders),("str_others",str_pipe_others,others)])
+        transformers = [("num", numeric, num_cols), ("numeric_dates",dates_pipe_spec,dates_special),("common_dates",dates_pipe_common,common_dates)]
+        one_hot_encoder = None
+        if not self.sparse_one_hot:
+            transformers.append(("str_encode",str_pipe_encoders,encoders))
+        elif encoders: # the ColumnTransformer would densify the sparse output when stacking
+            one_hot_encoder = OneHotEncoderWithNames(sparse=True).fit(Xdf[encoders])
+        transformers.append(("str_others",str_pipe_others,others))
+        full_pipeline = ColumnTransformer(transformers)
 
         g = full_pipeline.fit_transform(Xdf)
-        
-        columns = num_cols + dates_special+ common_dates + list(one_hot_names) + others # match the order
+
+        if one_hot_encoder is not None:
+            one_hot = list(one_hot_encoder.column_names)
+        elif encoders:
+            one_hot = list(full_pipeline.named_transformers_['str_encode'].named_steps['one_hot_imputer'].column_names)
+        else:
+            one_hot = []
+        self.input_columns_ = list(Xdf.columns)
+        self.num_cols_ = num_cols
+        self.dates_special_ = dates_special
+        self.common_dates_ = common_dates
+        self.encoders_ = encoders
+        self.others_ = others
+        self.one_hot_names_ = one_hot
+        self.encoded_hot = one_hot
+        self.cleaning_pipeline_ = full_pipeline
+        self.one_hot_encoder_ = one_hot_encoder
+        self.schema_hash_ = self.schema_hash()
+        self.cleaning_fitted_ = True
+        logger.info(f'Fitted cleaning pipeline, schema {self.schema_hash_}')
+        return g
+
+    def _align_input(self, Xdf: pd.DataFrame) -> pd.DataFrame:
+        """Give the prediction data the columns of the training data.
+        Missing columns are added as nulls for the imputers, extra ones are dropped.
+        """
+        missing = [col for col in self.input_columns_ if col not in Xdf.columns]
+        if missing:
+            logger.warning(f'Columns missing in the data to transform: {missing}')
+        return Xdf.reindex(columns=self.input_columns_)
+
+    def _cleaning_output(self, g, one_hot: pd.DataFrame = None) -> pd.DataFrame:
+        num_cols = self.num_cols_
+        dates_special = self.dates_special_
+        common_dates = self.common_dates_
+        one_hot_names = self.one_hot_names_ if one_hot is None else []
+        columns = num_cols + dates_special+ common_dates + one_hot_names + self.others_ # match the order
         
         
         z = pd.DataFrame(g,columns=columns)
@@ -986,14 +1644,57 @@ class Preprocessor(TransformerMixin, BaseEstimator):
         dates_to_change = dates_special
         
                 
-        all_cols = num_cols+dates_to_change+list(one_hot_names)
+        all_cols = num_cols+dates_to_change+one_hot_names
         z[all_cols] = z[all_cols].apply(pd.to_numeric) #convert all numeric from onbject to float again
+        if one_hot is not None:
+            z = pd.concat([z, one_hot], axis=1)
         z = z.reindex(sorted(z.columns), axis=1)
-        Xdf = z
-        Xdf.head(n=30).to_excel("preporcesed_data.xlsx")
-        self.flag_to_include_else = False #num_cols+list(one_hot_names) # add the rest of the cols
-        self.Xdf = Xdf
-        return Xdf
+        return z
+
+    def schema_hash(self) -> str:
+        """Hash of the input columns, their partitions and the one-hot vocabulary.
+        A loaded preprocessor shall have the same hash as when it was saved.
+        """
+        schema = {
+            'input': self.input_columns_,
+            'num': self.num_cols_,
+            'dates_special': sorted(self.dates_special_),
+            'common_dates': self.common_dates_,
+            'encoders': self.encoders_,
+            'others': self.others_,
+            'one_hot': self.one_hot_names_,
+        }
+        return hashlib.md5(json.dumps(schema).encode()).hexdigest()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('Xdf', None)  # debug data, not part of the model
+        return state
+
+    def save(self, store: ModelStore, name: str = 'preprocessor') -> None:
+        """Save the fitted preprocessor with its version and schema hash."""
+        if not getattr(self, 'cleaning_fitted_', False):
+            raise ValueError('The preprocessor has not been fitted yet.')
+        meta = {
+            'version': PREPROCESSOR_VERSION,
+            'schema_hash': self.schema_hash_,
+            'input_columns': self.input_columns_,
+            'one_hot_names': self.one_hot_names_,
+            'ts': datetime.datetime.now(),
+        }
+        logger.info(f'Saving preprocessor: {name} {self.schema_hash_}')
+        store.save_model(name, self, 0, meta)
+
+    @classmethod
+    def load(cls, store: ModelStore, name: str = 'preprocessor') -> 'Preprocessor':
+        """Load a fitted preprocessor saved by save, for transform only."""
+        preprocessor, _, meta = store.load_model(name)
+        if meta.get('version') != PREPROCESSOR_VERSION:
+            raise ValueError(
+                f'Preprocessor {name} version {meta.get("version")} is not {PREPROCESSOR_VERSION}. Retrain it.')
+        if preprocessor.schema_hash() != meta['schema_hash']:
+            raise ValueError(f'Preprocessor {name} schema does not match its saved hash.')
+        return preprocessor
     
     
     
@@ -1,17 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
+import multiprocessing
 from math import isnan
-from typing import Union
+from typing import Callable, Union
+from base.artifact_sink import ArtifactSink, getArtifactSink, setArtifactSink
 from base.base_cfg import BaseCfg
 from base.const import MODEL_TYPE_CLASSIFICATION, MODEL_TYPE_REGRESSION
 from base.model_store import ModelStore
-from base.util import expendList, getRoundFunction, logDataframeChange
+from base.util import expendList, logDataframeChange
 from data.data_source import DataSource
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 import numpy as np
 from sklearn.metrics import explained_variance_score, accuracy_score, r2_score
+from threadpoolctl import threadpool_limits
 
 from data.estimate_scale import EstimateScale
+from transformer.preprocessor import FLOAT32_MAX_INT
+
+# the manager being trained by train_parallel, inherited by forked workers
+_TRAINING_MANAGER = None
+# methods of the scale by scale estimate that estimate_batched does not call.
+# model_input is called by both, for sparse input.
+BATCHED_BYPASSED_HOOKS = ('estimate_single_scale', 'load_data')
+
+
+def _train_scale_in_worker(scaleKey: str) -> tuple[str, dict, tuple[float, float], list[dict]]:
+    """Train one scale of _TRAINING_MANAGER in a worker process.
+    The OpenMP and BLAS pools inherited by fork are not usable in the child,
+    so the worker runs single threaded.
+    """
+    manager = _TRAINING_MANAGER
+    sink = getArtifactSink()
+    recordCount = len(sink.records)
+    with threadpool_limits(limits=1):
+        scale, model, accuracy, x_cols, x_means, meta = manager.train_single_scale(
+            manager.scales[scaleKey])
+    # records made in this worker are merged into the parent's sink
+    records = sink.records[recordCount:]
+    if scale is None:
+        return scaleKey, None, None, records
+    return (
+        scaleKey,
+        manager._model_dict(model, accuracy, x_cols, x_means, meta),
+        (manager.min_output_value_, manager.max_output_value_),
+        records,
+    )
+
+
+def roundArray(values: np.ndarray, roundBy: float = 1, lower: float = None, upper: float = None) -> np.ndarray:
+    """Round values to multiples of roundBy, then clip them to [lower, upper].
+    The vectorized getRoundFunction, returns the dtype of values.
+    """
+    values = np.asarray(values)
+    result = np.round(values / roundBy) * roundBy if roundBy != 1 else np.round(values)
+    if lower is not None or upper is not None:
+        result = np.clip(result, lower, upper)
+    return result.astype(values.dtype, copy=False)
+
+
+class FeatureLayout:
+    """Input layout of one model, built once when the model is trained or loaded.
+    It maps the columns of a frame to the model input positions, and holds the
+    x_means fill vector of the columns missing in the frame,
+    to assemble the input matrix in one allocation.
+    The matrix is float32, or float64 when a mean is too large for float32, e.g. onD.
+
+    Parameters
+    ==========
+    x_cols: list[str]
+        the model input columns, in order
+    x_means: dict
+        column => mean, to fill the missing columns. ValueError if None.
+    """
+
+    def __init__(self, x_cols: list[str], x_means: dict):
+        if x_means is None:
+            raise ValueError('x_means not found.')
+        self.x_cols = list(x_cols)
+        fill = np.array([x_means.get(col, np.nan) for col in self.x_cols], dtype=np.float64)
+        finite = np.abs(fill[np.isfinite(fill)])
+        self.dtype = np.float32 if np.all(finite < FLOAT32_MAX_INT) else np.float64
+        self.fill = fill.astype(self.dtype)
+        # (columns, frame positions, input positions, missing input positions, dense)
+        self._binding = None
+
+    def bind(self, df: pd.DataFrame) -> tuple:
+        """Positions of the x_cols in df, cached for the last columns."""
+        binding = self._binding
+        if binding is None or not (binding[0] is df.columns or binding[0].equals(df.columns)):
+            positions = df.columns.get_indexer(self.x_cols)
+            present = positions >= 0
+            dense = not any(isinstance(dtype, pd.SparseDtype)
+                            for dtype in df.dtypes.iloc[positions[present]])
+            binding = (df.columns, positions[present], np.flatnonzero(present),
+                       np.flatnonzero(~present), dense)
+            self._binding = binding
+        return binding
+
+    def dense(self, df: pd.DataFrame) -> bool:
+        """True when no x_cols of df is sparse, see matrix."""
+        return self.bind(df)[4]
+
+    def matrix(self, df: pd.DataFrame, rows: np.ndarray = None) -> np.ndarray:
+        """The model input of df, or of its rows at positions rows."""
+        _, framePositions, inputPositions, missing, _ = self.bind(df)
+        rowCount = len(df.index) if rows is None else len(rows)
+        X = np.empty((rowCount, len(self.x_cols)), dtype=self.dtype)
+        X[:, missing] = self.fill[missing]
+        for i, j in zip(framePositions, inputPositions):
+            values = df.iloc[:, i].to_numpy()
+            X[:, j] = values if rows is None else values[rows]
+        return X
 
 
 class RmBaseEstimateManager:
@@ -23,13 +124,17 @@ class RmBaseEstimateManager:
         x_columns: list[str]
         y_column: str
         date_span: int
-        filter_func: pd.Series -> bool
+        filter_func: pd.DataFrame -> boolean mask, {col: (op, *args)}
+            or pd.Series -> bool (slow). See data.data_source.filterMask
         suffix_list: list[str]
         scales: {repr(scale): EstimateScale}
             model, meta, accuracy are stored in each scale.
         scale: EstimateScale
             when there is only one scale, this is the scale.
             either scale or scales is set.
+        uses_additional_x_cols: bool
+            load_data adds all the other columns of df_grouped (additional_x_cols) to x_columns,
+            so DataSource.plan_col_list reads all columns. Set False to use x_columns only.
 
     generated attributes:
         df: pd.DataFrame
@@ -39,7 +144,10 @@ class RmBaseEstimateManager:
     ==========
     DataSource: data.data_source.DataSource
     estimate_both: bool = False. True for both sale and rent.
+    artifact_sink: ArtifactSink = None. Set as the process-wide sink when given,
+        it is flushed at the end of train and estimate.
     """
+    uses_additional_x_cols: bool = True
 
     def __init__(
         self,
@@ -49,6 +157,7 @@ class RmBaseEstimateManager:
         estimate_both: bool = False,
         min_output_value: float = 0,
         max_output_value: float = 1000000000,
+        artifact_sink: ArtifactSink = None,
     ) -> None:
         self.data_source = data_source
         self.additional_x_cols = data_source.encoded_hot # additional columns f
@@ -58,6 +167,8 @@ class RmBaseEstimateManager:
         self.estimate_both = estimate_both
         self.min_output_value = min_output_value
         self.max_output_value = max_output_value
+        if artifact_sink is not None:
+            setArtifactSink(artifact_sink)
         pass
 
     def load_scales(self, sale: bool = None) -> None:
@@ -72,43 +183,98 @@ class RmBaseEstimateManager:
     def __model_key__(self) -> str:
         return f'{self.name}:{self.model_name}'
 
-    def train(self) -> None:
+    def train(self, n_jobs: int = 1) -> None:
         """Train the estimator.
         Train the estimator(s) for the specified scale or all scales.
+        The artifact sink is flushed at the end of the training.
+
+        Parameters
+        ==========
+        n_jobs: int
+            number of worker processes to train the scales in parallel.
         """
-        if hasattr(self, 'scale'):
-            scale, model, accuracy, x_cols, x_means, meta = self.train_single_scale(
-                scale)
-            if scale is None:
-                self.logger.warning('No scale to train')
-                return
-            model_dict = {
-                'model': model,
-                'accuracy': accuracy,
-                'x_cols': x_cols,
-                'x_means': x_means,
-                'feature_importance': meta['feature_importance'],
-            }
-            scale.meta[self.__model_key__()] = model_dict
-        elif hasattr(self, 'scales'):
-            for scale in self.scales.values():
+        try:
+            if hasattr(self, 'scale'):
                 scale, model, accuracy, x_cols, x_means, meta = self.train_single_scale(
                     scale)
                 if scale is None:
-                    continue
-                model_dict = {
-                    'model': model,
-                    'accuracy': accuracy,
-                    'x_cols': x_cols,
-                    'x_means': x_means,
-                    'feature_importance': meta['feature_importance'],
-                }
-                scale.meta[self.__model_key__()] = model_dict
-        else:
+                    self.logger.warning('No scale to train')
+                    return
+                scale.meta[self.__model_key__()] = self._model_dict(
+                    model, accuracy, x_cols, x_means, meta)
+            elif hasattr(self, 'scales'):
+                if n_jobs is not None and n_jobs > 1 and len(self.scales) > 1:
+                    self.train_parallel(n_jobs)
+                    return
+                for scale in self.scales.values():
+                    scale, model, accuracy, x_cols, x_means, meta = self.train_single_scale(
+                        scale)
+                    if scale is None:
+                        continue
+                    scale.meta[self.__model_key__()] = self._model_dict(
+                        model, accuracy, x_cols, x_means, meta)
+            else:
+                self.logger.warning(
+                    'No scale or scales defined. Load scales first.')
+                self.load_scales()
+                self.train(n_jobs=n_jobs)
+        finally:
+            getArtifactSink().flush()
+
+    def _model_dict(self, model, accuracy, x_cols, x_means, meta) -> dict:
+        return {
+            'model': model,
+            'accuracy': accuracy,
+            'x_cols': x_cols,
+            'x_means': x_means,
+            'feature_importance': meta['feature_importance'],
+            'layout': FeatureLayout(x_cols, x_means),
+        }
+
+    def train_parallel(self, n_jobs: int) -> None:
+        """Train all the scales in a pool of forked worker processes.
+        Workers inherit this manager and data_source.df_grouped from the
+        parent process, so only the scale keys and the results are pickled.
+        Metrics recorded by the workers are merged into the parent's sink,
+        artifacts stay in the workers.
+        Scales are dispatched largest first. Each model gets 1 thread (model_n_jobs):
+        a forked child that starts OpenMP threads after the parent used them can deadlock,
+        so use up to cpu_count workers instead.
+        """
+        global _TRAINING_MANAGER
+        if 'fork' not in multiprocessing.get_all_start_methods():
             self.logger.warning(
-                'No scale or scales defined. Load scales first.')
-            self.load_scales()
-            self.train()
+                'fork is not supported, train scales serially.')
+            return self.train(n_jobs=1)
+        n_jobs = min(n_jobs, len(self.scales))
+        scaleKeys = sorted(
+            self.scales.keys(),
+            key=lambda k: self.data_source.count_scale_rows(self.scales[k]),
+            reverse=True)
+        self.model_n_jobs = 1
+        self.logger.info(
+            f'Train {len(scaleKeys)} scales with {n_jobs} single threaded workers')
+        _TRAINING_MANAGER = self
+        results = {}
+        try:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                mp_context=multiprocessing.get_context('fork'),
+            ) as executor:
+                for scaleKey, model_dict, output_min_max, records in executor.map(
+                        _train_scale_in_worker, scaleKeys):
+                    results[scaleKey] = (model_dict, output_min_max)
+                    getArtifactSink().extend(records)
+        finally:
+            _TRAINING_MANAGER = None
+            self.model_n_jobs = None
+        # merge back in the scales' order, as the serial training does
+        for scaleKey, scale in self.scales.items():
+            model_dict, output_min_max = results.get(scaleKey, (None, None))
+            if model_dict is None:
+                continue
+            scale.meta[self.__model_key__()] = model_dict
+            self.min_output_value_, self.max_output_value_ = output_min_max
 
     def train_single_scale(self, scale: EstimateScale) -> tuple[EstimateScale, object, float, list[str], pd.Series, dict]:
         """Train the estimator for a single scale.
@@ -122,37 +288,167 @@ class RmBaseEstimateManager:
     def get_writeback_db_column(self) -> str:
         return getattr(self, 'y_db_col', None)
 
-    def estimate(self, df_grouped: pd.DataFrame) -> tuple[pd.DataFrame, list[str], list[str]]:
+    def estimate(self, df_grouped: pd.DataFrame, n_jobs: int = 1) -> tuple[pd.DataFrame, list[str], list[str]]:
         """Estimate the data source.
         Either train or load must be called before this.
+        All the scales are estimated by estimate_batched, unless a subclass
+        overrides a hook it bypasses (see BATCHED_BYPASSED_HOOKS) or df_grouped has no scale index.
+        The artifact sink is flushed at the end of the estimate.
+
+        Parameters
+        ==========
+        n_jobs: int
+            number of threads to predict the scales, see estimate_batched.
         """
-        if hasattr(self, 'scale'):
-            return self.estimate_single_scale(
-                df_grouped=df_grouped, scale=scale)
-        elif hasattr(self, 'scales'):
-            df_y_list = []
-            y_cols_list = []
-            y_db_cols_list = []
-            for scale in self.scales.values():
-                df_y, y_cols, y_db_cols = self.estimate_single_scale(
+        try:
+            if hasattr(self, 'scale'):
+                return self.estimate_single_scale(
                     df_grouped=df_grouped, scale=scale)
-                if df_y is not None:
-                    df_y_list.append(df_y)
-                    for i in range(len(y_cols)):
-                        col = y_cols[i]
-                        if col not in y_cols_list:
-                            y_cols_list.append(col)
-                            # y_db_cols_list must match y_cols_list
-                            y_db_cols_list.append(y_db_cols[i])
-            if len(df_y_list) > 0:
-                df_y = pd.concat(df_y_list)
-                return df_y, y_cols_list, y_db_cols_list
+            elif hasattr(self, 'scales'):
+                if self._supports_batched():
+                    result = self.estimate_batched(df_grouped, n_jobs=n_jobs)
+                    if result is not None:
+                        return result
+                df_y_list = []
+                y_cols_list = []
+                y_db_cols_list = []
+                for scale in self.scales.values():
+                    df_y, y_cols, y_db_cols = self.estimate_single_scale(
+                        df_grouped=df_grouped, scale=scale)
+                    if df_y is not None:
+                        df_y_list.append(df_y)
+                        for i in range(len(y_cols)):
+                            col = y_cols[i]
+                            if col not in y_cols_list:
+                                y_cols_list.append(col)
+                                # y_db_cols_list must match y_cols_list
+                                y_db_cols_list.append(y_db_cols[i])
+                if len(df_y_list) > 0:
+                    df_y = pd.concat(df_y_list)
+                    return df_y, y_cols_list, y_db_cols_list
+                else:
+                    return None, None, None
             else:
-                return None, None, None
+                self.logger.error(
+                    'No scale or scales defined.')
+                raise Exception('No scale or scales defined.')
+        finally:
+            getArtifactSink().flush()
+
+    def _supports_batched(self) -> bool:
+        """True when no hook bypassed by estimate_batched is overridden."""
+        for hook in BATCHED_BYPASSED_HOOKS:
+            if getattr(type(self), hook) is not getattr(RmBaseEstimateManager, hook):
+                self.logger.debug(f'{self.name}: {hook} is overridden, estimate scale by scale')
+                return False
+        return True
+
+    def estimate_batched(
+        self,
+        df_grouped: pd.DataFrame,
+        n_jobs: int = 1,
+    ) -> tuple[pd.DataFrame, list[str], list[str]]:
+        """Estimate all the scales in one pass over df_grouped.
+        The rows of each scale are taken by position from the data source's scale index,
+        predicted by the scale's model, optionally in n_jobs threads,
+        and written by position into one output array, which is rounded once.
+        Returns None, to estimate scale by scale, when df_grouped has no scale index,
+        when a row is in several scales (e.g. estimate_both with sale and lease scales),
+        or when numeric_columns_only would drop an x_cols column, as get_df does.
+        """
+        key = self.__model_key__()
+        tasks = []
+        for scale in self.scales.values():
+            # sale is set to both to estimate all data
+            filterScale = scale.copy(sale='Both') if self.estimate_both else scale
+            positions = self.data_source.scale_positions(filterScale, df_grouped)
+            if positions is None:
+                return None
+            if len(positions) == 0:
+                continue
+            if key not in scale.meta:
+                self.logger.warning(
+                    f'No model found for scale {scale}.')
+                continue
+            tasks.append((scale, positions))
+        if len(tasks) == 0:
+            return None, None, None
+        allPositions = np.concatenate([positions for _, positions in tasks])
+        if len(np.unique(allPositions)) < len(allPositions):
+            self.logger.debug(f'{self.name}: scales overlap, estimate scale by scale')
+            return None
+        if getattr(self, 'numeric_columns_only', False):
+            for scale, _ in tasks:
+                for col in scale.meta[key]['x_cols']:
+                    if col in df_grouped.columns and not is_numeric_dtype(df_grouped[col].dtype):
+                        self.logger.debug(
+                            f'{self.name}: {col} is not numeric, estimate scale by scale')
+                        return None
+
+        def predict(task):
+            scale, positions = task
+            model_dict = scale.meta[key]
+            return model_dict['model'].predict(
+                self._model_x(df_grouped, positions, model_dict))
+        if n_jobs is not None and n_jobs > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                predictions = list(executor.map(predict, tasks))
         else:
-            self.logger.error(
-                'No scale or scales defined.')
-            raise Exception('No scale or scales defined.')
+            predictions = [predict(task) for task in tasks]
+        rowCount = len(df_grouped.index)
+        yDtype = np.result_type(*[np.asarray(p).dtype for p in predictions])
+        if yDtype.kind in 'biufc':
+            y = np.full(rowCount, np.nan)
+        else:
+            y = np.full(rowCount, None, dtype=object)
+        accuracy = np.full(rowCount, np.nan)
+        covered = np.zeros(rowCount, dtype=bool)
+        for (scale, positions), prediction in zip(tasks, predictions):
+            y[positions] = prediction
+            accuracy[positions] = scale.meta[key]['accuracy']
+            covered[positions] = True
+        rows = np.flatnonzero(covered)
+        y = y[rows]
+        if self.model_class == MODEL_TYPE_REGRESSION:
+            y = self.round_result(y)
+        self.logger.info(
+            f'Estimation result for {self.name} {len(tasks)} scales {len(rows)} rows [{self.min_output_value_},{self.max_output_value_}]')
+        y_cols, y_db_cols = self._output_columns()
+        df_y = pd.DataFrame(
+            {y_cols[0]: y, y_cols[1]: accuracy[rows]},
+            index=df_grouped.index[rows])
+        return (df_y, y_cols, y_db_cols)
+
+    def _model_x(self, df_grouped: pd.DataFrame, positions: np.ndarray, model_dict: dict):
+        """The model input of the rows at positions (all rows if None), missing x_cols filled with x_means.
+        Dense data is assembled by the model's FeatureLayout, sparse data by model_input.
+        """
+        x_cols = model_dict['x_cols']
+        x_means = model_dict['x_means']
+        if x_means is None:
+            raise Exception('x_means not found.')
+        layout = model_dict.get('layout')
+        if layout is None:
+            layout = model_dict['layout'] = FeatureLayout(x_cols, x_means)
+        if layout.dense(df_grouped):
+            return layout.matrix(df_grouped, positions)
+        present = [col for col in x_cols if col in df_grouped.columns]
+        rows = slice(None) if positions is None else positions
+        df = df_grouped.iloc[rows, df_grouped.columns.get_indexer(present)]
+        missing = {col: x_means[col] for col in x_cols if col not in df.columns}
+        if missing:
+            df = df.assign(**missing)
+        return self.model_input(df, x_cols)
+
+    def _output_columns(self) -> tuple[list[str], list[str]]:
+        """The estimate and accuracy columns, and their db columns."""
+        y_target_col = self.get_output_column()
+        y_db_col = self.get_writeback_db_column()
+        if y_db_col is not None:
+            y_db_cols = [y_db_col, y_db_col+'_acu']
+        else:
+            y_db_cols = [None, None]
+        return [y_target_col, y_target_col+'-acu'], y_db_cols
 
     def estimate_single_scale(
         self,
@@ -182,28 +478,23 @@ class RmBaseEstimateManager:
             return None, None, None
         model_dict = scale.meta[key]
         model = model_dict['model']
-        x_cols = model_dict['x_cols']
-        x_means = model_dict['x_means']
-        if x_means is None:
-            raise Exception('x_means not found.')
-        # fill missing values with mean
-        for col in list(set(x_cols) - set(df.columns)):
-            df[col] = x_means[col]
         self.logger.debug(df.head())
-        y = model.predict(df[x_cols])
+        # missing x_cols are filled with their means
+        y = model.predict(self._model_x(df, None, model_dict))
         if self.model_class == MODEL_TYPE_REGRESSION:
             y = self.round_result(y)
         self.logger.info(
             f'Estimation result for {self.name} {str(scale)} [{self.min_output_value_},{self.max_output_value_}]: {y}')
         y_target_col = self.get_output_column()
-        df[y_target_col] = y
-        df[y_target_col+'-acu'] = model_dict['accuracy']
         y_db_col = self.get_writeback_db_column()
         if y_db_col is not None:
             y_db_cols = [y_db_col, y_db_col+'_acu']
         else:
             y_db_cols = [None, None]
-        return (df.loc[:, [y_target_col, y_target_col+'-acu']], [y_target_col, y_target_col+'-acu'], y_db_cols)
+        # df is shared by get_df, the estimates are a new frame
+        df_y = pd.DataFrame(
+            {y_target_col: y, y_target_col+'-acu': model_dict['accuracy']}, index=df.index)
+        return (df_y, [y_target_col, y_target_col+'-acu'], y_db_cols)
 
     def save(self, store: ModelStore) -> None:
         """Save the estimator(s).
@@ -244,6 +535,7 @@ class RmBaseEstimateManager:
                 store, self.scale)
             meta['model'] = model
             meta['accuracy'] = accuracy
+            meta['layout'] = self._layout(meta)
             self.scale.meta[self.__model_key__()] = meta
         elif hasattr(self, 'scales'):
             for scale in self.scales.values():
@@ -251,10 +543,18 @@ class RmBaseEstimateManager:
                     store, scale)
                 meta['model'] = model
                 meta['accuracy'] = accuracy
+                meta['layout'] = self._layout(meta)
                 scale.meta[self.__model_key__()] = meta
         else:
             raise Exception('No scale or scales is set.')
 
+    @staticmethod
+    def _layout(meta: dict) -> FeatureLayout:
+        """The FeatureLayout of a loaded model, None without x_means: estimate raises then."""
+        if meta.get('x_means') is None:
+            return None
+        return FeatureLayout(meta['x_cols'], meta['x_means'])
+
     def load_one_model(self, store: ModelStore, scale: EstimateScale) -> tuple[EstimateScale, any, float, dict]:
         """Load one estimator."""
         filename = ':'.join([self.name, self.model_name, repr(scale)])
@@ -288,7 +588,7 @@ class RmBaseEstimateManager:
         x_columns: list[str] = None,
         y_column: str = None,
         date_span: int = None,
-        filter_func: (pd.Series) = None,
+        filter_func: Union[Callable, dict] = None,
         suffix_list: list[str] = None,
         numeric_columns_only: bool = None,
         prefer_estimated: bool = False,
@@ -321,7 +621,7 @@ class RmBaseEstimateManager:
             col_list.append(self.y_column)
             
         
-        if hasattr(self, "additional_x_cols"): # additional str columns
+        if self.uses_additional_x_cols and hasattr(self, "additional_x_cols"): # additional str columns
             additional_columns.extend(self.additional_x_cols)
         
         #print(col_list)
@@ -353,6 +653,10 @@ class RmBaseEstimateManager:
         """ Filter data. To be implemented by subclasses."""
         return X
 
+    def model_input(self, df: pd.DataFrame, x_cols: list[str]):
+        """The x of the model from df. Subclasses can override it, e.g. to keep sparse columns sparse."""
+        return df[x_cols]
+
     def get_x_y_columns(
         self,
         df: pd.DataFrame,
@@ -364,7 +668,7 @@ class RmBaseEstimateManager:
         y_numeric_column = None
         x_numeric_columns = []
         for col in df.columns:
-            if df[col].dtype in ['int64', 'float64']:
+            if is_numeric_dtype(df[col].dtype):
                 x_numeric_columns.append(col)
                 if col == y_column:
                     y_numeric_column = col
@@ -386,17 +690,20 @@ class RmBaseEstimateManager:
         return self.pred_accuracy_score
 
     def round_result(self, y_pred: Union[pd.Series, pd.DataFrame, np.ndarray], col: str = None):
-        fnRound = getRoundFunction(
-            getattr(self, 'roundBy', 1),
-            min=self.min_output_value_,
-            max=self.max_output_value_,
-        )
+        """Round y_pred by roundBy and clip it to the soft min/max output values, see roundArray."""
+        def fnRound(values):
+            return roundArray(
+                values,
+                getattr(self, 'roundBy', 1),
+                lower=self.min_output_value_,
+                upper=self.max_output_value_,
+            )
         if isinstance(y_pred, pd.Series):
-            y_pred = y_pred.map(fnRound)
+            y_pred = pd.Series(fnRound(y_pred.to_numpy()),
+                               index=y_pred.index, name=y_pred.name)
         elif isinstance(y_pred, pd.DataFrame):
-            y_pred[col] = y_pred[col].map(fnRound)
+            y_pred[col] = fnRound(y_pred[col].to_numpy())
         elif isinstance(y_pred, np.ndarray):
-            fnRound = np.vectorize(fnRound)
             y_pred = fnRound(y_pred)
         else:
             raise ValueError(f'Unknown type: {type(y_pred)}')
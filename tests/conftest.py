@@ -0,0 +1,100 @@
+"""Shared test doubles: a scale with the EstimateScale attributes used by DataSource,
+and a small grouped dataframe in the df_grouped layout.
+The modules of this tree are imported by their package paths (data.data_source, ...),
+see FlatLayoutFinder.
+"""
+from datetime import datetime
+import importlib.abc
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# package path => the file of this tree
+FLAT_MODULES = {
+    'base.artifact_sink': os.path.join('base', 'artifact_sink.py'),
+    'data.data_source': 'data_source.py',
+    'transformer.preprocessor': 'preprocessor.py',
+    'estimator.rmbase_estimate_manager': 'rmbase_estimate_manager.py',
+    'estimator.lgbm_estimate_manager': 'lgbm_estimate_manager.py',
+}
+
+
+class FlatLayoutFinder(importlib.abc.MetaPathFinder):
+    """Find the FLAT_MODULES by their package paths, after the installed packages."""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in FLAT_MODULES:
+            return None
+        return importlib.util.spec_from_file_location(
+            fullname, os.path.join(ROOT, FLAT_MODULES[fullname]))
+
+
+def installFlatLayout():
+    for package in sorted({name.split('.')[0] for name in FLAT_MODULES}):
+        if package not in sys.modules and importlib.util.find_spec(package) is None:
+            # an empty package, the other modules of an absent package are not found
+            module = types.ModuleType(package)
+            module.__path__ = []
+            sys.modules[package] = module
+    if not any(isinstance(finder, FlatLayoutFinder) for finder in sys.meta_path):
+        sys.meta_path.append(FlatLayoutFinder())
+
+
+installFlatLayout()
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+
+GROUP_LEVELS = ['saletp-b', 'ptype2-l', 'prov', 'area', 'city', '_id']
+
+
+class FakeScale:
+    """The EstimateScale attributes read by DataSource and the estimate managers."""
+
+    def __init__(self, sale=None, propType=None, prov=None, area=None, city=None,
+                 datePoint=datetime(2024, 1, 1)):
+        self.sale = sale
+        self.propType = propType
+        self.prov = prov
+        self.area = area
+        self.city = city
+        self.datePoint = datePoint
+        self.meta = {}
+
+    def get_query(self):
+        return {}
+
+    def copy(self, sale=None):
+        return FakeScale(None if sale == 'Both' else sale, self.propType,
+                         self.prov, self.area, self.city, self.datePoint)
+
+    def __repr__(self):
+        return f'FakeScale({self.sale},{self.propType},{self.prov},{self.area},{self.city})'
+
+
+def makeGrouped(rows: int = 60, seed: int = 0) -> pd.DataFrame:
+    """A df_grouped of sale/lease rows in two cities, sorted by the scale levels."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'saletp-b': rng.integers(0, 2, rows).astype(np.uint8),
+        'ptype2-l': rng.choice(['Detached', 'Semi'], rows),
+        'prov': 'ON',
+        'area': 'Toronto',
+        'city': rng.choice(['Toronto', 'Etobicoke'], rows),
+        '_id': [f'TRB{i:05d}' for i in range(rows)],
+        'onD': rng.integers(20230101, 20231231, rows),
+        'bdrms-n': rng.integers(1, 6, rows).astype(float),
+        'sqft-n': rng.uniform(500, 3000, rows),
+        'sp-n': rng.uniform(300000, 2000000, rows),
+        'cmty-c': pd.Categorical(rng.choice(['a', 'b', 'c'], rows)),
+    })
+    return df.set_index(GROUP_LEVELS).sort_index()
+
+
+@pytest.fixture
+def grouped():
+    return makeGrouped()
@@ -0,0 +1,75 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+artifact_sink = pytest.importorskip('base.artifact_sink')
+
+
+def test_disabled_sink_drops_everything(tmp_path):
+    sink = artifact_sink.ArtifactSink(str(tmp_path / 'run.jsonl'))
+    sink.record('accuracy', value=0.9)
+    sink.artifact('get_df', pd.DataFrame({'a': [1]}))
+    sink.flush()
+    assert sink.records == [] and sink.artifacts == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_flush_writes_records_and_artifacts(tmp_path):
+    path = tmp_path / 'out' / 'run.jsonl'
+    sink = artifact_sink.ArtifactSink(str(path), enabled=True)
+    sink.record('accuracy', scale='Toronto', value=0.9)
+    sink.extend([{'kind': 'accuracy', 'scale': 'York', 'value': 0.8}])
+    df = pd.DataFrame({'sp-n': [1.0, 2.0]})
+    sink.artifact('get_df', df)
+    # the artifact is a copy
+    df.loc[0, 'sp-n'] = -1
+    sink.flush()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r['scale'], r['value']) for r in lines] == [('Toronto', 0.9), ('York', 0.8)]
+    written = list((tmp_path / 'out').glob('run.get_df.*'))
+    assert len(written) == 1
+    assert sink.records == [] and sink.artifacts == {}
+
+
+def test_set_artifact_sink_returns_the_previous_one():
+    sink = artifact_sink.ArtifactSink(enabled=True)
+    previous = artifact_sink.setArtifactSink(sink)
+    try:
+        assert artifact_sink.getArtifactSink() is sink
+    finally:
+        artifact_sink.setArtifactSink(previous)
+    assert artifact_sink.getArtifactSink() is previous
+
+
+def test_flush_without_new_records_keeps_the_file(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'run.parquet'
+    sink = artifact_sink.ArtifactSink(str(path), enabled=True)
+    sink.record('accuracy', value=0.9)
+    sink.flush()
+    sink.flush()
+    assert pd.read_parquet(path)['value'].tolist() == [0.9]
+
+
+def test_manager_train_flushes_its_sink(tmp_path):
+    rmbase = pytest.importorskip('estimator.rmbase_estimate_manager')
+
+    class RecordingManager(rmbase.RmBaseEstimateManager):
+        def train_single_scale(self, scale):
+            artifact_sink.getArtifactSink().record('accuracy', scale=repr(scale), value=0.5)
+            return None, None, None, None, None, None
+
+    path = tmp_path / 'run.jsonl'
+    sink = artifact_sink.ArtifactSink(str(path), enabled=True)
+    previous = artifact_sink.getArtifactSink()
+    try:
+        manager = RecordingManager(SimpleNamespace(encoded_hot=[]), name='test', artifact_sink=sink)
+        assert artifact_sink.getArtifactSink() is sink
+        manager.scales = {'a': 'a', 'b': 'b'}
+        manager.train()
+    finally:
+        artifact_sink.setArtifactSink(previous)
+    assert [json.loads(line)['scale'] for line in path.read_text().splitlines()] == ["'a'", "'b'"]
+    assert sink.records == []
@@ -0,0 +1,55 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+preprocessor = pytest.importorskip('transformer.preprocessor')
+
+
+def makeBatch(binary, rooms, price, city):
+    return pd.DataFrame({
+        'ac-b': np.asarray(binary, dtype=float),
+        'rms-n': np.asarray(rooms, dtype=float),
+        'sp-n': np.asarray(price, dtype=float),
+        'lat-n': [43.7] * len(binary),
+        'city': city,
+    })
+
+
+def test_plan_is_applied_to_every_batch():
+    fitting = makeBatch([0, 1, 1], [3, 4, 5], [500000.5, 600000, 700000], ['Toronto', 'York', 'York'])
+    plan = preprocessor.dtypePlan(fitting)
+    assert plan['ac-b'] == np.uint8
+    assert plan['rms-n'] == np.int16
+    assert plan['sp-n'] == np.float32
+    assert 'lat-n' not in plan
+    # values of this batch alone would pick other dtypes
+    batch = makeBatch([0, 0, 0], [1, 2, 3], [500000, 600000, 700000], ['York', 'York', 'York'])
+    compacted = preprocessor.applyDtypePlan(batch, plan)
+    assert compacted['ac-b'].dtype == np.uint8
+    assert compacted['rms-n'].dtype == np.int16
+    assert compacted['sp-n'].dtype == np.float32
+    assert list(compacted['city'].cat.categories) == ['Toronto', 'York']
+
+
+def test_values_out_of_the_plan_are_kept():
+    plan = preprocessor.dtypePlan(
+        makeBatch([0, 1], [3, 4], [1.5, 2.5], ['Toronto', 'York']))
+    batch = makeBatch([0, np.nan], [3, 40000], [1.5, 2.5], ['Toronto', 'Peel'])
+    compacted = preprocessor.applyDtypePlan(batch, plan)
+    assert compacted['ac-b'].dtype == np.float32
+    assert compacted['ac-b'].isna().sum() == 1
+    assert compacted['rms-n'].tolist() == [3, 40000]
+    assert list(compacted['city'].cat.categories) == ['Toronto', 'York', 'Peel']
+    assert compacted['city'].tolist() == ['Toronto', 'Peel']
+
+
+def test_large_values_out_of_the_plan_stay_exact():
+    plan = preprocessor.dtypePlan(
+        makeBatch([0, 1], [3, 4], [1.5, 2.5], ['Toronto', 'York']))
+    # yyyymmdd and prices above 2**24 are rounded by float32
+    batch = makeBatch([0, 1], [20230101, np.nan], [1.5, 20000001.5], ['Toronto', 'York'])
+    compacted = preprocessor.applyDtypePlan(batch, plan)
+    assert compacted['rms-n'].dtype == np.float64
+    assert compacted['rms-n'].iloc[0] == 20230101
+    assert compacted['sp-n'].dtype == np.float64
+    assert compacted['sp-n'].iloc[1] == 20000001.5
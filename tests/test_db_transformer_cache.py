@@ -0,0 +1,79 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+preprocessor = pytest.importorskip('transformer.preprocessor')
+
+
+class CountingTransformer:
+    """A Db* transformer counting its fits instead of reading mongodb."""
+    fits = 0
+
+    def __init__(self, col):
+        self.col = col
+
+    def fit(self, X, y=None):
+        CountingTransformer.fits += 1
+        self.fitted_ = X[self.col].tolist()
+        return self
+
+    def transform(self, X):
+        return X
+
+
+@pytest.fixture(autouse=True)
+def emptyCache():
+    preprocessor.invalidateDbTransformerCache()
+    CountingTransformer.fits = 0
+    yield
+    preprocessor.invalidateDbTransformerCache()
+
+
+def shared(wrapper=preprocessor.CachedDbTransformer, ttl=60):
+    return wrapper(CountingTransformer('city'), ('Counting', 'city'), 'city', ttl=ttl)
+
+
+def test_label_transformer_is_refitted_for_new_labels():
+    shared().fit(pd.DataFrame({'city': ['Toronto', 'York']}))
+    reused = shared().fit(pd.DataFrame({'city': ['York', None]}))
+    assert CountingTransformer.fits == 1
+    assert reused.fitted_ == ['Toronto', 'York']
+    shared().fit(pd.DataFrame({'city': ['Peel']}))
+    assert CountingTransformer.fits == 2
+    # the labels of both fits are known
+    shared().fit(pd.DataFrame({'city': ['Toronto', 'Peel']}))
+    assert CountingTransformer.fits == 2
+
+
+def test_expired_or_invalidated_entries_are_refitted():
+    frame = pd.DataFrame({'city': ['Toronto']})
+    shared(ttl=0).fit(frame)
+    shared(ttl=0).fit(frame)
+    assert CountingTransformer.fits == 2
+    shared().fit(frame)
+    assert CountingTransformer.fits == 2
+    preprocessor.invalidateDbTransformerCache()
+    shared().fit(frame)
+    assert CountingTransformer.fits == 3
+
+
+def test_numeric_transformer_is_reused_for_the_same_values():
+    wrapper = preprocessor.CachedDbNumericTransformer
+    shared(wrapper).fit(pd.DataFrame({'city': [1.0, 2.0, None]}))
+    shared(wrapper).fit(pd.DataFrame({'city': [1.0, 2.0, None]}))
+    assert CountingTransformer.fits == 1
+    # a subset of the values changes the fitted statistics
+    shared(wrapper).fit(pd.DataFrame({'city': [1.0, 2.0]}))
+    assert CountingTransformer.fits == 2
+
+
+def test_prefetch_fits_only_the_missing_columns():
+    p = preprocessor.Preprocessor()
+    p.shared_transformers_ = [
+        preprocessor.CachedDbTransformer(CountingTransformer(col), ('Counting', col), col, ttl=60)
+        for col in ['city', 'area', 'ptype2-l']]
+    frame = pd.DataFrame({'city': ['Toronto'], 'area': ['York']})
+    assert p.prefetch_db_transformers(frame) == 2
+    assert p.prefetch_db_transformers(frame) == 0
+    assert CountingTransformer.fits == 2
+    assert p.shared_transformers_[0].fit(frame).fitted_ == ['Toronto']
+    assert CountingTransformer.fits == 2
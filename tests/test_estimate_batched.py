@@ -0,0 +1,97 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+data_source = pytest.importorskip('data.data_source')
+rmbase = pytest.importorskip('estimator.rmbase_estimate_manager')
+
+from conftest import FakeScale  # noqa: E402
+
+
+class LinearModel:
+    def __init__(self, weights, offset):
+        self.weights = np.asarray(weights, dtype=float)
+        self.offset = offset
+
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ self.weights + self.offset
+
+
+class ValueManager(rmbase.RmBaseEstimateManager):
+    model_name = 'linear'
+    x_columns = ['bdrms-n', 'sqft-n']
+    y_column = 'sp-n'
+    date_span = 180
+    suffix_list = ['-n']
+    min_output_value_ = 0
+    max_output_value_ = 10000000
+
+
+def makeManager(grouped, scales, estimate_both=False, managerClass=ValueManager):
+    source = data_source.DataSource(FakeScale(), query={})
+    source.df_grouped = grouped
+    source.encoded_hot = []
+    manager = managerClass(source, name='value', estimate_both=estimate_both)
+    manager.scales = {repr(scale): scale for scale in scales}
+    for i, scale in enumerate(scales):
+        scale.meta[manager.__model_key__()] = {
+            'model': LinearModel([1000 * (i + 1), 100, 0], 5000 * i),
+            'accuracy': 0.5 + i / 10,
+            'x_cols': ['bdrms-n', 'sqft-n', 'lat-n'],
+            'x_means': {'bdrms-n': 3, 'sqft-n': 1500, 'lat-n': 43.7},
+        }
+    return manager
+
+
+def singleScaleLoop(manager, grouped):
+    frames = []
+    for scale in manager.scales.values():
+        df_y, y_cols, _ = manager.estimate_single_scale(df_grouped=grouped, scale=scale)
+        if df_y is not None:
+            frames.append(df_y)
+    return pd.concat(frames), y_cols
+
+
+def test_batched_matches_single_scale_loop(grouped):
+    scales = [FakeScale(sale=True, city='Toronto'), FakeScale(sale=True, city='Etobicoke'),
+              FakeScale(sale=False, city='Toronto')]
+    manager = makeManager(grouped, scales)
+    batched, y_cols, _ = manager.estimate_batched(grouped)
+    expected, expected_cols = singleScaleLoop(manager, grouped)
+    assert y_cols == expected_cols
+    pd.testing.assert_frame_equal(
+        batched.sort_index(), expected.sort_index(), check_dtype=False)
+
+
+def test_overlapping_scales_are_estimated_scale_by_scale(grouped):
+    # with estimate_both the sale and lease scales cover the same rows
+    scales = [FakeScale(sale=True, city='Toronto'), FakeScale(sale=False, city='Toronto')]
+    manager = makeManager(grouped, scales, estimate_both=True)
+    assert manager.estimate_batched(grouped) is None
+    df_y, _, _ = manager.estimate(grouped)
+    expected, _ = singleScaleLoop(manager, grouped)
+    pd.testing.assert_frame_equal(df_y, expected)
+
+
+class FilteredValueManager(ValueManager):
+    def load_data(self, scale, **kwargs):
+        df = super().load_data(scale, **kwargs)
+        return None if df is None else df[df['sqft-n'] > 1000]
+
+
+def test_overridden_load_data_is_estimated_scale_by_scale(grouped):
+    scales = [FakeScale(sale=True, city='Toronto'), FakeScale(sale=True, city='Etobicoke')]
+    manager = makeManager(grouped, scales, managerClass=FilteredValueManager)
+    df_y, _, _ = manager.estimate(grouped)
+    expected, _ = singleScaleLoop(manager, grouped)
+    pd.testing.assert_frame_equal(df_y, expected)
+    # the filtered rows are not estimated
+    assert len(df_y.index) < len(manager.estimate_batched(grouped)[0].index)
+
+
+def test_non_numeric_x_col_is_estimated_scale_by_scale(grouped):
+    scales = [FakeScale(sale=True)]
+    manager = makeManager(grouped, scales)
+    manager.numeric_columns_only = True
+    scales[0].meta[manager.__model_key__()]['x_cols'].append('cmty-c')
+    assert manager.estimate_batched(grouped) is None
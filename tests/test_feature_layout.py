@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+rmbase = pytest.importorskip('estimator.rmbase_estimate_manager')
+
+X_COLS = ['bdrms-n', 'sqft-n', 'lat-n']
+X_MEANS = {'bdrms-n': 3.0, 'sqft-n': 1500.0, 'lat-n': 43.7}
+
+
+def test_matrix_fills_the_missing_columns_with_their_means():
+    layout = rmbase.FeatureLayout(X_COLS, X_MEANS)
+    df = pd.DataFrame({'sqft-n': [800.0, 1200.0, 2000.0], 'other': [1, 2, 3], 'bdrms-n': [1.0, 2.0, 4.0]})
+    X = layout.matrix(df)
+    assert X.dtype == np.float32
+    np.testing.assert_allclose(X, [[1, 800, 43.7], [2, 1200, 43.7], [4, 2000, 43.7]], rtol=1e-6)
+    np.testing.assert_allclose(layout.matrix(df, np.array([2, 0])), X[[2, 0]])
+
+
+def test_binding_follows_the_columns():
+    layout = rmbase.FeatureLayout(X_COLS, X_MEANS)
+    layout.matrix(pd.DataFrame({'bdrms-n': [1.0]}))
+    X = layout.matrix(pd.DataFrame({'lat-n': [45.0], 'sqft-n': [900.0], 'bdrms-n': [2.0]}))
+    np.testing.assert_allclose(X, [[2, 900, 45]], rtol=1e-6)
+
+
+def test_large_means_use_float64():
+    layout = rmbase.FeatureLayout(['onD'], {'onD': 20230615.0})
+    X = layout.matrix(pd.DataFrame({'onD': [20231231]}))
+    assert X.dtype == np.float64
+    assert X[0, 0] == 20231231
+
+
+def test_sparse_columns_are_not_dense():
+    layout = rmbase.FeatureLayout(['city-Toronto'], {'city-Toronto': 0.5})
+    df = pd.DataFrame({'city-Toronto': pd.arrays.SparseArray([1, 0], fill_value=0)})
+    assert not layout.dense(df)
+
+
+def test_x_means_are_required():
+    with pytest.raises(ValueError):
+        rmbase.FeatureLayout(X_COLS, None)
@@ -0,0 +1,89 @@
+import gc
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+data_source = pytest.importorskip('data.data_source')
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'sqft-n': [400, 800, 1200, np.nan, 6000],
+        'lp-n': [100, 0, 300, 400, 500],
+        'city': ['Toronto', 'York', 'Toronto', 'Peel', 'York'],
+    })
+
+
+def rowFilter(row):
+    # if on a Series raises ValueError, so it is applied row by row
+    if row['sqft-n'] >= 500 and row['lp-n'] > 0:
+        return True
+    return False
+
+
+def frameFilter(df):
+    return (df['sqft-n'] >= 500) & (df['lp-n'] > 0)
+
+
+def test_row_and_frame_filters_give_the_same_mask(df):
+    expected = [False, False, True, False, True]
+    assert data_source.filterMask(df, rowFilter).tolist() == expected
+    assert data_source.filterMask(df, frameFilter).tolist() == expected
+    assert data_source._FILTER_KINDS[rowFilter] == 'row'
+    assert data_source._FILTER_KINDS[frameFilter] == 'frame'
+    # the decided kind is reused
+    assert data_source.filterMask(df, rowFilter).tolist() == expected
+
+
+class Filters:
+    def __init__(self, minSqft):
+        self.minSqft = minSqft
+
+    def frame(self, df):
+        return df['sqft-n'] >= self.minSqft
+
+    def row(self, row):
+        return bool(row['sqft-n'] >= self.minSqft)
+
+
+def test_bound_methods_are_probed_once(df, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(data_source.logger, 'warning', warnings.append)
+    filters = Filters(500)
+    for _ in range(3):
+        assert data_source.filterMask(df, filters.row).tolist() == [False, True, True, False, True]
+        assert data_source.filterMask(df, filters.frame).tolist() == [False, True, True, False, True]
+    assert data_source._FILTER_KINDS[Filters.row] == 'row'
+    assert data_source._FILTER_KINDS[Filters.frame] == 'frame'
+    assert len(warnings) == 1
+    # the kind is shared by the instances
+    assert data_source.filterMask(df, Filters(1000).frame).tolist() == [False, False, True, False, True]
+
+
+def test_dict_filter(df):
+    mask = data_source.filterMask(df, {
+        'sqft-n': ('between', 500, 5000),
+        'city': ('in', ['Toronto', 'Peel']),
+    })
+    assert mask.tolist() == [False, False, True, False, False]
+    with pytest.raises(ValueError):
+        data_source.filterMask(df, {'sqft-n': ('like', 1)})
+
+
+def test_other_errors_are_raised(df):
+    def broken(df):
+        raise RuntimeError('broken')
+    with pytest.raises(RuntimeError):
+        data_source.filterMask(df, broken)
+
+
+def test_filter_kinds_do_not_keep_the_filters(df):
+    def temporary(df):
+        return df['lp-n'] > 0
+    data_source.filterMask(df, temporary)
+    count = len(data_source._FILTER_KINDS)
+    del temporary
+    gc.collect()
+    assert len(data_source._FILTER_KINDS) == count - 1
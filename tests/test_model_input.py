@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+lgbm = pytest.importorskip('estimator.lgbm_estimate_manager')
+
+
+def makeFrame(onD):
+    return pd.DataFrame({
+        'onD': onD,
+        'sqft-n': [800.0, 1200.0, np.nan],
+        'city-Toronto': pd.arrays.SparseArray([1, 0, 0], fill_value=0),
+        'city-Ottawa': pd.arrays.SparseArray([0, 0, 1], fill_value=0),
+    })
+
+
+def test_sparse_input_keeps_the_column_order():
+    df = makeFrame([20230101, 20230615, 20231231])
+    x_cols = ['city-Ottawa', 'onD', 'city-Toronto', 'sqft-n']
+    X = lgbm.toModelInput(df, x_cols)
+    np.testing.assert_array_equal(X.toarray(), df[x_cols].astype(float).to_numpy())
+
+
+def test_large_integers_are_exact():
+    # above 2**24 float32 rounds to even numbers
+    df = makeFrame([20230101, 20230615, 20231231])
+    X = lgbm.toModelInput(df, ['onD', 'city-Toronto'])
+    assert X.dtype == np.float64
+    np.testing.assert_array_equal(X[:, 0].toarray().ravel(), df['onD'].to_numpy())
+
+
+def test_small_values_are_float32():
+    df = makeFrame([1, 2, 3])
+    X = lgbm.toModelInput(df, ['onD', 'sqft-n', 'city-Toronto'])
+    assert X.dtype == np.float32
+
+
+def test_dense_frame_is_returned_as_is():
+    df = makeFrame([20230101, 20230615, 20231231])
+    X = lgbm.toModelInput(df, ['onD', 'sqft-n'])
+    assert isinstance(X, pd.DataFrame)
+    assert list(X.columns) == ['onD', 'sqft-n']
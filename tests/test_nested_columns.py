@@ -0,0 +1,34 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+preprocessor = pytest.importorskip('transformer.preprocessor')
+
+
+@pytest.fixture(autouse=True)
+def noVerdicts():
+    preprocessor.clearNestedColumnVerdicts()
+    yield
+    preprocessor.clearNestedColumnVerdicts()
+
+
+def test_nested_value_outside_the_sample_is_found():
+    values = ['a'] * 1000
+    values[501] = ['pool', 'gym']
+    df = pd.DataFrame({'feat': values, 'st': ['Main'] * 1000, 'sqft': [1.0] * 1000})
+    assert preprocessor.nestedColumns(df, sample_size=10) == ['feat']
+
+
+def test_declared_columns_are_nested():
+    df = pd.DataFrame({'rms': ['x'], 'st': ['Main']})
+    assert preprocessor.nestedColumns(df, declared=['rms']) == ['rms']
+
+
+def test_verdicts_are_kept_by_source():
+    scalar = pd.DataFrame({'la': ['Jane', 'John']})
+    nested = pd.DataFrame({'la': [{'nm': 'Jane'}, None]})
+    assert preprocessor.nestedColumns(scalar, source='ml_') == []
+    # the cached verdict of the column is reused for the same source
+    assert preprocessor.nestedColumns(nested, source='ml_') == []
+    assert preprocessor.nestedColumns(nested, source='other_') == ['la']
+    preprocessor.clearNestedColumnVerdicts()
+    assert preprocessor.nestedColumns(nested, source='ml_') == ['la']
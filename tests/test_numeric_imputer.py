@@ -0,0 +1,41 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+pytest.importorskip('sklearn')
+preprocessor = pytest.importorskip('transformer.preprocessor')
+
+
+def makeFrame(rows=40, seed=0):
+    rng = np.random.default_rng(seed)
+    sqft = rng.uniform(500, 3000, rows)
+    return pd.DataFrame({
+        'sqft-n': sqft,
+        'bdrms-n': rng.integers(1, 6, rows).astype(float),
+        'tax-n': sqft * 3 + rng.normal(0, 10, rows),
+    })
+
+
+def test_transform_leaves_no_nulls():
+    train = makeFrame()
+    train.loc[[1, 5, 9], 'tax-n'] = np.nan
+    imputer = preprocessor.custom_numeric_imputer(min_rows=10).fit(train)
+    test = makeFrame(seed=1)
+    # bdrms-n had no nulls when fitted
+    test.loc[[0, 3], 'bdrms-n'] = np.nan
+    test.loc[[2], 'tax-n'] = np.nan
+    result = imputer.transform(test)
+    assert not result.isna().any().any()
+    assert result.loc[0, 'bdrms-n'] == pytest.approx(train['bdrms-n'].mean())
+    assert result.loc[2, 'tax-n'] == pytest.approx(test.loc[2, 'sqft-n'] * 3, rel=0.05)
+
+
+def test_too_few_rows_fall_back_to_means():
+    train = makeFrame(rows=5)
+    train.loc[[1, 2], 'tax-n'] = np.nan
+    imputer = preprocessor.custom_numeric_imputer(min_rows=10).fit(train)
+    assert imputer.models_ == {}
+    test = makeFrame(rows=3, seed=1)
+    test.loc[[0], 'tax-n'] = np.nan
+    result = imputer.transform(test)
+    assert result.loc[0, 'tax-n'] == pytest.approx(train['tax-n'].mean())
@@ -0,0 +1,89 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('fitter')
+preprocessor = pytest.importorskip('transformer.preprocessor')
+
+
+def makeFrame(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'sqft-n': rng.gamma(9.0, 150.0, rows),
+        'sp-n': rng.lognormal(13.5, 0.3, rows),
+    })
+    df.loc[[10, 20], 'sqft-n'] = [50000.0, 60000.0]
+    df.loc[[30], 'sp-n'] = [1e9]
+    return df
+
+
+@pytest.mark.parametrize('detector', ['iqr', 'mad', 'quantile'])
+def test_detectors_flag_the_injected_outliers(detector):
+    remover = preprocessor.Outliers_removal_ml(detector=detector, quantiles=(0.001, 0.998)).fit(makeFrame())
+    assert remover.masks_['sqft-n'][[10, 20]].all()
+    assert remover.masks_['sp-n'][30]
+    # only a few rows are flagged
+    assert remover.masks_['sqft-n'].mean() < 0.05
+
+
+def test_quantile_sketch_is_close_to_the_exact_quantiles():
+    df = makeFrame()
+    remover = preprocessor.Outliers_removal_ml(detector='quantile', bins=4096).fit(df)
+    lower, upper = remover.bounds_['sqft-n']
+    exactLower, exactUpper = np.quantile(df['sqft-n'], [0.005, 0.995])
+    assert lower == pytest.approx(exactLower, rel=0.05)
+    assert upper == pytest.approx(exactUpper, rel=0.05)
+
+
+def test_unknown_detector_is_rejected():
+    with pytest.raises(ValueError):
+        preprocessor.Outliers_removal_ml(detector='zscore').fit(makeFrame())
+
+
+def test_distributions_are_fitted_once_on_a_bounded_sample(monkeypatch):
+    sizes = []
+    fit = preprocessor.fitBestDistribution
+
+    def recordingFit(values):
+        sizes.append(len(values))
+        return fit(values)
+    monkeypatch.setattr(preprocessor, 'fitBestDistribution', recordingFit)
+    remover = preprocessor.Outliers_removal_ml(fit_sample_size=500, random_state=0)
+    remover.fit(makeFrame())
+    assert sizes == [500, 500]
+    remover.transform(makeFrame(seed=1))
+    remover.transform(makeFrame(seed=2))
+    assert len(sizes) == 2
+    assert set(remover.distributions_) == {'sqft-n', 'sp-n'}
+
+
+def test_replacements_are_reproducible_and_only_for_outliers():
+    df = makeFrame()
+    first = preprocessor.Outliers_removal_ml(random_state=3).fit_transform(df)
+    second = preprocessor.Outliers_removal_ml(random_state=3).fit_transform(df)
+    pd.testing.assert_frame_equal(first, second)
+    mask = preprocessor.Outliers_removal_ml().fit(df).masks_['sqft-n']
+    np.testing.assert_array_equal(first['sqft-n'].to_numpy()[~mask], df['sqft-n'].to_numpy()[~mask])
+    assert (first['sqft-n'].to_numpy()[[10, 20]] < 50000).all()
+
+
+def test_truncated_draws_stay_in_the_inlier_range():
+    rng = np.random.default_rng(0)
+    values = preprocessor.sampleDistribution(
+        rng, 'norm', {'loc': 0.0, 'scale': 1.0}, 10000, low=-0.5, high=0.5)
+    assert values.shape == (10000,)
+    assert values.min() >= -0.5 and values.max() <= 0.5
+    again = preprocessor.sampleDistribution(
+        np.random.default_rng(0), 'norm', {'loc': 0.0, 'scale': 1.0}, 10000, low=-0.5, high=0.5)
+    np.testing.assert_array_equal(values, again)
+
+
+@pytest.mark.parametrize('name, params', [
+    ('gamma', {'a': 2.0, 'loc': 1.0, 'scale': 3.0}),
+    ('lognorm', {'s': 0.5, 'loc': 0.0, 'scale': 2.0}),
+    ('expon', {'loc': 0.0, 'scale': 4.0}),
+])
+def test_draws_follow_the_scipy_distribution(name, params):
+    scipyStats = pytest.importorskip('scipy.stats')
+    values = preprocessor.sampleDistribution(np.random.default_rng(1), name, params, 20000)
+    assert values.mean() == pytest.approx(getattr(scipyStats, name)(**params).mean(), rel=0.05)
@@ -0,0 +1,59 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+data_source = pytest.importorskip('data.data_source')
+rmbase = pytest.importorskip('estimator.rmbase_estimate_manager')
+
+from conftest import FakeScale  # noqa: E402
+
+
+class ValueManager(rmbase.RmBaseEstimateManager):
+    x_columns = ['bdrms', 'sqft']
+    y_column = 'sp'
+
+
+class ValueOnlyManager(ValueManager):
+    uses_additional_x_cols = False
+
+
+def trainingColumns(monkeypatch, managers=None):
+    """The col_list load_raw_data reads with managers."""
+    source = data_source.DataSource(FakeScale(), query={})
+    read = []
+
+    def fakeRead(query, cache_dir=None, col_list=None):
+        read.append(col_list or source.col_list)
+        return pd.DataFrame(columns=read[-1])
+    monkeypatch.setattr(source, '_read', fakeRead)
+    for step in ['_build_prov_city_to_area', '_fill_df_raw_area', '_build_scale_tree']:
+        monkeypatch.setattr(source, step, lambda *args, **kwargs: None)
+    source.load_raw_data(managers=managers)
+    return read[0]
+
+
+def test_managers_with_additional_x_cols_read_all_columns(monkeypatch):
+    # load_data adds every other df_grouped column as a feature
+    assert trainingColumns(monkeypatch, [ValueManager]) == trainingColumns(monkeypatch)
+
+
+def test_managers_with_x_columns_only_read_their_fields(monkeypatch):
+    columns = trainingColumns(monkeypatch, [ValueOnlyManager])
+    assert set(columns) < set(trainingColumns(monkeypatch))
+    assert {'bdrms', 'sqft', 'sp'} <= set(columns)
+    assert set(data_source.PLAN_BASE_COLUMNS) <= set(columns)
+    assert 'tax' not in columns
+
+
+def test_from_models_reads_the_model_fields():
+    manager = ValueOnlyManager.__new__(ValueOnlyManager)
+    manager.name, manager.model_name = 'value', 'linear'
+    scale = FakeScale()
+    scale.meta[manager.__model_key__()] = {'x_cols': ['bdrms-n', 'pstyl_Detached', 'onD-month-n']}
+    manager.scales = {repr(scale): scale}
+    columns = data_source.DataSource.plan_col_list([manager], from_models=True)
+    assert {'bdrms', 'pstyl', 'onD'} <= set(columns)
+    assert 'sqft' not in columns
+    # no scale to read the models of
+    del manager.scales
+    assert data_source.DataSource.plan_col_list([manager], from_models=True) == \
+        data_source.DataSource.all_data_col_list
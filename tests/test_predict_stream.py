@@ -0,0 +1,72 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+data_source = pytest.importorskip('data.data_source')
+
+from conftest import FakeScale  # noqa: E402
+
+RAW = pd.DataFrame({
+    '_id': [f'TRB{i}' for i in range(5)],
+    'saletp-b': [0, 0, 1, 0, 1],
+    'ptype2-l': 'Detached',
+    'prov': 'ON',
+    'area': None,
+    'city': ['Toronto', 'York', 'Toronto', 'Toronto', 'York'],
+    'sqft-n': [800.0, 900.0, 1000.0, 1100.0, 1200.0],
+    '_mt': 1,
+})
+
+
+class IdentityPreprocessor:
+    def transform(self, df):
+        return df
+
+
+class DoublingManager:
+    """Estimates twice the sqft of every row."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def estimate(self, df_grouped):
+        self.chunks.append(len(df_grouped.index))
+        df_y = pd.DataFrame({'value-e': df_grouped['sqft-n'] * 2}, index=df_grouped.index)
+        return df_y, ['value-e'], [None]
+
+
+@pytest.fixture
+def source(monkeypatch):
+    monkeypatch.setattr(data_source, 'PROV_CITY_TO_AREA', {('ON', 'Toronto'): 'Toronto'})
+    monkeypatch.setattr(data_source, 'PROV_CITY_TO_AREA_LOOKUP', None)
+    source = data_source.DataSource(FakeScale(), query={})
+    source.reads = []
+
+    def read(query, cache_dir=None, col_list=None):
+        ids = query['_id']['$in']
+        source.reads.append(ids)
+        return RAW[RAW['_id'].isin(ids)].reset_index(drop=True)
+    monkeypatch.setattr(source, '_read', read)
+    return source
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_chunks_are_read_and_grouped_one_at_a_time(source, prefetch):
+    ids = RAW['_id'].tolist()
+    chunks = list(source.iter_df_grouped(ids, IdentityPreprocessor(), chunk_size=2, prefetch=prefetch))
+    assert source.reads == [ids[0:2], ids[2:4], ids[4:5]]
+    assert [len(chunk.index) for chunk in chunks] == [2, 2, 1]
+    assert source._other_scale_index is None
+    whole = source.load_df_grouped(ids, IdentityPreprocessor(), chunk_size=2)
+    pd.testing.assert_frame_equal(pd.concat(chunks).sort_index(), whole.sort_index())
+    # the area is filled, the modification time is dropped
+    assert set(whole.index.get_level_values('area')) == {'Toronto', 'Other'}
+    assert '_mt' not in whole.columns
+
+
+def test_predict_stream_estimates_every_chunk(source):
+    manager = DoublingManager()
+    rowCount = source.predict_stream(
+        RAW['_id'].tolist(), IdentityPreprocessor(), [manager], chunk_size=2, writeback=False)
+    assert rowCount == 5
+    assert manager.chunks == [2, 2, 1]
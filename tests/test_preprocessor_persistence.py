@@ -0,0 +1,94 @@
+import pickle
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+pytest.importorskip('sklearn')
+preprocessor = pytest.importorskip('transformer.preprocessor')
+
+
+class DictStore:
+    """The ModelStore calls of Preprocessor.save and load, kept in memory."""
+
+    def __init__(self):
+        self.models = {}
+
+    def save_model(self, name, model, accuracy, meta):
+        self.models[name] = (pickle.dumps(model), accuracy, meta)
+
+    def load_model(self, name):
+        model, accuracy, meta = self.models[name]
+        return pickle.loads(model), accuracy, meta
+
+
+def fittedPreprocessor():
+    p = preprocessor.Preprocessor()
+    p.input_columns_ = ['sqft', 'bdrms', 'pstyl']
+    p.num_cols_ = ['sqft-n', 'bdrms-n']
+    p.dates_special_ = []
+    p.common_dates_ = []
+    p.encoders_ = ['pstyl']
+    p.others_ = []
+    p.one_hot_names_ = ['pstyl_Detached', 'pstyl_Semi']
+    p.schema_hash_ = p.schema_hash()
+    p.cleaning_fitted_ = True
+    p.Xdf = pd.DataFrame({'sqft': [1.0]})
+    return p
+
+
+def test_save_and_load():
+    store = DictStore()
+    fittedPreprocessor().save(store, 'p')
+    loaded = preprocessor.Preprocessor.load(store, 'p')
+    assert loaded.one_hot_names_ == ['pstyl_Detached', 'pstyl_Semi']
+    assert not hasattr(loaded, 'Xdf')
+    assert store.models['p'][2]['version'] == preprocessor.PREPROCESSOR_VERSION
+
+
+def test_load_rejects_another_version_or_schema():
+    store = DictStore()
+    fittedPreprocessor().save(store, 'p')
+    model, accuracy, meta = store.models['p']
+    store.models['old'] = (model, accuracy, {**meta, 'version': preprocessor.PREPROCESSOR_VERSION - 1})
+    with pytest.raises(ValueError, match='version'):
+        preprocessor.Preprocessor.load(store, 'old')
+    store.models['changed'] = (model, accuracy, {**meta, 'schema_hash': 'other'})
+    with pytest.raises(ValueError, match='schema'):
+        preprocessor.Preprocessor.load(store, 'changed')
+
+
+def test_unfitted_preprocessor_is_not_saved():
+    with pytest.raises(ValueError):
+        preprocessor.Preprocessor().save(DictStore())
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_one_hot_vocabulary_is_fixed_by_fit(sparse):
+    train = pd.DataFrame({'pstyl': ['Detached', 'Semi', 'Detached', None],
+                          'ac': ['Central', 'None', 'Central', 'Central']})
+    encoder = preprocessor.OneHotEncoderWithNames(sparse=sparse).fit(train)
+    names = list(encoder.column_names)
+    # an unseen category, a numeric value in a text column, and one category only
+    batch = pd.DataFrame({'pstyl': ['Loft', '3', 'Semi'],
+                          'ac': ['Central', 'Central', 'Central']})
+    encoded = encoder.transform(batch)
+    assert list(encoded.columns) == names
+    dense = encoded.sparse.to_dense() if sparse else encoded
+    assert dense.loc[0, [n for n in names if n.startswith('pstyl')]].sum() == 0
+    # the numeric value is replaced by the fitted mode
+    assert dense.loc[1, 'pstyl_Detached'] == 1
+    assert dense.loc[2, 'pstyl_Semi'] == 1
+    assert encoder.transform(train).shape == (4, len(names))
+    if sparse:
+        assert all(isinstance(dtype, pd.SparseDtype) for dtype in encoded.dtypes)
+
+
+def test_outlier_step_gets_the_parallel_jobs():
+    assert preprocessor.Preprocessor()._outliers_removal().n_jobs is None
+    assert preprocessor.Preprocessor(n_jobs=4)._outliers_removal().n_jobs == 4
+
+
+def test_outlier_step_gets_the_seed():
+    assert preprocessor.Preprocessor()._outliers_removal().random_state is None
+    assert preprocessor.Preprocessor(random_state=7)._outliers_removal().random_state == 7
@@ -0,0 +1,117 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+data_source = pytest.importorskip('data.data_source')
+
+from conftest import FakeScale  # noqa: E402
+
+
+def makeRaw(rows):
+    """rows: (prov, city, area, modified)"""
+    return pd.DataFrame(rows, columns=['prov', 'city', 'area', '_mt']).assign(
+        _mt=lambda df: pd.to_datetime(df['_mt']))
+
+
+RAW = makeRaw([
+    ('ON', 'Toronto', 'Toronto', '2024-01-01'),
+    ('ON', 'Toronto', 'Toronto', '2024-01-02'),
+    ('ON', 'Toronto', 'York', '2024-01-03'),
+    ('ON', 'Markham', 'York', '2024-01-04'),
+    ('ON', 'Markham', '', '2024-01-05'),
+    ('ON', None, 'York', '2024-01-06'),
+])
+
+
+@pytest.fixture(autouse=True)
+def emptyMap(monkeypatch, tmp_path):
+    monkeypatch.setattr(data_source, 'PROV_CITY_TO_AREA', {})
+    monkeypatch.setattr(data_source, 'PROV_CITY_TO_AREA_COUNT', {})
+    monkeypatch.setattr(data_source, 'PROV_CITY_AREA_COUNT_FILE',
+                        str(tmp_path / 'prov_city_area_count.csv'))
+    monkeypatch.setattr(data_source, 'PROV_CITY_AREA_IDS_FILE',
+                        str(tmp_path / 'prov_city_area_ids.csv'))
+    monkeypatch.setattr(data_source, 'PROV_CITY_TO_AREA_FILE',
+                        str(tmp_path / 'prov_city_to_area.csv'))
+    monkeypatch.setattr(data_source, 'CITY_COUNT_THRESHOLD', 0)
+
+
+def tally(counts):
+    return {tuple(r[:3]): r[3] for r in counts[['prov', 'city', 'area', 'count']].values.tolist()}
+
+
+@pytest.mark.parametrize('dtype', [object, 'category', 'string'])
+def test_count_ignores_empty_keys_of_any_dtype(dtype):
+    raw = RAW.astype({'prov': dtype, 'city': dtype, 'area': dtype})
+    counts = data_source.countProvCityArea(raw)
+    assert tally(counts) == {
+        ('ON', 'Toronto', 'Toronto'): 2,
+        ('ON', 'Toronto', 'York'): 1,
+        ('ON', 'Markham', 'York'): 1,
+    }
+    assert counts['maxModified'].max() == pd.Timestamp('2024-01-04')
+
+
+def test_majority_area_and_incumbent_on_tie():
+    counts = data_source.countProvCityArea(makeRaw([
+        ('ON', 'Toronto', 'Toronto', '2024-01-01'),
+        ('ON', 'Toronto', 'Toronto', '2024-01-02'),
+        ('ON', 'Toronto', 'York', '2024-01-03'),
+        ('ON', 'Vaughan', 'York', '2024-01-04'),
+        ('ON', 'Vaughan', 'Peel', '2024-01-05'),
+    ]))
+    dominant = data_source.selectDominantArea(counts, incumbent={('ON', 'Vaughan'): 'York'})
+    assert dict(zip(zip(dominant['prov'], dominant['city']), dominant['area'])) == {
+        ('ON', 'Toronto'): 'Toronto',
+        ('ON', 'Vaughan'): 'York',
+    }
+    dominant = data_source.selectDominantArea(counts)
+    assert dominant.set_index('city').loc['Vaughan', 'area'] == 'Peel'
+
+
+def test_incremental_tally_equals_full_tally():
+    full = data_source.buildProvCityToArea(RAW)
+    first = data_source.buildProvCityToArea(RAW.iloc[:3])
+    data_source.writeProvCityAreaCount(first, 'q1')
+    previous = data_source.readProvCityAreaCount('q1')
+    assert data_source.readProvCityAreaCount('q2') is None
+    cutoff = previous['maxModified'].max()
+    delta = RAW.loc[RAW['_mt'] > cutoff]
+    merged = data_source.buildProvCityToArea(delta, previous_counts=previous)
+    assert tally(merged) == tally(full)
+    assert data_source.PROV_CITY_TO_AREA[('ON', 'Toronto')] == 'Toronto'
+    assert data_source.PROV_CITY_TO_AREA[('ON', 'Markham')] == 'York'
+
+
+def withIds(raw):
+    return raw.assign(_id=[f'TRB{i}' for i in range(raw.shape[0])])
+
+
+def test_modified_rows_are_not_counted_twice():
+    source = data_source.DataSource(FakeScale(), query={'ptype': 'r'})
+    source.df_raw = withIds(RAW)
+    source._build_prov_city_to_area(write_to_file=True, incremental=True)
+    # the next day: TRB1 moved to York, TRB3 modified only, and a new row
+    nextDay = withIds(makeRaw([
+        ('ON', 'Toronto', 'Toronto', '2024-01-01'),
+        ('ON', 'Toronto', 'York', '2024-01-08'),
+        ('ON', 'Toronto', 'York', '2024-01-03'),
+        ('ON', 'Markham', 'York', '2024-01-09'),
+        ('ON', 'Markham', '', '2024-01-05'),
+        ('ON', None, 'York', '2024-01-06'),
+        ('ON', 'Vaughan', 'York', '2024-01-10'),
+    ]))
+    source.df_raw = nextDay
+    incremental = source._build_prov_city_to_area(write_to_file=True, incremental=True)
+    counts = data_source.readProvCityAreaCount(data_source.querySignature(source._query))
+    assert tally(counts) == tally(data_source.countProvCityArea(nextDay))
+    assert incremental[('ON', 'Toronto')] == 'York'
+    ids = data_source.readProvCityAreaIds(data_source.querySignature(source._query))
+    assert sorted(ids['_id']) == ['TRB0', 'TRB1', 'TRB2', 'TRB3', 'TRB6']
+
+
+def test_modification_time_is_not_a_feature(monkeypatch):
+    source = data_source.DataSource(FakeScale(), query={})
+    monkeypatch.setattr(source, '_read', lambda query, cache_dir=None: withIds(RAW))
+    monkeypatch.setattr(source, '_build_scale_tree', lambda: None)
+    source.load_raw_data(incremental_area_map=False)
+    assert data_source.MODIFIED_COLUMN not in source.df_raw.columns
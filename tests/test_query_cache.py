@@ -0,0 +1,69 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+data_source = pytest.importorskip('data.data_source')
+
+COLUMNS = ['_id', 'onD', 'sp', 'feat']
+
+
+class TableMongo:
+    """Answers the onD range queries of read_data_by_query from a frame, recording them."""
+
+    def __init__(self, df):
+        self.df = df
+        self.queries = []
+
+    def load_data(self, collection, col_list, query):
+        self.queries.append(query)
+        onD = self.df['onD']
+        mask = pd.Series(True, index=self.df.index)
+        for op, value in query.get('onD', {}).items():
+            mask &= {'$gte': onD >= value, '$gt': onD > value,
+                     '$lt': onD < value, '$lte': onD <= value}[op]
+        return self.df.loc[mask, col_list].reset_index(drop=True)
+
+
+def makeRows(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+ROWS = [
+    ('A', 20240105, 500000, ['pool']),
+    ('B', 20240210, 600000, None),
+    ('C', 20240301, 700000, ['garage', 'pool']),
+]
+QUERY = {'onD': {'$gte': 20240101}, 'ptype': 'r'}
+
+
+def sortedById(df):
+    return df.sort_values('_id').reset_index(drop=True)
+
+
+def test_cached_months_are_not_read_again(tmp_path):
+    mongodb = TableMongo(makeRows(ROWS))
+    first = data_source.read_data_by_query(QUERY, COLUMNS, mongodb, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(sortedById(first), sortedById(mongodb.df))
+    # a new row in the high-water month, and one in a new month
+    mongodb.df = makeRows(ROWS + [('D', 20240315, 800000, None), ('E', 20240402, 900000, ['pool'])])
+    mongodb.queries = []
+    second = data_source.read_data_by_query(QUERY, COLUMNS, mongodb, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(sortedById(second), sortedById(mongodb.df))
+    # only the high-water month and the newer ones were read
+    assert mongodb.queries == [{'onD': {'$gte': 20240301}, 'ptype': 'r'}]
+
+
+def test_the_key_depends_on_the_query_and_the_columns():
+    cache = data_source.QueryCache()
+    assert cache.key(QUERY, COLUMNS) == cache.key(
+        {'ptype': 'r', 'onD': {'$gte': 20240101}}, list(reversed(COLUMNS)))
+    assert cache.key(QUERY, COLUMNS) != cache.key(QUERY, COLUMNS[:-1])
+    assert cache.key(QUERY, COLUMNS) != cache.key({**QUERY, 'ptype': 'b'}, COLUMNS)
+
+
+def test_queries_without_a_date_range_are_not_cached(tmp_path):
+    mongodb = TableMongo(makeRows(ROWS))
+    result = data_source.read_data_by_query(
+        {'ptype': 'r'}, ['_id', 'sp'], mongodb, cache_dir=str(tmp_path))
+    assert result.shape == (3, 2)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+data_source = pytest.importorskip('data.data_source')
+
+COLUMNS = ['_id', 'onD', 'sp']
+ROWS = pd.DataFrame({
+    '_id': [f'TRB{i}' for i in range(10)],
+    'onD': [20240105, 20240115, 20240201, 20240220, 20240301, 20240302, 20240303, 20240410, 20240420, 20240430],
+    'sp': [float(i) for i in range(10)],
+})
+
+
+class ThreadedMongo:
+    """Answers the _id and onD queries from ROWS, recording the queries and their threads."""
+
+    def __init__(self):
+        self.queries = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def load_data(self, collection, col_list, query):
+        with self.lock:
+            self.queries.append(query)
+            self.threads.add(threading.get_ident())
+        mask = pd.Series(True, index=ROWS.index)
+        if '_id' in query:
+            mask &= ROWS['_id'].isin(query['_id']['$in'])
+        for op, value in query.get('onD', {}).items():
+            mask &= {'$gte': ROWS['onD'] >= value, '$gt': ROWS['onD'] > value,
+                     '$lt': ROWS['onD'] < value, '$lte': ROWS['onD'] <= value}[op]
+        return ROWS.loc[mask, col_list].reset_index(drop=True)
+
+
+def test_split_by_ids_and_by_month():
+    ids = {'_id': {'$in': list('abcde')}, 'saletp': 'Sale'}
+    assert data_source.splitQuery(ids, batch_size=2) == [
+        {'_id': {'$in': ['a', 'b']}, 'saletp': 'Sale'},
+        {'_id': {'$in': ['c', 'd']}, 'saletp': 'Sale'},
+        {'_id': {'$in': ['e']}, 'saletp': 'Sale'},
+    ]
+    assert data_source.splitQuery({'onD': {'$gte': 20240115, '$lte': 20240310}}) == [
+        {'onD': {'$gte': 20240115, '$lt': 20240201}},
+        {'onD': {'$gte': 20240201, '$lt': 20240301}},
+        {'onD': {'$gte': 20240301, '$lte': 20240310}},
+    ]
+    # no lower bound: not split
+    assert data_source.splitQuery({'onD': {'$lt': 20240310}}) == [{'onD': {'$lt': 20240310}}]
+
+
+@pytest.mark.parametrize('query, batch_size', [
+    ({'_id': {'$in': ROWS['_id'].tolist()}}, 3),
+    ({'onD': {'$gte': 20240101, '$lte': 20240430}}, 3),
+])
+def test_parallel_read_returns_the_rows_of_one_read(query, batch_size):
+    mongodb = ThreadedMongo()
+    whole = data_source.read_data_by_query(query, COLUMNS, mongodb, workers=1)
+    assert len(mongodb.queries) == 1
+    mongodb = ThreadedMongo()
+    parallel = data_source.read_data_by_query(
+        query, COLUMNS, mongodb, workers=4, batch_size=batch_size)
+    assert len(mongodb.queries) == 4
+    pd.testing.assert_frame_equal(
+        parallel.sort_values('_id').reset_index(drop=True), whole.sort_values('_id').reset_index(drop=True))
+
+
+def test_empty_ranges_return_the_columns():
+    mongodb = ThreadedMongo()
+    result = data_source.read_data_by_query(
+        {'onD': {'$gte': 20250101, '$lte': 20250331}}, COLUMNS, mongodb, workers=2)
+    assert result.shape == (0, 3)
+    assert list(result.columns) == COLUMNS
@@ -0,0 +1,30 @@
+import pytest
+
+data_source = pytest.importorskip('data.data_source')
+
+EXISTING = ('zip', 'zip-n', 'zip-c', 'sqft-n', 'sp-n', 'ptype2-l', 'lat')
+
+
+def resolve(cols, suffix_list=('-n', '-c'), need_raw=False, ad_cols=False):
+    return data_source.resolveColumns(EXISTING, cols, suffix_list, need_raw, ad_cols)
+
+
+def test_cols_match_their_suffixed_columns():
+    assert resolve(('zip', 'sqft')) == ('zip-n', 'zip-c', 'sqft-n')
+    assert resolve(('zip',), need_raw=True) == ('zip-n', 'zip-c', 'zip')
+    # the raw column when no suffixed one exists
+    assert resolve(('lat',)) == ('lat',)
+    assert resolve(('missing',)) == ()
+    assert resolve(None) == EXISTING
+
+
+def test_ad_cols_appends_the_other_columns():
+    assert resolve(('sqft',), ad_cols=True) == (
+        'sqft-n', 'zip', 'zip-n', 'zip-c', 'sp-n', 'ptype2-l', 'lat')
+
+
+def test_requests_are_memoized():
+    data_source.resolveColumns.cache_clear()
+    first = resolve(('zip', 'sqft'))
+    assert resolve(('zip', 'sqft')) is first
+    assert data_source.resolveColumns.cache_info().hits == 1
@@ -0,0 +1,31 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+util = pytest.importorskip('base.util')
+rmbase = pytest.importorskip('estimator.rmbase_estimate_manager')
+
+
+@pytest.mark.parametrize('roundBy, lower, upper', [
+    (1, 0, 1000000000),
+    (1000, 50000, 5000000),
+    (100, -500, 10000),
+    (0.5, 0, 10),
+    (1, None, None),
+])
+def test_round_array_matches_get_round_function(roundBy, lower, upper):
+    rng = np.random.default_rng(0)
+    low = -10000 if lower is None else lower
+    high = 10000 if upper is None else upper
+    values = np.concatenate([
+        rng.uniform(low - (high - low) * 0.1, high * 1.1, 1000),
+        # the bounds, around them, half steps and negatives
+        [v for v in (lower, upper) if v is not None],
+        [v + d for v in (lower, upper) if v is not None for d in (-roundBy / 2, roundBy / 2)],
+        [-roundBy * 2.5, -roundBy / 2, roundBy / 2, roundBy * 2.5, -1234.5, 0.0],
+        [np.nan],
+    ])
+    fnRound = util.getRoundFunction(roundBy, min=lower, max=upper)
+    expected = np.array([fnRound(v) for v in values], dtype=float)
+    result = rmbase.roundArray(values, roundBy, lower=lower, upper=upper)
+    assert result.dtype == values.dtype
+    np.testing.assert_allclose(result, expected, equal_nan=True)
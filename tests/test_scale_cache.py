@@ -0,0 +1,91 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+data_source = pytest.importorskip('data.data_source')
+
+from conftest import FakeScale  # noqa: E402
+
+
+def makeSource(grouped, max_bytes=data_source.SCALE_CACHE_BYTES):
+    source = data_source.DataSource(FakeScale(), query={}, scale_cache_bytes=max_bytes)
+    source.df_grouped = data_source.sortByScaleAndDate(grouped)
+    return source
+
+
+def test_cache_hit_shares_the_read_only_rows(grouped):
+    source = makeSource(grouped)
+    scale = FakeScale(sale=True, city='Toronto')
+    first = source.get_df(scale, cols=['bdrms-n', 'sqft-n'], date_span=365)
+    second = source.get_df(scale, cols=['bdrms-n', 'sqft-n'], date_span=365)
+    assert second is not first
+    assert source.scale_cache.stats()['hits'] == 1
+    assert np.shares_memory(second['sqft-n'].to_numpy(), first['sqft-n'].to_numpy())
+    # the shared rows can not be modified, a new column stays with its frame
+    with pytest.raises(ValueError):
+        second.loc[second.index[0], 'sqft-n'] = -1
+    second['ratio'] = second['sqft-n'] / second['bdrms-n']
+    assert 'ratio' not in source.get_df(scale, cols=['bdrms-n', 'sqft-n'], date_span=365)
+    private = source.get_df(scale, cols=['bdrms-n', 'sqft-n'], date_span=365, copy=True)
+    pd.testing.assert_frame_equal(private, first)
+    private.loc[private.index[0], 'sqft-n'] = -1
+    assert first['sqft-n'].iloc[0] != -1
+    # df_grouped itself stays writable
+    assert source.df_grouped['sqft-n'].to_numpy().flags.writeable
+    # other columns of the same rows share the cached rows
+    other = source.get_df(scale, cols=['sp-n'], date_span=365)
+    assert list(other.columns) == ['sp-n']
+    assert other.index.equals(first.index)
+    assert source.scale_cache.stats()['entries'] == 1
+
+
+def test_writeback_and_concat_clear_the_cache(grouped):
+    source = makeSource(grouped)
+    scale = FakeScale(sale=True, city='Toronto')
+    before = source.get_df(scale, cols=['sp-n'], date_span=-1)
+    source.writeback('sp-n', before['sp-n'] * 2)
+    assert source.scale_cache.stats()['entries'] == 0
+    after = source.get_df(scale, cols=['sp-n'], date_span=-1)
+    pd.testing.assert_series_equal(after['sp-n'], before['sp-n'] * 2)
+    source.get_df(scale, cols=['sp-n'], date_span=-1)
+    source.concat_df_grouped(grouped.iloc[:0])
+    assert source.scale_cache.stats()['entries'] == 0
+
+
+def test_lru_eviction_by_bytes():
+    cache = data_source.ScaleDataCache(max_bytes=100)
+    cache.put('a', 'A', 60)
+    cache.put('b', 'B', 30)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 30)
+    # b is the least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A' and cache.get('c') == 'C'
+    cache.put('d', 'D', 200)
+    assert cache.get('d') is None
+    assert cache.stats() == {'hits': 3, 'misses': 2, 'evictions': 1, 'entries': 2, 'bytes': 90}
+
+
+def test_uncached_filter_and_disabled_cache(grouped):
+    scale = FakeScale(sale=False)
+    source = makeSource(grouped, max_bytes=0)
+    first = source.get_df(scale, cols=['sp-n'], date_span=-1)
+    assert source.get_df(scale, cols=['sp-n'], date_span=-1) is not first
+    source = makeSource(grouped)
+    # a lambda is hashable but a new one each call, cached by identity
+    filtered = source.get_df(scale, cols=['sp-n'], date_span=-1,
+                             filter_func=lambda row: row['sp-n'] > 1000000)
+    assert (filtered['sp-n'] > 1000000).all()
+
+
+class SameRepr(FakeScale):
+    def __repr__(self):
+        return 'scale'
+
+
+def test_cache_key_is_the_scale_fields(grouped):
+    source = makeSource(grouped)
+    toronto = source.get_df(SameRepr(sale=True, city='Toronto'), cols=['sp-n'], date_span=-1)
+    etobicoke = source.get_df(SameRepr(sale=True, city='Etobicoke'), cols=['sp-n'], date_span=-1)
+    assert source.scale_cache.stats()['entries'] == 2
+    assert not toronto.index.equals(etobicoke.index)
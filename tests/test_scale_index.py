@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+data_source = pytest.importorskip('data.data_source')
+
+from conftest import GROUP_LEVELS, FakeScale  # noqa: E402
+
+SCALES = [
+    FakeScale(),
+    FakeScale(sale=True),
+    FakeScale(sale=False, propType='Semi'),
+    FakeScale(city='Etobicoke'),
+    FakeScale(sale=True, propType='Detached', prov='ON', area='Toronto', city='Toronto'),
+    FakeScale(sale=False, city='Nowhere'),
+]
+
+
+def categoricalLevels(grouped):
+    df = grouped.reset_index()
+    df[['ptype2-l', 'prov', 'area', 'city']] = df[['ptype2-l', 'prov', 'area', 'city']].astype('category')
+    return df.set_index(GROUP_LEVELS).sort_index()
+
+
+def baselineSlice(source, grouped, scale, date_span):
+    """The rows of get_df before the scale index: index slices, then the onD window."""
+    try:
+        rd = grouped.loc[tuple(source._scale_slices(scale)), :]
+    except (KeyError, TypeError):
+        # a label missing from a categorical level raises TypeError on newer pandas
+        return grouped.iloc[0:0]
+    if date_span > 0:
+        dateFrom = data_source.dateToInt(scale.datePoint - timedelta(days=date_span))
+        dateTo = data_source.dateToInt(scale.datePoint)
+        rd = rd.loc[rd.onD.between(dateFrom, dateTo)]
+    return rd
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+@pytest.mark.parametrize('date_span', [-1, 180])
+def test_get_df_matches_the_baseline_slice(grouped, categorical, date_span):
+    if categorical:
+        grouped = categoricalLevels(grouped)
+    assert grouped.index.get_level_values('saletp-b').dtype == np.uint8
+    source = data_source.DataSource(FakeScale(), query={})
+    source.df_grouped = data_source.sortByScaleAndDate(grouped)
+    assert source.get_scale_index() is not None
+    for scale in SCALES:
+        expected = baselineSlice(source, grouped, scale, date_span)
+        result = source.get_df(scale, cols=['sp-n'], date_span=date_span)
+        if expected.shape[0] == 0:
+            assert result is None, scale
+            continue
+        pd.testing.assert_series_equal(
+            result['sp-n'].sort_index(), expected['sp-n'].sort_index(), obj=repr(scale))
+
+
+def test_scale_positions_and_counts(grouped):
+    source = data_source.DataSource(FakeScale(), query={})
+    source.df_grouped = grouped
+    for scale in SCALES:
+        expected = baselineSlice(source, grouped, scale, -1)
+        positions = source.scale_positions(scale)
+        assert grouped.index[positions].equals(expected.index), scale
+        if expected.shape[0] > 0:
+            assert source.count_scale_rows(scale) == expected.shape[0]
+
+
+def test_unsorted_index_is_not_indexed(grouped):
+    shuffled = grouped.sample(frac=1, random_state=0)
+    assert not data_source.ScaleIndex(shuffled).valid
+    source = data_source.DataSource(FakeScale(), query={})
+    source.df_grouped = shuffled
+    assert source.get_scale_index() is None
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip('numpy')
+threadpoolctl = pytest.importorskip('threadpoolctl')
+rmbase = pytest.importorskip('estimator.rmbase_estimate_manager')
+
+from conftest import FakeScale  # noqa: E402
+
+
+class ThreadRecordingManager:
+    """The train_single_scale of a manager, recording the threads it may use."""
+    min_output_value_ = 0
+    max_output_value_ = 1
+
+    def __init__(self):
+        self.scales = {'s': FakeScale(sale=True)}
+        self.threads = None
+
+    def train_single_scale(self, scale):
+        self.threads = [pool['num_threads'] for pool in threadpoolctl.threadpool_info()]
+        return None, None, None, None, None, None
+
+
+def test_worker_trains_single_threaded(monkeypatch):
+    manager = ThreadRecordingManager()
+    monkeypatch.setattr(rmbase, '_TRAINING_MANAGER', manager)
+    assert rmbase._train_scale_in_worker('s') == ('s', None, None, [])
+    assert all(threads == 1 for threads in manager.threads)
+
+
+def test_lgbm_workers_replace_the_thread_params():
+    lgbm = pytest.importorskip('estimator.lgbm_estimate_manager')
+    manager = lgbm.LgbmEstimateManager.__new__(lgbm.LgbmEstimateManager)
+    manager.logger = rmbase.BaseCfg.getLogger('test')
+    manager.model_params = {'n_estimators': 10, 'num_threads': 8}
+    manager.model_n_jobs = 1
+    params = manager.prepare_model().get_params()
+    assert params['n_jobs'] == 1
+    assert 'num_threads' not in params
+    manager.model_n_jobs = None
+    assert manager.prepare_model().get_params()['num_threads'] == 8
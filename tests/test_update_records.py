@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+pymongo = pytest.importorskip('pymongo')
+data_source = pytest.importorskip('data.data_source')
+
+from conftest import GROUP_LEVELS, FakeScale  # noqa: E402
+
+
+class RecordingCollection:
+    """The bulk_write of a pymongo collection, recorded."""
+
+    def __init__(self, name, bulks):
+        self.name = name
+        self.bulks = bulks
+
+    def bulk_write(self, requests, ordered=True):
+        self.bulks.append((self.name, requests, ordered))
+        return SimpleNamespace(matched_count=len(requests), modified_count=len(requests))
+
+
+class RecordingMongo:
+    """Records the writes of update_records instead of sending them."""
+
+    def __init__(self):
+        self.updates = []
+        self.bulks = []
+        self.db = {'properties': RecordingCollection('properties', self.bulks)}
+
+    def updateOne(self, collection, filter, update):
+        self.updates.append((collection, filter, update))
+
+
+@pytest.fixture
+def estimates():
+    index = pd.MultiIndex.from_tuples(
+        [(0, 'Detached', 'ON', 'Toronto', 'Toronto', f'TRB{i}') for i in range(5)],
+        names=GROUP_LEVELS)
+    return pd.DataFrame({
+        'value-e': [500000.0, 0.0, np.nan, 700000.0, 800000.0],
+        'value-e-acu': [0.8, 0.8, 0.8, 0.0, 0.9],
+        'other': [1, 2, 3, 4, 5],
+    }, index=index)
+
+
+EXPECTED = [
+    ('TRB0', {'evalue': 500000.0, 'evalue_acu': 0.8}),
+    ('TRB4', {'evalue': 800000.0, 'evalue_acu': 0.9}),
+]
+
+
+def test_rows_with_less_than_two_values_are_skipped(estimates):
+    mongodb = RecordingMongo()
+    data_source.update_records(
+        estimates, ['value-e', 'value-e-acu', 'other'], ['evalue', 'evalue_acu', None],
+        mongodb=mongodb)
+    assert mongodb.bulks == []
+    assert mongodb.updates == [
+        ('properties', {'_id': id}, {'$set': toSet}) for id, toSet in EXPECTED]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_bulk_writes_in_batches(estimates, workers):
+    estimates = pd.concat([estimates] * 3)
+    mongodb = RecordingMongo()
+    data_source.update_records(
+        estimates, ['value-e', 'value-e-acu'], ['evalue', 'evalue_acu'],
+        mongodb=mongodb, batch_size=4, workers=workers)
+    assert mongodb.updates == []
+    # the chunks of several workers are recorded in any order
+    bulks = sorted(mongodb.bulks, key=lambda bulk: -len(bulk[1]))
+    assert [len(ops) for _, ops, _ in bulks] == [4, 2]
+    assert all(not ordered for _, _, ordered in bulks)
+    operations = [op for _, ops, _ in bulks for op in ops]
+    assert operations == [
+        pymongo.UpdateOne({'_id': id}, {'$set': toSet}) for id, toSet in EXPECTED * 3]
+
+
+def test_writeback_sends_bulk_writes(estimates, monkeypatch):
+    mongodb = RecordingMongo()
+    monkeypatch.setattr(data_source, 'MongoDB', lambda: mongodb)
+    source = data_source.DataSource(FakeScale(), query={})
+    source.df_grouped = estimates
+    y = estimates[['value-e', 'value-e-acu']].rename(columns={'value-e': 'v', 'value-e-acu': 'v-acu'})
+    source.writeback(['v', 'v-acu'], y, db_col=['evalue', 'evalue_acu'], batch_size=1)
+    assert mongodb.updates == []
+    assert [op for _, ops, _ in mongodb.bulks for op in ops] == [
+        pymongo.UpdateOne({'_id': id}, {'$set': toSet}) for id, toSet in EXPECTED]